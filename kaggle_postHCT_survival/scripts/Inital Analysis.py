@@ -1,99 +1,97 @@
+# Exploration notes. The repeatable steps (inspect, train, predict, plot) are also a command line that only
+# imports what each step needs: python -m hct_survival --help, see hct_survival/cli.py
+
 # import packages
+import numpy as np
 import pandas as pd
-from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
 from sklearn.linear_model import LinearRegression
 from sklearn.ensemble import RandomForestRegressor
-from sklearn.model_selection import GridSearchCV
 import seaborn as sns
 import matplotlib.pyplot as plt
 import lightgbm as lgb
+from hct_survival import ColumnStats, ConcordanceScorer, HCTPreprocessor, ModelSearch, PlotQueue, StackingEnsemble, \
+    evaluate_models, load_encoded_data, run_eda, search_spec, stratified_concordance
 
 # read in train and test data
-train_df = pd.read_csv(r"E:\github_repos\PRIVATE\Private_Active_Projects\post_HCT_survival_analysis\data\train.csv")
-test_df = pd.read_csv(r"E:\github_repos\PRIVATE\Private_Active_Projects\post_HCT_survival_analysis\data\test.csv")
+train_path = r"E:\github_repos\PRIVATE\Private_Active_Projects\post_HCT_survival_analysis\data\train.csv"
+test_path = r"E:\github_repos\PRIVATE\Private_Active_Projects\post_HCT_survival_analysis\data\test.csv"
 
-# First thing for this analysis, lets drop any columns from train not in test, easier for now
-main_ivs = ['efs','efs_time']  # Replace with your actual column name
-columns_to_drop_from_train = [col for col in train_df.columns if col not in test_df.columns and col not in main_ivs]
-train_df = train_df.drop(columns_to_drop_from_train)
+test_df = pd.read_csv(test_path)
 
-train_df.info()
-train_df.head()
-train_df.describe()
-train_df.dtypes.value_counts()
-print(train_df.isnull().mean() * 100)
+# One chunked pass over train.csv for the types, missingness, describe() numbers and cardinalities, cached in
+# data_cache/ and handed to load_encoded_data below, so the preprocessor is fit on the same stats without a rescan
+column_stats = ColumnStats.from_csv(train_path, cache_dir='data_cache')
+print(column_stats.to_frame())
 
-missing_percentage = train_df.isnull().mean() * 100
-train_df_filtered = train_df.loc[:, missing_percentage < 20]
-test_df_filtered = test_df[train_df_filtered.columns.intersection(test_df.columns)] # grab variables shared in common with the filtered df
+# First thing for this analysis, lets drop any columns from train not in test, easier for now
+main_ivs = ['efs','efs_time']  # Replace with your actual column name
+missing_percentage = column_stats.missing_percentage()
+kept_columns = [col for col in column_stats.columns
+                if (col in test_df.columns or col in main_ivs) and missing_percentage[col] < 20]
+test_df_filtered = test_df[[col for col in kept_columns if col in test_df.columns]] # grab variables shared in common with the filtered columns
 
 # Okay, lets set up a way to split numeric from categorical
-numeric_columns = train_df_filtered.select_dtypes(include=['int64', 'float64']).columns
-categorical_columns = train_df_filtered.select_dtypes(include=['object', 'category']).columns
-
-
-
-
-corr = train_df_filtered[numeric_columns].corr()
-
-# Create a heatmap
-plt.figure(figsize=(15, 12))  # Adjust the size as needed
-sns.heatmap(corr, annot=True, cmap='coolwarm', fmt=".2f")
-plt.title("Correlation Matrix")
-plt.show()
-
-
-# Pairplot
-sns.pairplot(train_df_filtered[numeric_columns], diag_kind="kde", kind="scatter", corner=True)
-
+numeric_columns = [col for col in column_stats.numeric_columns if col in kept_columns]
+categorical_columns = [col for col in column_stats.categorical_columns if col in kept_columns]
 
-# before preprocessing, drop any columns that wont be used at all and sort into x and y
-# Going to drop these columns from the data
-columns_to_drop = ['efs','efs_time','cmv_status'] # Should go back and add the cmv status
-
-# Dynamically drop columns if they exist
-x_train = train_df_filtered.drop(columns=[col for col in columns_to_drop if col in train_df.columns])
-y_train = train_df_filtered['efs']
+# the stratified C-index below groups by race_group, the only raw train column still needed
+race_group = pd.read_csv(train_path, usecols=['race_group'])['race_group']
 
-x_test = test_df_filtered.drop(columns=[col for col in columns_to_drop if col in test_df.columns])
-#y_test = test_df_filtered['efs'] # won't exist for a true test dataset
 
 
-# now some preprocessing, lets first fill in missing data. do small imputation with just mean
-# get new numeric columns for the new train data
-numeric_train_cols = x_train.select_dtypes(include=['int64', 'float64']).columns
 
-# Will apply same mean impute based on train, apply to test
-for col in numeric_train_cols:
-    mean_value = x_train[col].mean()  # Calculate mean from train_df
-    x_train[col] = x_train[col].fillna(mean_value)  # Impute in train_df
-    x_test[col] = x_test[col].fillna(mean_value)  # Impute in test_df with the same mean
+# The full corr() heatmap and pairplot over every row take minutes, the pairplot most of it. Sampled EDA does the
+# correlations in chunked float32 products and draws the scatter/KDE panels from a 5000 row sample stratified by
+# race_group, saved to eda/ instead of shown. Set to False for the exact versions
+sampled_eda = True
 
+if sampled_eda:
+    eda_files = run_eda(train_path, 'eda', columns=numeric_columns, max_pairplot_columns=len(numeric_columns),
+                        sample_size=5000, stratify='race_group')
+    print(eda_files)
+else:
+    train_numeric = pd.read_csv(train_path, usecols=numeric_columns)
+    corr = train_numeric.corr()
 
-# next, standardize numeric values
-scaler = StandardScaler()
-x_train[numeric_train_cols] = scaler.fit_transform(x_train[numeric_train_cols])
-x_test[numeric_train_cols] = scaler.transform(x_test[numeric_train_cols])
+    # Create a heatmap
+    plt.figure(figsize=(15, 12))  # Adjust the size as needed
+    sns.heatmap(corr, annot=True, cmap='coolwarm', fmt=".2f")
+    plt.title("Correlation Matrix")
+    plt.show()
 
-# last, lets dummy code the categorical variables and build up the final train and test data
-categorical_train_cols = x_train.select_dtypes(include=['object', 'category']).columns
+    # Pairplot
+    sns.pairplot(train_numeric, diag_kind="kde", kind="scatter", corner=True)
 
-x_train_encoded = pd.get_dummies(x_train, columns=categorical_train_cols, drop_first=True)
-x_test_encoded = pd.get_dummies(x_test, columns=categorical_train_cols, drop_first=True)
 
-# Check if any cat coded variables are missing from test, if so, add them with 0
-missing_dummy_cols = set(x_train_encoded.columns) - set(x_test_encoded.columns)
+# before preprocessing, drop any columns that wont be used at all and sort into x and y
+# The preprocessor does the mean impute, scaling, category clean up and dummy coding in one go.
+# It is fit on train only and saved, so new patients can be scored without re-running all of this
+preprocessor = HCTPreprocessor(
+    target_columns=main_ivs,
+    drop_columns=['cmv_status'],  # Should go back and add the cmv status
+    max_missing_pct=20
+)
 
-for cols in missing_dummy_cols:
-    x_test_encoded[cols] = 0
+# The encoded data is cached in data_cache/ keyed on the csv contents and the preprocessor settings,
+# so after the first run this is a quick load from disk instead of the parse and encode
+# float32 halves the memory, lightgbm and the random forest work in float32 internally anyway,
+# and compact=True reads the csv as float32/small ints/category
+x_train_encoded, x_test_encoded, targets, test_ids, preprocessor = load_encoded_data(
+    train_path,
+    test_path,
+    preprocessor=preprocessor,
+    dtype=np.float32,
+    compact=True,
+    column_stats=column_stats
+)
+y_train = targets['efs']
 
-# Re-align columns in x_test_encoded to match the order of x_train_encoded
-x_test_encoded = x_test_encoded[x_train_encoded.columns]
+# The competition is scored on a stratified C-index: how well the predicted risk orders efs_time within each
+# race_group, mean over groups minus their std. Predicted efs works as the risk score
+c_index_scorer = ConcordanceScorer(targets['efs_time'], targets['efs'], groups=race_group)
 
-# Lastly, lets clean up column names
-x_train_encoded.columns = x_train_encoded.columns.str.replace(r'[^a-zA-Z0-9]', '_', regex=True)
-x_test_encoded.columns = x_test_encoded.columns.str.replace(r'[^a-zA-Z0-9]', '_', regex=True)
+preprocessor.save('hct_preprocessor.json')
 
 
 # Do one final check to make sure data align
@@ -129,151 +127,110 @@ num_leaves_values = [25, 50, 100]  # Number of leaves in one tree
 learning_rate_values = [0.01, 0.05, 0.1]  # Learning rate
 n_estimators_values = [50, 100, 200]  # Number of boosting iterations (trees)
 
-# Step 2: Create the parameter grid
 lgb_param_grid = {
     'num_leaves': num_leaves_values,
     'learning_rate': learning_rate_values,
     'n_estimators': n_estimators_values
 }
 
-# Step 3: Set up regressor
-lgb_regressor = lgb.LGBMRegressor()
-
-# Step 4: Build the grid search model
-lgb_grid_search = GridSearchCV(
-    estimator=lgb_regressor,
-    param_grid=lgb_param_grid,
-    cv=5,  # 5-fold cross-validation
-    scoring='neg_mean_squared_error',  # Use negative MSE as the scoring metric
-    n_jobs=-3,  # Use all available cores
-    verbose=1  # Output progress
-)
-
-# Step 5: Fit the grid search to find the best parameters
-lgb_grid_search.fit(x_train_encoded, y_train)
-
-# Extract and plot results from GridSearchCV for LightGBM
-lgb_results = pd.DataFrame(lgb_grid_search.cv_results_)
-
-# Plot performance for different num_leaves grouped by n_estimators
-plt.figure(figsize=(10, 6))
-
-for num_leaves in num_leaves_values:  # num_leaves: [31, 50, 100]
-    subset = lgb_results[lgb_results['param_num_leaves'] == num_leaves]
-    plt.plot(
-        subset['param_n_estimators'],
-        -subset['mean_test_score'],  # Convert Negative MSE to Positive MSE
-        marker='o',
-        label=f'Num Leaves: {num_leaves}'
-    )
-
-# Customize the plot
-plt.xlabel('Number of Estimators (n_estimators)')
-plt.ylabel('Mean Test Score (Positive MSE)')
-plt.title('LightGBM: Performance vs. Number of Estimators')
-plt.legend(title='Num Leaves')
-plt.grid()
-plt.show()
-
-# Get the best parameters
-best_lgb_num_leaves_value = lgb_grid_search.best_params_['num_leaves']
-best_lgb_learning_rate_value = lgb_grid_search.best_params_['learning_rate']
-best_lgb_n_estimators_value = lgb_grid_search.best_params_['n_estimators']
-
-print(f"Best num_leaves: {best_lgb_num_leaves_value}")
-print(f"Best learning_rate: {best_lgb_learning_rate_value}")
-print(f"Best n_estimators: {best_lgb_n_estimators_value}")
-
-# Step 8: Fit the final model using the best parameters from grid search
-best_lgb_regressor = lgb.LGBMRegressor(
-    num_leaves=best_lgb_num_leaves_value,
-    learning_rate=best_lgb_learning_rate_value,
-    n_estimators=best_lgb_n_estimators_value
-)
-
-best_lgb_regressor.fit(x_train_encoded, y_train)
-
-# Model evaluation
-y_lgb_pred_train = best_lgb_regressor.predict(x_train_encoded)
-
-# evaluate model
-model_evaluation(y_train, y_lgb_pred_train)
-
-
-
-# Lets do a random forest now, seems best option for this question
-# Step 1: Define hyperparameter grid
+# Lets do a random forest too, seems best option for this question
 n_estimator_values = [50, 100, 200]  # Number of trees in the forest
 max_depth_values = [None, 10, 20, 30]  # Maximum depth of the tree
-max_features_values = ['auto', 'sqrt', 'log2']  # Number of features to consider at each split
+max_features_values = [1.0, 'sqrt', 'log2']  # Number of features to consider at each split, 1.0 is what 'auto' meant for regressors
 
-# Step 2: Create the parameter grid
 rf_param_grid = {
     'n_estimators': n_estimator_values,
     'max_depth': max_depth_values,
     'max_features': max_features_values
 }
 
-# Step 3: set up regressor
-rf_regressor = RandomForestRegressor()
-
-# Step 4: build the grid search model
-rf_grid_search = GridSearchCV(
-    estimator=rf_regressor,
-    param_grid=rf_param_grid,
+# Step 2: One search for every model instead of a GridSearchCV each
+# folds are split once, all models share the same pool of workers, and every (model, params, fold) score
+# is cached in search_cache/, so adding a value to a grid only fits the new combinations next run
+model_search = ModelSearch(
+    estimators={
+        'lightgbm': (lgb.LGBMRegressor(), lgb_param_grid),
+        'random_forest': (RandomForestRegressor(), rf_param_grid)
+    },
     cv=5,  # 5-fold cross-validation
-    scoring='neg_mean_squared_error',  # Use negative MSE as the scoring metric
+    scoring='neg_mean_squared_error',  # Use negative MSE as the scoring metric, or c_index_scorer to tune on the competition metric
     n_jobs=-3,  # Use all available cores minus 2
-    verbose=1  # Output progress
+    cache_dir='search_cache',
+    halving=False  # set True to drop the weak combinations after the first fold
 )
 
-# fit the grid search
-rf_grid_search.fit(x_train_encoded, y_train)
+model_search.fit(x_train_encoded, y_train)
 
-# Extract and plot results from GridSearchCV
-rf_results = pd.DataFrame(rf_grid_search.cv_results_)
+# Performance vs. number of estimators for each model, laid out like GridSearchCV.cv_results_
+# Instead of plt.show() stopping the run, the plots are drawn headless (Agg, no window) to plots/ as PNG and
+# HTML (the HTML has the cv results table too). n_workers=0 draws them in this process: a worker would be a fresh
+# interpreter that re-runs this whole unguarded file when it is run with python. From the interactive console
+# n_workers=1 draws them in a worker while the final models fit below
+plot_queue = PlotQueue('plots', formats=('png', 'html'), n_workers=0)
+lgb_results = model_search.cv_results('lightgbm')
+rf_results = model_search.cv_results('random_forest')
+plot_queue.submit(search_spec({'lightgbm': lgb_results}, 'lightgbm_search'))  # a line per num_leaves
+plot_queue.submit(search_spec({'random_forest': rf_results}, 'random_forest_search'))  # a line per max_features
 
-# Plot performance for different max_features grouped by n_estimators
-plt.figure(figsize=(10, 6))
+# Step 3: Fit the final models using the best parameters, both at once
+best_models = model_search.refit(x_train_encoded, y_train)
+print(plot_queue.paths)
+plot_queue.close()
 
-for max_feature in max_features_values:  # max_features: ['auto', 'sqrt', 'log2']
-    subset = rf_results[rf_results['param_max_features'] == max_feature]
-    plt.plot(
-        subset['param_n_estimators'],
-        -subset['mean_test_score'],  # Convert Negative MSE to Positive MSE
-        marker='o',
-        label=f'Max Features: {max_feature}'
-    )
+# Get the best parameters
+print(f"Best LightGBM params: {model_search.best_params_['lightgbm']}")
 
-# Customize the plot
-plt.xlabel('Number of Estimators (n_estimators)')
-plt.ylabel('Mean Test Score (Positive MSE)')
-plt.title('Random Forest Regressor: Performance vs. Number of Estimators')
-plt.legend(title='Max Features')
-plt.grid()
-plt.show()
+# Model evaluation
+best_lgb_regressor = best_models['lightgbm']
+y_lgb_pred_train = best_lgb_regressor.predict(x_train_encoded)
 
-# Get the best parameters
-best_n_estimator_value = rf_grid_search.best_params_['n_estimators']
-best_max_depth_value = rf_grid_search.best_params_['max_depth']
-best_max_features_value = rf_grid_search.best_params_['max_features']
+# evaluate model
+model_evaluation(y_train, y_lgb_pred_train)
 
-# Print the best values
-print(f"Best n_estimators: {best_n_estimator_value}")
-print(f"Best max_depth: {best_max_depth_value}")
-print(f"Best max_features: {best_max_features_value}")
-
-# fit final model using the best param
-best_rf_regressor = RandomForestRegressor(
-    n_estimators=best_n_estimator_value,
-    max_depth=best_max_depth_value,
-    max_features=best_max_features_value
-)
 
-best_rf_regressor.fit(x_train_encoded, y_train)
+# Print the best values
+print(f"Best random forest params: {model_search.best_params_['random_forest']}")
 
 # Model evaluation
+best_rf_regressor = best_models['random_forest']
 y_rf_pred_train = best_rf_regressor.predict(x_train_encoded)
 
 # evaluate model
-model_evaluation(y_train, y_rf_pred_train)
\ No newline at end of file
+model_evaluation(y_train, y_rf_pred_train)
+
+
+# Stack the models: a logistic meta-learner on each model's out-of-fold predictions
+# The OOF columns and refits are kept in oof_store/, so changing one model's settings only refits that one
+stack = StackingEnsemble(
+    base_models={
+        'linear': LinearRegression(),
+        'lightgbm': lgb.LGBMRegressor(**model_search.best_params_['lightgbm']),
+        'random_forest': RandomForestRegressor(**model_search.best_params_['random_forest'])
+    },
+    cv=5,
+    store_dir='oof_store'
+)
+stack.fit(x_train_encoded, y_train)
+print(stack.meta_weights())
+y_stack_pred_train = stack.predict_proba(x_train_encoded)[:, 1]
+
+
+# Compare every model in one table instead of reading the prints above one by one
+# r2/mse/mae plus accuracy, precision, recall, f1 and auc since efs is 0/1, each with a 95% bootstrap interval
+model_comparison = evaluate_models(
+    y_train,
+    {
+        'linear': y_lm_pred_train,
+        'lightgbm': y_lgb_pred_train,
+        'random_forest': y_rf_pred_train,
+        'stacked': y_stack_pred_train
+    },
+    n_bootstrap=1000
+)
+print(model_comparison.pivot(index='model', columns='metric', values='value').round(3))
+
+# And the competition metric for each model
+for name, y_pred_train in [('linear', y_lm_pred_train), ('lightgbm', y_lgb_pred_train), ('random_forest', y_rf_pred_train),
+                           ('stacked', y_stack_pred_train)]:
+    score, per_group = stratified_concordance(targets['efs_time'], targets['efs'], y_pred_train, race_group)
+    print(f"{name} stratified C-index: {score:.3f}")
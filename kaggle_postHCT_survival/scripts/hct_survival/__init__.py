@@ -0,0 +1,56 @@
+"""
+Reusable pieces of the HCT survival analysis, shared by the script and the notebooks.
+
+Names are imported on first use, so loading the package (or running the command
+line, see cli.py) doesn't pull in sklearn and scipy until something needs them.
+"""
+import importlib
+
+_EXPORTS = {
+    'SparseInteractionFeatures': 'interactions',
+    'infer_feature_groups': 'interactions',
+    'ScreenedInteractionFeatures': 'screening',
+    'screen_interactions': 'screening',
+    'HCTPreprocessor': 'preprocessing',
+    'clean_categoricals': 'preprocessing',
+    'ColumnStats': 'column_stats',
+    'CategoryEncoder': 'encoding',
+    'ModelSearch': 'search',
+    'load_encoded_data': 'data',
+    'read_in_data': 'data',
+    'DatasetCache': 'data_cache',
+    'evaluate_models': 'evaluation',
+    'ConcordanceScorer': 'concordance',
+    'concordance_index': 'concordance',
+    'stratified_concordance': 'concordance',
+    'OOFStore': 'stacking',
+    'StackingEnsemble': 'stacking',
+    'StageProfiler': 'profiling',
+    'OutOfCoreInteractionModel': 'out_of_core',
+    'iter_interaction_batches': 'out_of_core',
+    'FeatureImportance': 'importance',
+    'permutation_importance': 'importance',
+    'StreamingCorrelation': 'eda',
+    'ReservoirSampler': 'eda',
+    'run_eda': 'eda',
+    'PlotQueue': 'plots',
+    'history_spec': 'plots',
+    'search_spec': 'plots',
+    'BinnedBoostingSearch': 'boosting'
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(f".{_EXPORTS[name]}", __name__), name)
+    globals()[name] = value
+
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
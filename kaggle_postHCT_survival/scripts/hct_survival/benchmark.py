@@ -0,0 +1,126 @@
+"""
+Benchmarks for the HCT pipeline: load, preprocess, train, predict and evaluate.
+
+Runs every stage on synthetic data (see synthetic.py) at a few sizes and records
+wall time and peak Python/numpy memory (tracemalloc) per stage, so a change that
+slows the preprocessing or the model path down shows up as a number instead of a
+feeling. LightGBM is marked skipped when it isn't installed.
+
+    python -m hct_survival benchmark --sizes 2000 10000 28800 -o benchmark.csv
+"""
+import importlib.util
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+
+def measure(fn, *args, **kwargs):
+    """
+    Runs fn and returns (result, wall seconds, peak MB allocated while it ran).
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = fn(*args, **kwargs)
+        wall = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return result, wall, peak / 2 ** 20
+
+
+def run_benchmark(sizes=(2000, 10000, 28800), n_estimators=50, n_bootstrap=200, seed=0, workdir=None):
+    """
+    Times every stage at every size.
+
+    Args:
+        sizes: Training rows to generate.
+        n_estimators: Trees for the random forest and LightGBM stages.
+        n_bootstrap: Resamples in the evaluation stage.
+        seed: Seed for the data and the models.
+        workdir: Where the CSVs and cache go, a temp folder (removed afterwards) by default.
+
+    Returns:
+        DataFrame with size, stage, wall_s, peak_mb and status per stage.
+    """
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.linear_model import LinearRegression
+
+    from .concordance import stratified_concordance
+    from .data import load_encoded_data, read_in_data
+    from .evaluation import evaluate_models
+    from .preprocessing import HCTPreprocessor
+    from .synthetic import make_hct_data
+
+    has_lightgbm = importlib.util.find_spec('lightgbm') is not None
+    cleanup = workdir is None
+    workdir = tempfile.mkdtemp(prefix='hct_bench_') if workdir is None else workdir
+    rows = []
+
+    def record(size, stage, fn, *args, **kwargs):
+        result, wall, peak = measure(fn, *args, **kwargs)
+        rows.append({'size': size, 'stage': stage, 'wall_s': wall, 'peak_mb': peak, 'status': 'ok'})
+        return result
+
+    def skip(size, stage, reason):
+        rows.append({'size': size, 'stage': stage, 'wall_s': float('nan'), 'peak_mb': float('nan'), 'status': reason})
+
+    def preprocess(train_df, test_df):
+        preprocessor = HCTPreprocessor(drop_columns=['cmv_status'], max_missing_pct=20)
+        return preprocessor.fit_transform(train_df, test_columns=test_df.columns), preprocessor.transform(test_df)
+
+    try:
+        for size in sizes:
+            train_df, test_df = record(size, 'generate', make_hct_data, n_rows=size, seed=seed)
+
+            size_dir = os.path.join(workdir, str(size))
+            os.makedirs(size_dir, exist_ok=True)
+            train_path, test_path = os.path.join(size_dir, 'train.csv'), os.path.join(size_dir, 'test.csv')
+            train_df.to_csv(train_path, index=False)
+            test_df.to_csv(test_path, index=False)
+
+            record(size, 'load_csv', read_in_data, train_path, test_path)
+            record(size, 'load_csv_compact', read_in_data, train_path, test_path, compact=True)
+            record(size, 'preprocess', preprocess, train_df, test_df)
+
+            cache_dir = os.path.join(size_dir, 'data_cache')
+            preprocessor = HCTPreprocessor(drop_columns=['cmv_status'], max_missing_pct=20)
+            record(size, 'cache_build', load_encoded_data, train_path, test_path, preprocessor=preprocessor,
+                   cache_dir=cache_dir)
+            x_train, x_test, targets, test_ids, preprocessor = record(
+                size, 'cache_hit', load_encoded_data, train_path, test_path, preprocessor=preprocessor,
+                cache_dir=cache_dir
+            )
+            y_train = targets['efs'].to_numpy()
+
+            models = {
+                'linear': LinearRegression(),
+                'random_forest': RandomForestRegressor(n_estimators=n_estimators, max_depth=10, n_jobs=-1,
+                                                       random_state=seed)
+            }
+            if has_lightgbm:
+                import lightgbm as lgb
+                models['lightgbm'] = lgb.LGBMRegressor(n_estimators=n_estimators, random_state=seed, verbose=-1)
+            else:
+                skip(size, 'train_lightgbm', 'skipped: lightgbm not installed')
+                skip(size, 'predict_lightgbm', 'skipped: lightgbm not installed')
+
+            predictions = {}
+            for name, model in models.items():
+                record(size, f"train_{name}", model.fit, x_train, y_train)
+                predictions[name] = record(size, f"predict_{name}", model.predict, x_train)
+
+            record(size, 'evaluate', evaluate_models, y_train, predictions, n_bootstrap=n_bootstrap, random_state=seed)
+            for name, risk in predictions.items():
+                record(size, f"concordance_{name}", stratified_concordance, targets['efs_time'], targets['efs'],
+                       risk, train_df['race_group'])
+    finally:
+        if cleanup:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return pd.DataFrame(rows)
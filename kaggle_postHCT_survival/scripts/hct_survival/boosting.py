@@ -0,0 +1,307 @@
+"""
+Grid search for LightGBM and CatBoost on binned data built once per fold.
+
+Through ModelSearch every (params, fold) cell hands LightGBM a fresh frame, so it
+re-bins every feature histogram for every cell, CatBoost quantizes its Pool again
+and writes catboost_info/ each time, and both see the dummy coded matrix instead
+of the categoricals themselves. BinnedBoostingSearch keeps ModelSearch's folds,
+halving, caching and results, but:
+
+    - builds one lgb.Dataset / quantized catboost Pool per fold, reused by every cell
+    - trains candidates that only differ in n_estimators once, at the largest value,
+      and scores the smaller ones from the same booster
+    - takes the native frame (HCTPreprocessor.transform_native), so LightGBM and
+      CatBoost split on the categoricals directly
+    - never writes training logs
+
+Cells run one after another with the boosters' own threads instead of a process
+pool, the Datasets stay in this process.
+"""
+import time
+import warnings
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+from joblib import effective_n_jobs
+from sklearn.base import BaseEstimator, ClassifierMixin, RegressorMixin, clone, is_classifier
+from sklearn.metrics import check_scoring
+
+from .search import ModelSearch
+
+# names of the boosting rounds parameter, the only one that doesn't need another booster
+ROUNDS_PARAMS = ('n_estimators', 'num_boost_round', 'num_iterations', 'iterations')
+
+# LightGBM parameters that change the bins, these belong in dataset_params
+LIGHTGBM_DATASET_PARAMS = ('max_bin', 'max_bin_by_feature', 'min_data_in_bin', 'bin_construct_sample_cnt',
+                           'subsample_for_bin', 'use_missing', 'zero_as_missing', 'feature_pre_filter')
+
+# sklearn wrapper names that lgb.train spells differently, and ones it doesn't take at all
+LIGHTGBM_RENAMES = {'n_jobs': 'num_threads', 'random_state': 'seed'}
+LIGHTGBM_WRAPPER_ONLY = ('importance_type', 'class_weight', 'silent')
+
+
+def _library(estimator):
+    module = type(estimator).__module__
+    if module.startswith('lightgbm'):
+        return 'lightgbm'
+    if module.startswith('catboost'):
+        return 'catboost'
+
+    raise ValueError(f"BinnedBoostingSearch takes LightGBM and CatBoost estimators, got {type(estimator).__name__}")
+
+
+def _split_rounds(params, default):
+    params = dict(params)
+    rounds = default
+    for key in ROUNDS_PARAMS:
+        if key in params:
+            rounds = params.pop(key)
+
+    return int(rounds), params
+
+
+def _categorical_columns(X):
+    return [col for col in X.columns if isinstance(X[col].dtype, pd.CategoricalDtype)]
+
+
+def _catboost_model(estimator, params, rounds=None, **settings):
+    # rebuilt rather than set_params, CatBoost refuses iterations and n_estimators both being set
+    base = {key: value for key, value in estimator.get_params().items() if key not in ROUNDS_PARAMS}
+    base.update(params)
+    if rounds is not None:
+        base = {key: value for key, value in base.items() if key not in ROUNDS_PARAMS}
+        base['iterations'] = rounds
+
+    return type(estimator)(**base, **settings)
+
+
+def _catboost_frame(X, categorical_columns):
+    # CatBoost wants int or str categoricals without NaN, the fixed category codes are both (-1 = missing)
+    if not categorical_columns:
+        return X
+
+    X = X.copy()
+    for col in categorical_columns:
+        X[col] = X[col].cat.codes.astype(np.int32)
+
+    return X
+
+
+def native_model_input(model, X):
+    """
+    The native frame as a model refit by BinnedBoostingSearch takes it, category codes for CatBoost.
+    """
+    if _library(model) == 'catboost':
+        return _catboost_frame(X, _categorical_columns(X))
+
+    return X
+
+
+class _Predictions(BaseEstimator):
+    # stands in for a fitted model so the usual scorers (and ConcordanceScorer) can score fixed predictions
+    def __init__(self, predictions=None):
+        self.predictions = predictions
+
+    def fit(self, X, y=None):
+        return self
+
+    def predict(self, X):
+        return self.predictions
+
+
+class _RegressorPredictions(RegressorMixin, _Predictions):
+    pass
+
+
+class _ClassifierPredictions(ClassifierMixin, _Predictions):
+    classes_ = np.array([0, 1])
+
+    def predict_proba(self, X):
+        return np.column_stack([1 - self.predictions, self.predictions])
+
+    def predict(self, X):
+        return (self.predictions >= 0.5).astype(int)
+
+
+class BinnedBoostingSearch(ModelSearch):
+    """
+    ModelSearch for LightGBM and CatBoost that bins every fold once.
+
+    Args:
+        estimators: {name: (estimator, param_grid)} with lgb.LGBMRegressor/LGBMClassifier or
+            CatBoostRegressor/CatBoostClassifier estimators, e.g. {'lightgbm': (lgb.LGBMRegressor(), grid)}.
+        dataset_params: LightGBM Dataset settings (max_bin, min_data_in_bin, ...) shared by every cell.
+            They can't be in a grid since the bins are only built once.
+        border_count: CatBoost quantization borders per feature, same role as max_bin.
+        n_jobs: Threads for each booster, -3 is all cores but 2 like the searches.
+        Others: same as ModelSearch. X is the native frame from HCTPreprocessor.transform_native,
+            its category columns are used as native categoricals.
+    """
+
+    def __init__(self, estimators, scoring='neg_mean_squared_error', cv=5, n_jobs=-3, cache_dir='search_cache',
+                 halving=False, eta=3, min_folds=1, dataset_params=None, border_count=254, random_state=0, verbose=1):
+        super().__init__(estimators, scoring=scoring, cv=cv, n_jobs=n_jobs, cache_dir=cache_dir, halving=halving,
+                         eta=eta, min_folds=min_folds, preprocessor=None, random_state=random_state, verbose=verbose)
+        self.dataset_params = dataset_params
+        self.border_count = border_count
+
+        for name, (estimator, grid) in estimators.items():
+            if _library(estimator) == 'lightgbm':
+                fixed = [key for key in (grid if isinstance(grid, dict) else {}) if key in LIGHTGBM_DATASET_PARAMS]
+                if fixed:
+                    raise ValueError(f"{name}: {fixed} change the bins, set them in dataset_params instead of the grid")
+
+    def fit(self, X, y):
+        self.categorical_columns_ = _categorical_columns(X) if isinstance(X, pd.DataFrame) else []
+        self._binned = {}
+
+        return super().fit(X, y)
+
+    def refit(self, X, y, names=None):
+        """
+        Fits the best candidate of each estimator on all of X, categoricals handled natively.
+
+        Returns:
+            {name: fitted sklearn style estimator}, also kept as best_estimators_. They predict from
+            native_model_input(model, X), the native frame (with category codes for CatBoost).
+        """
+        names = list(self.estimators) if names is None else list(names)
+        categorical_columns = _categorical_columns(X) if isinstance(X, pd.DataFrame) else []
+
+        self.best_estimators_ = {}
+        for name in names:
+            estimator, _ = self.estimators[name]
+
+            if _library(estimator) == 'lightgbm':
+                model = clone(estimator).set_params(**self.best_params_[name], **self._lightgbm_dataset_params(),
+                                                    n_jobs=effective_n_jobs(self.n_jobs), verbose=-1)
+                model.fit(X, y)
+            else:
+                model = _catboost_model(estimator, self.best_params_[name], thread_count=effective_n_jobs(self.n_jobs),
+                                        allow_writing_files=False, verbose=False, border_count=self.border_count)
+                model.fit(_catboost_frame(X, categorical_columns), y, cat_features=categorical_columns)
+            self.best_estimators_[name] = model
+
+        return self.best_estimators_
+
+    def _cache_key(self, cell, candidates):
+        # the bins change every score, and binned cells aren't comparable with ModelSearch's
+        key = super()._cache_key(cell, candidates)
+        key.update(search='binned', dataset_params=self._lightgbm_dataset_params(), border_count=self.border_count)
+
+        return key
+
+    def _score_cells(self, cells, candidates):
+        # candidates that only differ in the number of rounds share one booster
+        groups = defaultdict(list)
+        for position, (name, cand, fold) in enumerate(cells):
+            rounds, params = _split_rounds(candidates[name][cand], self._default_rounds(name))
+            key = (name, fold, repr(sorted(params.items())))
+            groups[key].append((position, rounds, params))
+
+        results = [None] * len(cells)
+        for (name, fold, _), members in groups.items():
+            max_rounds = max(rounds for _, rounds, _ in members)
+            params = members[0][2]
+
+            start = time.perf_counter()
+            try:
+                predict = self._train(name, fold, params, max_rounds)
+                fit_time = time.perf_counter() - start
+                for position, rounds, _ in members:
+                    # the booster was trained once, each candidate is charged its share of the rounds
+                    score = self._score(name, fold, predict(rounds))
+                    results[position] = (float(score), fit_time * rounds / max_rounds)
+            except Exception as exc:  # same idea as GridSearchCV(error_score=np.nan)
+                warnings.warn(f"{name} failed with {params}: {exc}")
+                for position, _, _ in members:
+                    results[position] = (np.nan, time.perf_counter() - start)
+
+        return results
+
+    def _default_rounds(self, name):
+        estimator = self.estimators[name][0]
+        params = estimator.get_params()
+        rounds = next((params[key] for key in ROUNDS_PARAMS if params.get(key) is not None), None)
+
+        # LightGBM's sklearn default is 100 rounds, CatBoost's is 1000
+        return rounds if rounds is not None else (100 if _library(estimator) == 'lightgbm' else 1000)
+
+    def _train(self, name, fold, params, rounds):
+        """
+        Trains one booster on the fold's binned data, returns predict(n_rounds) for the validation rows.
+        """
+        estimator = self.estimators[name][0]
+        if _library(estimator) == 'lightgbm':
+            return self._train_lightgbm(estimator, fold, params, rounds)
+
+        return self._train_catboost(estimator, fold, params, rounds)
+
+    def _lightgbm_dataset_params(self):
+        # without feature_pre_filter=False a grid over min_child_samples can't reuse the Dataset
+        return {'feature_pre_filter': False, **(self.dataset_params or {})}
+
+    def _lightgbm_data(self, fold):
+        if ('lightgbm', fold) not in self._binned:
+            import lightgbm as lgb
+
+            X_train, y_train, _, _ = self.folds_[fold]
+            train_set = lgb.Dataset(X_train, label=np.asarray(y_train), categorical_feature='auto',
+                                    params={'verbosity': -1, **self._lightgbm_dataset_params()}, free_raw_data=False)
+            # construct now so the bins are built once, not on the first cell that uses them
+            train_set.construct()
+            self._binned[('lightgbm', fold)] = train_set
+
+        return self._binned[('lightgbm', fold)]
+
+    def _train_lightgbm(self, estimator, fold, params, rounds):
+        import lightgbm as lgb
+
+        train_set = self._lightgbm_data(fold)
+        X_val = self.folds_[fold][2]
+
+        skip = set(ROUNDS_PARAMS) | set(LIGHTGBM_WRAPPER_ONLY) | set(LIGHTGBM_DATASET_PARAMS) | {'verbose'}
+        merged = {**estimator.get_params(), **params}
+        train_params = {LIGHTGBM_RENAMES.get(key, key): value for key, value in merged.items()
+                        if value is not None and key not in skip}
+        train_params.setdefault('objective', 'binary' if is_classifier(estimator) else 'regression')
+        # the Dataset's own settings again, LightGBM checks they match the ones it was built with
+        train_params.update(self._lightgbm_dataset_params(), num_threads=effective_n_jobs(self.n_jobs), verbosity=-1)
+
+        booster = lgb.train(train_params, train_set, num_boost_round=rounds)
+
+        return lambda n_rounds: booster.predict(X_val, num_iteration=n_rounds)
+
+    def _catboost_pools(self, fold):
+        if ('catboost', fold) not in self._binned:
+            from catboost import Pool
+
+            X_train, y_train, X_val, _ = self.folds_[fold]
+            categorical = self.categorical_columns_
+            train_pool = Pool(_catboost_frame(X_train, categorical), label=np.asarray(y_train),
+                              cat_features=categorical)
+            train_pool.quantize(border_count=self.border_count)
+            val_pool = Pool(_catboost_frame(X_val, categorical), cat_features=categorical)
+            self._binned[('catboost', fold)] = (train_pool, val_pool)
+
+        return self._binned[('catboost', fold)]
+
+    def _train_catboost(self, estimator, fold, params, rounds):
+        train_pool, val_pool = self._catboost_pools(fold)
+
+        model = _catboost_model(estimator, params, rounds, thread_count=effective_n_jobs(self.n_jobs),
+                                allow_writing_files=False, verbose=False)
+        model.fit(train_pool)
+
+        if is_classifier(estimator):
+            return lambda n_rounds: model.predict(val_pool, prediction_type='Probability', ntree_end=n_rounds)[:, 1]
+
+        return lambda n_rounds: model.predict(val_pool, ntree_end=n_rounds)
+
+    def _score(self, name, fold, predictions):
+        _, _, X_val, y_val = self.folds_[fold]
+        wrapper_cls = _ClassifierPredictions if is_classifier(self.estimators[name][0]) else _RegressorPredictions
+        wrapper = wrapper_cls(np.asarray(predictions, dtype=np.float64))
+
+        return check_scoring(wrapper, scoring=self.scoring)(wrapper, X_val, y_val)
@@ -0,0 +1,538 @@
+"""
+Command line entry point for the HCT analysis, run from the scripts folder:
+
+    python -m hct_survival inspect train.csv test.csv
+    python -m hct_survival train train.csv test.csv --models lightgbm random_forest --out models
+    python -m hct_survival train train.csv test.csv --models lightgbm catboost --native --out native_models
+    python -m hct_survival predict models test.csv -o submission.csv
+    python -m hct_survival importance models --top 30 --permutation train.csv -o importance
+    python -m hct_survival plot search models -o search.png
+    python -m hct_survival plot corr train.csv -o corr.png
+    python -m hct_survival eda train.csv -o eda --sample-size 5000 --stratify race_group
+    python -m hct_survival startup --train train.csv --test test.csv --models-dir models
+    python -m hct_survival benchmark --sizes 2000 10000 28800 -o benchmark.csv
+
+train and predict take --profile to write a per-stage timing report (wall, CPU, peak
+RSS) next to their output, and --cprofile to also keep cProfile stats per stage.
+train --plots draws the search results to <out>/plots in a worker process while the
+best models refit, instead of stopping on a plot window.
+
+Inital Analysis.py imports seaborn, matplotlib, lightgbm and the sklearn models up
+front and then runs everything top to bottom. Each subcommand here imports only what
+it needs inside its handler: inspect stays on pandas, predict adds joblib and
+whatever the saved models were built from, and only plot touches the plotting
+libraries. startup times the subcommands from a cold interpreter and lists any heavy
+module that got imported anyway.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+HEAVY_MODULES = ('sklearn', 'lightgbm', 'catboost', 'xgboost', 'matplotlib', 'seaborn')
+
+# same grids as Inital Analysis.py
+DEFAULT_GRIDS = {
+    'lightgbm': {
+        'num_leaves': [25, 50, 100],
+        'learning_rate': [0.01, 0.05, 0.1],
+        'n_estimators': [50, 100, 200]
+    },
+    'random_forest': {
+        'n_estimators': [50, 100, 200],
+        'max_depth': [None, 10, 20, 30],
+        'max_features': [1.0, 'sqrt', 'log2']  # 1.0 is the old 'auto' for regressors, removed in sklearn 1.3
+    },
+    'catboost': {
+        'depth': [4, 6, 8],
+        'learning_rate': [0.03, 0.1],
+        'n_estimators': [200, 500, 1000]
+    }
+}
+
+# models that split on categoricals and missing values themselves, see --native
+NATIVE_MODELS = ('lightgbm', 'catboost')
+
+PREPROCESSOR_FILE = 'preprocessor.json'
+BEST_PARAMS_FILE = 'best_params.json'
+TIMINGS_FILE = 'timings.json'
+
+
+def _make_preprocessor(args):
+    from .preprocessing import HCTPreprocessor
+
+    return HCTPreprocessor(target_columns=['efs', 'efs_time'], drop_columns=args.drop_columns,
+                           max_missing_pct=args.max_missing_pct)
+
+
+def _make_estimator(name):
+    if name == 'lightgbm':
+        import lightgbm as lgb
+        return lgb.LGBMRegressor(verbose=-1)
+    if name == 'random_forest':
+        from sklearn.ensemble import RandomForestRegressor
+        return RandomForestRegressor()
+    if name == 'catboost':
+        from catboost import CatBoostRegressor
+        # no catboost_info/ folder of training logs on every fit
+        return CatBoostRegressor(verbose=False, allow_writing_files=False)
+
+    raise ValueError(f"Unknown model {name}, expected one of {sorted(DEFAULT_GRIDS)}")
+
+
+def _make_profiler(args, report_path):
+    """
+    StageProfiler when --profile or --cprofile was given, else None. Returns (profiler, report path).
+    """
+    if args.profile is None and not args.cprofile:
+        return None, None
+
+    from .profiling import StageProfiler
+
+    report_path = args.profile or report_path
+    profile_dir = os.path.join(os.path.dirname(report_path), 'profiles') if args.cprofile else None
+
+    return StageProfiler(profile_dir=profile_dir), report_path
+
+
+def _save_profile(profiler, report_path, args):
+    if profiler is None:
+        return
+
+    arguments = {key: value for key, value in vars(args).items() if key != 'handler'}
+    profiler.save(report_path, command=args.command, arguments=arguments)
+    print(profiler.summary().round(3).to_string(index=False), file=sys.stderr)
+    print(f"timings written to {report_path}", file=sys.stderr)
+
+
+def _inspect(args):
+    from .column_stats import ColumnStats
+    from .data import load_encoded_data
+
+    stats = ColumnStats.from_csv(args.train, cache_dir=args.cache_dir)
+    print(f"train: {stats.n_rows} rows x {len(stats.columns)} columns")
+    print(f"numeric: {len(stats.numeric_columns)}, categorical: {len(stats.categorical_columns)}")
+
+    missing_percentage = stats.missing_percentage().sort_values(ascending=False)
+    print(f"\nmost missing (% of rows):\n{missing_percentage.head(args.top).round(1).to_string()}")
+
+    x_train_encoded, x_test_encoded, targets, test_ids, preprocessor = load_encoded_data(
+        args.train, args.test, preprocessor=_make_preprocessor(args), cache_dir=args.cache_dir
+    )
+    print(f"\nencoded train: {x_train_encoded.shape}, encoded test: {x_test_encoded.shape}")
+    print(f"numeric columns: {len(preprocessor.numeric_columns_)}, "
+          f"categorical columns: {len(preprocessor.categorical_columns_)}")
+    print(f"\ntargets:\n{targets.describe().round(3).to_string()}")
+
+
+def _train(args):
+    import joblib
+
+    from .data import load_encoded_data
+    from .profiling import get_profiler
+    from .search import ModelSearch
+
+    profiler, report_path = _make_profiler(args, os.path.join(args.out, TIMINGS_FILE))
+    stages = get_profiler(profiler)
+
+    if args.native:
+        not_native = [name for name in args.models if name not in NATIVE_MODELS]
+        if not_native:
+            raise SystemExit(f"--native only works with {', '.join(NATIVE_MODELS)}, not {', '.join(not_native)}")
+
+        from .data import read_in_data
+
+        # raw columns with NaNs and categoricals, the preprocessor only supplies the columns and levels
+        with stages.stage('data'):
+            with stages.stage('load'):
+                train_df, test_df = read_in_data(args.train, args.test, compact=True)
+            preprocessor = _make_preprocessor(args).fit(train_df, test_columns=test_df.columns, profiler=profiler)
+            with stages.stage('native'):
+                x_train_encoded = preprocessor.transform_native(train_df)
+        targets = train_df[[col for col in preprocessor.target_columns if col in train_df.columns]]
+    else:
+        with stages.stage('data'):
+            x_train_encoded, x_test_encoded, targets, test_ids, preprocessor = load_encoded_data(
+                args.train, args.test, preprocessor=_make_preprocessor(args), cache_dir=args.cache_dir,
+                profiler=profiler
+            )
+    y_train = targets[args.target]
+
+    scoring = 'neg_mean_squared_error'
+    if args.scoring == 'concordance':
+        from .concordance import ConcordanceScorer
+
+        import pandas as pd
+
+        race_group = pd.read_csv(args.train, usecols=[args.group_column])[args.group_column]
+        scoring = ConcordanceScorer(targets['efs_time'], targets['efs'], groups=race_group,
+                                    higher_is_risk=args.target != 'efs_time')
+
+    if args.native:
+        from .boosting import BinnedBoostingSearch as search_class
+    else:
+        search_class = ModelSearch
+
+    model_search = search_class(
+        estimators={name: (_make_estimator(name), DEFAULT_GRIDS[name]) for name in args.models},
+        cv=args.cv,
+        scoring=scoring,
+        n_jobs=args.n_jobs,
+        cache_dir=args.search_cache,
+        halving=args.halving
+    )
+    plots = None
+    if args.plots:
+        from .plots import PlotQueue
+
+        plots = PlotQueue(os.path.join(args.out, 'plots'), formats=('png', 'html'), n_workers=1)
+
+    with stages.stage('fit'):
+        with stages.stage('search', models=args.models, cv=args.cv, n_jobs=args.n_jobs):
+            model_search.fit(x_train_encoded, y_train)
+        if plots is not None:
+            from .plots import search_spec
+
+            # drawn in the background while the best models are refit
+            for name in args.models:
+                plots.submit(search_spec({name: model_search.cv_results(name)}, f"{name}_search",
+                                         higher_is_better=args.scoring == 'concordance'))
+        with stages.stage('refit'):
+            best_models = model_search.refit(x_train_encoded, y_train)
+
+    os.makedirs(args.out, exist_ok=True)
+    preprocessor.save(os.path.join(args.out, PREPROCESSOR_FILE))
+    for name, model in best_models.items():
+        with stages.stage('save', model=name):
+            joblib.dump(model, os.path.join(args.out, f"{name}.joblib"))
+        model_search.cv_results(name).to_csv(os.path.join(args.out, f"{name}_cv_results.csv"), index=False)
+        score_name = 'cv MSE' if args.scoring == 'mse' else 'cv stratified C-index'
+        score = -model_search.best_scores_[name] if args.scoring == 'mse' else model_search.best_scores_[name]
+        print(f"{name}: best params {model_search.best_params_[name]}, {score_name} {score:.4f}")
+
+    with open(os.path.join(args.out, BEST_PARAMS_FILE), 'w') as f:
+        json.dump({'target': args.target, 'scoring': args.scoring, 'models': list(best_models),
+                   'encoding': 'native' if args.native else 'dummies',
+                   'best_params': model_search.best_params_,
+                   'best_scores': {name: float(score) for name, score in model_search.best_scores_.items()}},
+                  f, indent=2, default=str)
+
+    if plots is not None:
+        with stages.stage('plots'):
+            print(f"plots: {', '.join(plots.paths)}")
+            plots.close()
+
+    _save_profile(profiler, report_path, args)
+
+
+def _predict(args):
+    import joblib
+    import pandas as pd
+
+    from .preprocessing import HCTPreprocessor
+    from .profiling import get_profiler
+
+    # the report goes next to the predictions, or into the models folder when they are printed
+    default_report = os.path.splitext(args.output)[0] + '_' + TIMINGS_FILE if args.output is not None \
+        else os.path.join(args.models_dir, 'predict_' + TIMINGS_FILE)
+    profiler, report_path = _make_profiler(args, default_report)
+    stages = get_profiler(profiler)
+
+    with open(os.path.join(args.models_dir, BEST_PARAMS_FILE)) as f:
+        saved = json.load(f)
+
+    preprocessor = HCTPreprocessor.load(os.path.join(args.models_dir, PREPROCESSOR_FILE))
+    with stages.stage('load'):
+        test_df = pd.read_csv(args.csv)
+    native = saved.get('encoding') == 'native'
+    with stages.stage('preprocess', rows=len(test_df)):
+        x_test_encoded = preprocessor.transform_native(test_df) if native \
+            else preprocessor.transform(test_df, profiler=profiler)
+
+    output_df = test_df[[args.id_column]].reset_index(drop=True) if args.id_column in test_df.columns \
+        else pd.DataFrame(index=range(len(test_df)))
+    for name in args.models or saved['models']:
+        with stages.stage('predict', model=name):
+            model = joblib.load(os.path.join(args.models_dir, f"{name}.joblib"))
+            if native:
+                from .boosting import native_model_input
+                output_df[f"{name}_{saved['target']}"] = model.predict(native_model_input(model, x_test_encoded))
+            else:
+                output_df[f"{name}_{saved['target']}"] = model.predict(x_test_encoded)
+
+    if args.output is None:
+        print(output_df.to_csv(index=False), end='')
+    else:
+        output_df.to_csv(args.output, index=False)
+
+    _save_profile(profiler, report_path, args)
+
+
+def _importance(args):
+    import joblib
+    import pandas as pd
+
+    from .importance import FeatureImportance, permutation_importance
+    from .preprocessing import HCTPreprocessor
+
+    with open(os.path.join(args.models_dir, BEST_PARAMS_FILE)) as f:
+        saved = json.load(f)
+
+    preprocessor = HCTPreprocessor.load(os.path.join(args.models_dir, PREPROCESSOR_FILE))
+    native = saved.get('encoding') == 'native'
+    if args.permutation is not None:
+        train_df = pd.read_csv(args.permutation)
+        if args.sample is not None and args.sample < len(train_df):
+            train_df = train_df.sample(args.sample, random_state=0)
+        x_encoded = preprocessor.transform_native(train_df) if native else preprocessor.transform(train_df)
+
+    for name in args.models or saved['models']:
+        model = joblib.load(os.path.join(args.models_dir, f"{name}.joblib"))
+        feature_names = preprocessor.native_feature_names_ if native else preprocessor.feature_names_out_
+        importance = FeatureImportance.from_model(model, feature_names=feature_names)
+
+        print(f"{name} ({importance.kind}), top {args.top}:")
+        print(importance.top(args.top).to_string(index=False))
+        print(f"\n{name} by variable:")
+        print(importance.by_parent(categorical_columns=preprocessor.categorical_columns_, level='variable')
+              .head(args.top).to_string(index=False))
+
+        if args.permutation is not None:
+            if native:
+                from .boosting import native_model_input
+                x_encoded = native_model_input(model, x_encoded)
+            permuted = permutation_importance(model, x_encoded, train_df[saved['target']],
+                                              scoring='neg_mean_squared_error',
+                                              categorical_columns=preprocessor.categorical_columns_,
+                                              n_repeats=args.n_repeats, n_jobs=args.n_jobs)
+            print(f"\n{name} permutation importance (MSE increase):")
+            print(permuted.head(args.top).to_string(index=False))
+
+        if args.output is not None:
+            os.makedirs(args.output, exist_ok=True)
+            importance.save(os.path.join(args.output, f"{name}_importance.npz"))
+            if args.permutation is not None:
+                permuted.to_csv(os.path.join(args.output, f"{name}_permutation.csv"), index=False)
+        print()
+
+
+def _plot(args):
+    import matplotlib
+    if args.output is not None:
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import pandas as pd
+
+    if args.kind == 'search':
+        from .plots import draw, render, search_spec
+
+        # the Inital Analysis.py plots: cv score against n_estimators, one line per value of the other setting
+        with open(os.path.join(args.source, BEST_PARAMS_FILE)) as f:
+            saved = json.load(f)
+        results = {name: pd.read_csv(os.path.join(args.source, f"{name}_cv_results.csv")) for name in saved['models']}
+        spec = search_spec(results, 'search', higher_is_better=saved.get('scoring') == 'concordance')
+
+        if args.output is not None:
+            # straight to the file on an Agg canvas, .html adds the cv_results table under the image
+            stem, extension = os.path.splitext(args.output)
+            spec['name'] = os.path.basename(stem)
+            for path in render(spec, os.path.dirname(stem) or '.', formats=(extension.lstrip('.') or 'png',)):
+                print(f"saved {path}")
+            return
+        draw(plt.figure(figsize=(10 * len(results), 6)), spec)
+        plt.tight_layout()
+    else:
+        import seaborn as sns
+
+        from .eda import scan
+
+        corr, _ = scan(args.source, sample_size=0)
+        plt.figure(figsize=(15, 12))
+        sns.heatmap(corr, annot=True, cmap='coolwarm', fmt='.2f')
+        plt.title('Correlation Matrix')
+
+    if args.output is None:
+        plt.show()
+    else:
+        plt.savefig(args.output, dpi=120)
+        print(f"saved {args.output}")
+
+
+def _time_command(argv):
+    # run the subcommand in a fresh interpreter and report what it imported
+    code = (
+        "import json, runpy, sys, time\n"
+        "start = time.perf_counter()\n"
+        f"sys.argv = ['hct_survival'] + {argv!r}\n"
+        "try:\n"
+        "    runpy.run_module('hct_survival', run_name='__main__')\n"
+        "except SystemExit:\n"
+        "    pass\n"
+        f"heavy = [name for name in {HEAVY_MODULES!r} if name in sys.modules]\n"
+        "sys.stderr.write(json.dumps({'seconds': time.perf_counter() - start, 'heavy_imports': heavy}) + '\\n')\n"
+    )
+    package_parent = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, cwd=os.getcwd(),
+                            env=dict(os.environ, PYTHONPATH=os.pathsep.join(
+                                filter(None, [package_parent, os.environ.get('PYTHONPATH')]))))
+    if result.returncode != 0:
+        raise RuntimeError(f"{' '.join(argv)} failed:\n{result.stderr}")
+
+    return json.loads(result.stderr.strip().splitlines()[-1])
+
+
+def _startup(args):
+    commands = {'help': ['--help']}
+    if args.train and args.test:
+        commands['inspect'] = ['inspect', args.train, args.test, '--cache-dir', args.cache_dir]
+    if args.models_dir and args.test:
+        commands['predict'] = ['predict', args.models_dir, args.test, '-o', os.devnull]
+
+    rows = []
+    for name, argv in commands.items():
+        runs = [_time_command(argv) for _ in range(args.repeats)]
+        seconds = sorted(run['seconds'] for run in runs)
+        rows.append({'command': name, 'median_seconds': seconds[len(seconds) // 2], 'min_seconds': seconds[0],
+                     'heavy_imports': runs[-1]['heavy_imports']})
+
+    for row in rows:
+        heavy = ', '.join(row['heavy_imports']) or 'none'
+        print(f"{row['command']:<8} median {row['median_seconds']:.3f}s  min {row['min_seconds']:.3f}s  "
+              f"heavy imports: {heavy}")
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump({'measured': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': sys.version.split()[0],
+                       'results': rows}, f, indent=2)
+
+
+def _eda(args):
+    from .eda import run_eda
+
+    paths = run_eda(args.csv, args.output, columns=args.columns, pairplot_columns=args.pairplot_columns,
+                    max_pairplot_columns=args.max_pairplot_columns, sample_size=args.sample_size,
+                    stratify=args.stratify, chunk_size=args.chunk_size, random_state=args.seed)
+    for kind, path in paths.items():
+        print(f"{kind}: {path}")
+
+
+def _benchmark(args):
+    from .benchmark import run_benchmark
+
+    results = run_benchmark(sizes=args.sizes, n_estimators=args.n_estimators, n_bootstrap=args.n_bootstrap,
+                            workdir=args.workdir)
+    print(results.to_string(index=False, float_format=lambda value: f"{value:.3f}"))
+
+    if args.output is not None:
+        results.to_csv(args.output, index=False)
+
+
+def _add_data_arguments(parser):
+    parser.add_argument('train')
+    parser.add_argument('test')
+    parser.add_argument('--drop-columns', nargs='*', default=['cmv_status'])
+    parser.add_argument('--max-missing-pct', type=float, default=20)
+    parser.add_argument('--cache-dir', default='data_cache')
+
+
+def _add_profile_arguments(parser, default_location):
+    parser.add_argument('--profile', nargs='?', const='', default=None, metavar='PATH',
+                        help=f"write per-stage wall/CPU/peak RSS timings, to {default_location} by default")
+    parser.add_argument('--cprofile', action='store_true',
+                        help='also run each stage under cProfile, .prof files go to profiles/ next to the report')
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m hct_survival', description='HCT survival models')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    inspect = subparsers.add_parser('inspect', help='summarize the raw and encoded data')
+    _add_data_arguments(inspect)
+    inspect.add_argument('--top', type=int, default=15, help='how many of the most missing columns to list')
+    inspect.set_defaults(handler=_inspect)
+
+    train = subparsers.add_parser('train', help='search, refit and save the models')
+    _add_data_arguments(train)
+    train.add_argument('--models', nargs='+', choices=sorted(DEFAULT_GRIDS), default=['lightgbm', 'random_forest'])
+    train.add_argument('--target', default='efs')
+    train.add_argument('--scoring', choices=['mse', 'concordance'], default='mse',
+                       help='concordance tunes on the stratified C-index of the competition')
+    train.add_argument('--group-column', default='race_group', help='strata for --scoring concordance')
+    train.add_argument('--cv', type=int, default=5)
+    train.add_argument('--n-jobs', type=int, default=-3)
+    train.add_argument('--halving', action='store_true')
+    train.add_argument('--native', action='store_true',
+                       help='lightgbm/catboost only: native categoricals and missing values, data binned once per '
+                            'fold and shared by the whole grid')
+    train.add_argument('--search-cache', default='search_cache')
+    train.add_argument('--out', default='models')
+    train.add_argument('--plots', action='store_true',
+                       help='draw the search results to <out>/plots (PNG and HTML) in a worker process during refit')
+    _add_profile_arguments(train, f"<out>/{TIMINGS_FILE}")
+    train.set_defaults(handler=_train)
+
+    predict = subparsers.add_parser('predict', help='score new patients with the saved models')
+    predict.add_argument('models_dir')
+    predict.add_argument('csv')
+    predict.add_argument('--models', nargs='+', help='defaults to every saved model')
+    predict.add_argument('--id-column', default='ID')
+    predict.add_argument('-o', '--output', help='output CSV, printed if left out')
+    _add_profile_arguments(predict, f"<output>_{TIMINGS_FILE}")
+    predict.set_defaults(handler=_predict)
+
+    importance = subparsers.add_parser('importance', help='top features, per variable totals and permutation '
+                                                          'importance of the saved models')
+    importance.add_argument('models_dir')
+    importance.add_argument('--models', nargs='+', help='defaults to every saved model')
+    importance.add_argument('--top', type=int, default=30)
+    importance.add_argument('--permutation', metavar='CSV', help='labelled data to compute permutation importance on')
+    importance.add_argument('--sample', type=int, default=5000, help='rows of --permutation to use')
+    importance.add_argument('--n-repeats', type=int, default=5)
+    importance.add_argument('--n-jobs', type=int, default=-3)
+    importance.add_argument('-o', '--output', help='folder for the .npz importances (and permutation CSVs)')
+    importance.set_defaults(handler=_importance)
+
+    plot = subparsers.add_parser('plot', help='search results of a models folder, or a correlation heatmap')
+    plot.add_argument('kind', choices=['search', 'corr'])
+    plot.add_argument('source', help='models folder for search, train CSV for corr')
+    plot.add_argument('-o', '--output', help='image file (.png, or .html for search), shown in a window if left out')
+    plot.set_defaults(handler=_plot)
+
+    eda = subparsers.add_parser('eda', help='correlations, heatmap and a sampled pairplot in one pass, saved to files')
+    eda.add_argument('csv')
+    eda.add_argument('-o', '--output', default='eda', help='folder for the CSVs and images')
+    eda.add_argument('--columns', nargs='+', help='numeric columns to correlate, all by default')
+    eda.add_argument('--pairplot-columns', nargs='+', help='columns for the pairplot, the first '
+                                                            '--max-pairplot-columns of --columns by default')
+    eda.add_argument('--max-pairplot-columns', type=int, default=12)
+    eda.add_argument('--sample-size', type=int, default=5000, help='rows drawn for the scatter and KDE panels')
+    eda.add_argument('--stratify', help='column to stratify the sample on (and colour by), e.g. race_group')
+    eda.add_argument('--chunk-size', type=int, default=50_000)
+    eda.add_argument('--seed', type=int, default=0)
+    eda.set_defaults(handler=_eda)
+
+    startup = subparsers.add_parser('startup', help='time the subcommands from a cold interpreter')
+    startup.add_argument('--train')
+    startup.add_argument('--test')
+    startup.add_argument('--models-dir')
+    startup.add_argument('--cache-dir', default='data_cache')
+    startup.add_argument('--repeats', type=int, default=5)
+    startup.add_argument('-o', '--output', help='JSON file for the timings')
+    startup.set_defaults(handler=_startup)
+
+    benchmark = subparsers.add_parser('benchmark', help='time load/preprocess/train/predict/evaluate on synthetic data')
+    benchmark.add_argument('--sizes', type=int, nargs='+', default=[2000, 10000, 28800])
+    benchmark.add_argument('--n-estimators', type=int, default=50)
+    benchmark.add_argument('--n-bootstrap', type=int, default=200)
+    benchmark.add_argument('--workdir', help='keep the generated files here instead of a temp folder')
+    benchmark.add_argument('-o', '--output', help='CSV file for the results')
+    benchmark.set_defaults(handler=_benchmark)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.handler(args)
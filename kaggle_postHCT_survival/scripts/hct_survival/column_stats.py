@@ -0,0 +1,283 @@
+"""
+Column statistics for the HCT tables in one pass.
+
+Inital Analysis.py goes over train_df again for every number it needs:
+isnull().mean() for the missing report, again for the < 20 % filter, describe(),
+the means for the imputation and then the scaler's means and stds. ColumnStats
+gets all of it in a single sweep (null rate, mean, variance, min/max for numeric
+columns, distinct values for the rest) and can be fed a CSV chunk by chunk, the
+chunks are merged with Chan et al.'s parallel form of Welford's update so the
+numbers match a single pass over the whole table. HCTPreprocessor.fit takes it
+for the missingness filter, the imputation means and the scales, and from_csv
+caches it next to the encoded data.
+"""
+import numpy as np
+import pandas as pd
+
+from .data_cache import DatasetCache
+
+
+class ColumnStats:
+    """
+    Running statistics for every column of a table, fed one or more chunks.
+
+        stats = ColumnStats.from_csv('train.csv')               # one pass, cached
+        stats = ColumnStats().update(chunk_1).update(chunk_2)   # or by hand
+    """
+
+    def __init__(self):
+        self.n_rows = 0
+        self.columns = []
+        self.numeric_columns = []
+        self._numeric_index = {}
+        self._nulls = {}
+        self._count = np.zeros(0)
+        self._mean = np.zeros(0)
+        self._m2 = np.zeros(0)
+        self._min = np.zeros(0)
+        self._max = np.zeros(0)
+        self._value_counts = {}
+
+    @classmethod
+    def from_frame(cls, df, chunk_size=None):
+        """
+        Statistics of a DataFrame, chunk_size rows at a time (all at once by default).
+        """
+        stats = cls()
+        chunk_size = len(df) if not chunk_size else chunk_size
+        for start in range(0, max(len(df), 1), max(chunk_size, 1)):
+            stats.update(df.iloc[start:start + chunk_size])
+
+        return stats
+
+    @classmethod
+    def from_csv(cls, path, chunksize=50_000, cache_dir='data_cache', use_cache=True, **read_csv_kwargs):
+        """
+        Statistics of a CSV, read once in chunks so the whole file is never in memory.
+
+        Args:
+            path: CSV file.
+            chunksize: Rows per chunk.
+            cache_dir: Where the result is cached, keyed on the file contents (DatasetCache).
+            use_cache: False always rescans.
+            read_csv_kwargs: Passed to pd.read_csv (usecols, dtype, ...).
+        """
+        cache = DatasetCache(cache_dir)
+        key = cache.key([path], {'kind': 'column_stats', 'version': 1, 'read_csv': read_csv_kwargs}) \
+            if use_cache else None
+        cached = cache.load(key) if use_cache else None
+        if cached is not None:
+            return cls.from_dict(cached[1])
+
+        stats = cls()
+        for chunk in pd.read_csv(path, chunksize=chunksize, **read_csv_kwargs):
+            stats.update(chunk)
+
+        if use_cache:
+            cache.save(key, {}, stats.to_dict())
+
+        return stats
+
+    def update(self, chunk):
+        """
+        Adds a chunk of rows. Columns first seen in a later chunk count as missing before it, and a column
+        with no values yet is typed by the first chunk that has some.
+        """
+        self._add_columns(chunk)
+        self._retype_empty_columns(chunk)
+        n_chunk = len(chunk)
+
+        for col in self.columns:
+            if col not in chunk.columns:
+                self._nulls[col] += n_chunk
+
+        numeric = [col for col in self.numeric_columns if col in chunk.columns]
+        if numeric and n_chunk:
+            idx = np.asarray([self._numeric_index[col] for col in numeric])
+            values = chunk[numeric].to_numpy(dtype=np.float64)
+            observed = ~np.isnan(values)
+
+            count_b = observed.sum(axis=0).astype(np.float64)
+            has_values = count_b > 0
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mean_b = np.where(has_values, np.nansum(values, axis=0) / count_b, 0.0)
+                m2_b = np.nansum((values - mean_b) ** 2, axis=0)
+            min_b = np.where(observed, values, np.inf).min(axis=0)
+            max_b = np.where(observed, values, -np.inf).max(axis=0)
+
+            # Chan et al.: combine (count, mean, M2) of what we had with the chunk's
+            count_a, mean_a, m2_a = self._count[idx], self._mean[idx], self._m2[idx]
+            total = count_a + count_b
+            delta = mean_b - mean_a
+            with np.errstate(invalid='ignore', divide='ignore'):
+                share = np.where(total > 0, count_b / total, 0.0)
+            self._mean[idx] = mean_a + delta * share
+            self._m2[idx] = m2_a + m2_b + delta ** 2 * count_a * share
+            self._count[idx] = total
+            self._min[idx] = np.minimum(self._min[idx], min_b)
+            self._max[idx] = np.maximum(self._max[idx], max_b)
+            for col, n_missing in zip(numeric, n_chunk - count_b):
+                self._nulls[col] += int(n_missing)
+
+        categorical = [col for col in self._value_counts if col in chunk.columns]
+        if categorical and n_chunk:
+            # one factorize over every categorical value, then a bincount per (column, value) pair
+            codes, uniques = pd.factorize(chunk[categorical].to_numpy(dtype=object).ravel())
+            codes = codes.reshape(n_chunk, len(categorical))
+            for position, col in enumerate(categorical):
+                col_codes = codes[:, position]
+                counts = np.bincount(col_codes[col_codes >= 0], minlength=len(uniques))
+                self._nulls[col] += int((col_codes < 0).sum())
+                running = self._value_counts[col]
+                for code in np.flatnonzero(counts):
+                    running[uniques[code]] = running.get(uniques[code], 0) + int(counts[code])
+
+        self.n_rows += n_chunk
+
+        return self
+
+    @property
+    def categorical_columns(self):
+        return list(self._value_counts)
+
+    @property
+    def null_rate(self):
+        return pd.Series([self._nulls[col] / self.n_rows if self.n_rows else np.nan for col in self.columns],
+                         index=self.columns, dtype=np.float64)
+
+    def missing_percentage(self):
+        """
+        Same numbers as df.isnull().mean() * 100.
+        """
+        return self.null_rate * 100
+
+    @property
+    def count(self):
+        return self._numeric_series(self._count)
+
+    @property
+    def mean(self):
+        return self._numeric_series(np.where(self._count > 0, self._mean, np.nan))
+
+    def variance(self, ddof=0):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self._numeric_series(np.where(self._count > ddof, self._m2 / (self._count - ddof), np.nan))
+
+    def std(self, ddof=0):
+        return np.sqrt(self.variance(ddof=ddof))
+
+    def imputed_std(self):
+        """
+        Std (ddof=0) after filling the missing values with the mean, what the old
+        fillna(mean) then StandardScaler chain measured. Filled values add no deviation,
+        so it's the same M2 spread over every row.
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self._numeric_series(np.where(self._count > 0, np.sqrt(self._m2 / self.n_rows), np.nan))
+
+    @property
+    def min(self):
+        return self._numeric_series(np.where(self._count > 0, self._min, np.nan))
+
+    @property
+    def max(self):
+        return self._numeric_series(np.where(self._count > 0, self._max, np.nan))
+
+    @property
+    def cardinality(self):
+        return pd.Series({col: len(counts) for col, counts in self._value_counts.items()}, dtype=np.int64)
+
+    def value_counts(self, column):
+        return pd.Series(self._value_counts[column], dtype=np.int64).sort_values(ascending=False)
+
+    def to_frame(self):
+        """
+        One row per column: type, missing %, mean, std, min, max and cardinality, like
+        describe() plus the missing report in one table.
+        """
+        summary = pd.DataFrame(index=pd.Index(self.columns, name='column'))
+        summary['kind'] = ['numeric' if col in self._numeric_index else 'categorical' for col in self.columns]
+        summary['missing_pct'] = self.missing_percentage()
+        summary['count'] = self.count
+        summary['mean'] = self.mean
+        summary['std'] = self.std(ddof=1)
+        summary['min'] = self.min
+        summary['max'] = self.max
+        summary['cardinality'] = self.cardinality
+
+        return summary
+
+    def to_dict(self):
+        """
+        The running state as plain JSON friendly types.
+        """
+        return {
+            'n_rows': self.n_rows,
+            'columns': self.columns,
+            'numeric_columns': self.numeric_columns,
+            'nulls': self._nulls,
+            'count': self._count.tolist(),
+            'mean': self._mean.tolist(),
+            'm2': self._m2.tolist(),
+            'min': self._min.tolist(),
+            'max': self._max.tolist(),
+            # JSON keys are strings, categorical values are strings in the HCT data anyway
+            'value_counts': {col: [[str(value), count] for value, count in counts.items()]
+                             for col, counts in self._value_counts.items()}
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        stats = cls()
+        stats.n_rows = state['n_rows']
+        stats.columns = list(state['columns'])
+        stats.numeric_columns = list(state['numeric_columns'])
+        stats._numeric_index = {col: idx for idx, col in enumerate(stats.numeric_columns)}
+        stats._nulls = dict(state['nulls'])
+        for name in ('count', 'mean', 'm2', 'min', 'max'):
+            setattr(stats, f"_{name}", np.asarray(state[name], dtype=np.float64))
+        stats._value_counts = {col: {value: count for value, count in counts}
+                               for col, counts in state['value_counts'].items()}
+
+        return stats
+
+    def _add_columns(self, chunk):
+        new_numeric = []
+        for col in chunk.columns:
+            if col in self._nulls:
+                continue
+            self.columns.append(col)
+            self._nulls[col] = self.n_rows
+            if pd.api.types.is_numeric_dtype(chunk[col]) and not pd.api.types.is_bool_dtype(chunk[col]):
+                self._numeric_index[col] = len(self.numeric_columns)
+                self.numeric_columns.append(col)
+                new_numeric.append(col)
+            else:
+                self._value_counts[col] = {}
+
+        if new_numeric:
+            n_new = len(new_numeric)
+            self._count = np.append(self._count, np.zeros(n_new))
+            self._mean = np.append(self._mean, np.zeros(n_new))
+            self._m2 = np.append(self._m2, np.zeros(n_new))
+            self._min = np.append(self._min, np.full(n_new, np.inf))
+            self._max = np.append(self._max, np.full(n_new, -np.inf))
+
+    def _retype_empty_columns(self, chunk):
+        # a column that was all missing so far reads as float64, strings turning up later make it categorical
+        demote = [col for col in self.numeric_columns
+                  if col in chunk.columns and self._count[self._numeric_index[col]] == 0
+                  and not pd.api.types.is_numeric_dtype(chunk[col])]
+        if not demote:
+            return
+
+        keep = np.asarray([col not in demote for col in self.numeric_columns])
+        self.numeric_columns = [col for col in self.numeric_columns if col not in demote]
+        self._numeric_index = {col: idx for idx, col in enumerate(self.numeric_columns)}
+        for name in ('_count', '_mean', '_m2', '_min', '_max'):
+            setattr(self, name, getattr(self, name)[keep])
+        for col in demote:
+            self._value_counts[col] = {}
+
+    def _numeric_series(self, values):
+        return pd.Series(values, index=self.numeric_columns, dtype=np.float64)
@@ -0,0 +1,103 @@
+"""
+Compact dtypes for the loaded tables.
+
+pd.read_csv gives every number float64/int64 and every string an object column,
+even though most HCT columns are small scores, counts and a handful of category
+levels. compact_dtypes picks the smallest dtype that holds each column exactly
+(float32, int8/int16, uint8, category) and memory_report says what it saved.
+
+This module is a deliberate copy of
+ncaaf_weekly_ap_poll_predictions/scripts/python/ap_poll/compact.py.
+The two projects run from their own folders and don't import each other,
+only the docstrings differ, so a fix to one goes into both.
+"""
+import numpy as np
+import pandas as pd
+
+
+def memory_mb(df):
+    """
+    Deep memory usage of a DataFrame in MB.
+    """
+    return df.memory_usage(deep=True).sum() / 2 ** 20
+
+
+def _smallest_int(low, high):
+    for dtype in ((np.uint8, np.uint16, np.uint32) if low >= 0 else ()) + (np.int8, np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return np.dtype(dtype)
+
+    return np.dtype(np.int64)
+
+
+def compact_dtypes(df, categorical_columns=None, float_dtype=np.float32, max_category_share=0.5, exclude=()):
+    """
+    Returns a copy of df with every column in its smallest safe dtype.
+
+    The numeric columns are checked as one block (NaNs, whole numbers, min/max) and
+    converted a dtype group at a time rather than column by column.
+
+    Args:
+        df: Table as read by pd.read_csv.
+        categorical_columns: Columns that always become category. Other string columns do when their
+            distinct values are at most max_category_share of the rows.
+        float_dtype: Dtype for non integer numbers (and integers with missing values).
+        max_category_share: Cut off for turning a string column into a category.
+        exclude: Columns left as they are, e.g. an ID that has to round trip exactly.
+    """
+    categorical_columns = set(categorical_columns or ())
+    exclude = set(exclude)
+    target_dtypes = {}
+
+    numeric_columns = [col for col in df.columns if col not in exclude and col not in categorical_columns
+                       and pd.api.types.is_numeric_dtype(df[col]) and not pd.api.types.is_bool_dtype(df[col])]
+    if numeric_columns:
+        values = df[numeric_columns].to_numpy(dtype=np.float64)
+        has_nan = np.isnan(values).any(axis=0)
+        whole = ~has_nan & (values == np.round(values)).all(axis=0)
+        with np.errstate(invalid='ignore'):
+            low, high = np.nanmin(values, axis=0, initial=np.inf), np.nanmax(values, axis=0, initial=-np.inf)
+        del values
+
+        for col, is_whole, col_low, col_high in zip(numeric_columns, whole, low, high):
+            # whole numbers without gaps fit an int, the rest (and anything with NaN) goes to float32
+            target_dtypes[col] = _smallest_int(col_low, col_high) if is_whole and len(df) else np.dtype(float_dtype)
+
+    for col in df.columns:
+        if col in exclude or col in target_dtypes or pd.api.types.is_bool_dtype(df[col]):
+            continue
+        if col in categorical_columns or df[col].nunique() <= max_category_share * max(len(df), 1):
+            target_dtypes[col] = 'category'
+
+    # one astype per target dtype
+    groups = {}
+    for col, dtype in target_dtypes.items():
+        groups.setdefault(str(dtype), []).append(col)
+
+    converted = {}
+    for dtype, columns in groups.items():
+        block = df[columns].astype(dtype)
+        converted.update({col: block[col] for col in columns})
+
+    return pd.DataFrame({col: converted.get(col, df[col]) for col in df.columns}, index=df.index)
+
+
+def memory_report(frames_before, frames_after):
+    """
+    Before/after memory of some named tables.
+
+    Args:
+        frames_before, frames_after: {name: DataFrame} with the same names.
+
+    Returns:
+        DataFrame with before_mb, after_mb and saved_pct per table plus a total row.
+    """
+    rows = [{'table': name, 'before_mb': memory_mb(frames_before[name]), 'after_mb': memory_mb(frames_after[name])}
+            for name in frames_before]
+    report = pd.DataFrame(rows)
+    report.loc[len(report)] = {'table': 'total', 'before_mb': report['before_mb'].sum(),
+                               'after_mb': report['after_mb'].sum()}
+    report['saved_pct'] = 100 * (1 - report['after_mb'] / report['before_mb'])
+
+    return report.round(2)
@@ -0,0 +1,184 @@
+"""
+Concordance index (C-index) for the HCT survival task, fast enough to tune on.
+
+The models so far treat efs as plain regression/classification and never look at
+efs_time, but the competition scores how well the predicted risk orders the
+patients' event times: a stratified C-index, the mean C-index over race groups
+minus their standard deviation. Checking every pair of patients is O(n^2). Here
+patients are walked from the longest time to the shortest while a Fenwick tree
+counts, by risk rank, everyone already passed (the ones known to survive longer),
+so each patient is one O(log n) query and the whole thing is O(n log n).
+
+ConcordanceScorer wraps it as a scorer ModelSearch (or GridSearchCV) can use.
+"""
+import numpy as np
+import pandas as pd
+
+
+def _concordance_counts(time, event, risk):
+    """
+    (concordant, tied risk, comparable) pair counts, following lifelines: a pair is
+    comparable when the earlier time is an event, and a censored time equal to an
+    event time counts as surviving longer. Pairs of events at the same time aren't comparable.
+    """
+    n = time.shape[0]
+    if n < 2:
+        return 0.0, 0.0, 0.0
+
+    # dense 1 based risk ranks for the tree
+    _, rank = np.unique(risk, return_inverse=True)
+    rank = (rank + 1).tolist()
+    size = max(rank)
+    tree = [0] * (size + 1)
+
+    def add(pos):
+        while pos <= size:
+            tree[pos] += 1
+            pos += pos & -pos
+
+    def prefix(pos):
+        total = 0
+        while pos > 0:
+            total += tree[pos]
+            pos -= pos & -pos
+        return total
+
+    # longest time first, and at equal times censored before events so they are in the tree when the events query it
+    order = np.lexsort((event, -time))
+    time_sorted = time[order]
+    boundaries = np.flatnonzero(np.r_[True, time_sorted[1:] != time_sorted[:-1], True])
+    order = order.tolist()
+    is_event = event.astype(bool).tolist()
+
+    concordant = tied = comparable = 0
+    in_tree = 0
+    for start, stop in zip(boundaries[:-1].tolist(), boundaries[1:].tolist()):
+        members = order[start:stop]
+
+        for idx in members:
+            if not is_event[idx]:
+                add(rank[idx])
+                in_tree += 1
+
+        for idx in members:
+            if is_event[idx]:
+                below = prefix(rank[idx] - 1)
+                concordant += below
+                tied += prefix(rank[idx]) - below
+                comparable += in_tree
+
+        for idx in members:
+            if is_event[idx]:
+                add(rank[idx])
+                in_tree += 1
+
+    return float(concordant), float(tied), float(comparable)
+
+
+def concordance_index(time, event, risk):
+    """
+    Harrell's C-index, higher risk should mean an earlier event.
+
+    Args:
+        time: Time to event or censoring (efs_time).
+        event: 1 for an event, 0 for censored (efs).
+        risk: Predicted risk, e.g. a predicted efs probability. Pass -prediction for a predicted survival time.
+
+    Returns:
+        Share of comparable pairs ordered correctly, tied risks count half. NaN if no pair is comparable.
+    """
+    time = np.asarray(time, dtype=np.float64).ravel()
+    event = np.asarray(event, dtype=np.float64).ravel()
+    risk = np.asarray(risk, dtype=np.float64).ravel()
+
+    concordant, tied, comparable = _concordance_counts(time, event, risk)
+    if comparable == 0:
+        return np.nan
+
+    return (concordant + 0.5 * tied) / comparable
+
+
+def stratified_concordance(time, event, risk, groups, penalize_std=True):
+    """
+    C-index within each group, combined like the competition metric.
+
+    Args:
+        time, event, risk: As in concordance_index.
+        groups: Group of every row, e.g. race_group.
+        penalize_std: Subtract the standard deviation of the group C-indices from their mean.
+
+    Returns:
+        (score, per_group), per_group being a Series of C-index by group.
+    """
+    time = np.asarray(time, dtype=np.float64).ravel()
+    event = np.asarray(event, dtype=np.float64).ravel()
+    risk = np.asarray(risk, dtype=np.float64).ravel()
+    codes, levels = pd.factorize(pd.Series(groups).reset_index(drop=True), sort=True)
+
+    per_group = pd.Series(
+        [concordance_index(time[codes == code], event[codes == code], risk[codes == code])
+         for code in range(len(levels))],
+        index=levels, name='c_index'
+    )
+
+    score = per_group.mean()
+    if penalize_std:
+        score -= per_group.std(ddof=0)
+
+    return float(score), per_group
+
+
+def _risk_scores(estimator, X):
+    if hasattr(estimator, 'predict_proba'):
+        return estimator.predict_proba(X)[:, 1]
+    if hasattr(estimator, 'decision_function'):
+        return estimator.decision_function(X)
+
+    return estimator.predict(X)
+
+
+class ConcordanceScorer:
+    """
+    Stratified C-index as a scorer, for ModelSearch(scoring=...) or GridSearchCV(scoring=...).
+
+    Scorers only get the rows' X and the y the model was fit on, so the survival columns
+    are given up front and looked up by X's index, X has to be a DataFrame whose index
+    matches time/event/groups (the encoded frames from load_encoded_data do).
+
+    Args:
+        time: efs_time for every training row.
+        event: efs for every training row.
+        groups: race_group (or any stratum) for every training row, None scores one plain C-index.
+        penalize_std: Subtract the std of the group C-indices like the competition.
+        higher_is_risk: False when the model predicts survival time instead of risk, the sign is flipped.
+    """
+
+    def __init__(self, time, event, groups=None, penalize_std=True, higher_is_risk=True):
+        self.time = pd.Series(np.asarray(time, dtype=np.float64), index=getattr(time, 'index', None))
+        self.event = pd.Series(np.asarray(event, dtype=np.float64), index=self.time.index)
+        self.groups = None if groups is None else pd.Series(np.asarray(groups), index=self.time.index)
+        self.penalize_std = penalize_std
+        self.higher_is_risk = higher_is_risk
+
+    def __call__(self, estimator, X, y=None):
+        if not isinstance(X, pd.DataFrame):
+            raise TypeError("ConcordanceScorer needs X as a DataFrame to find each row's time and event")
+
+        risk = np.asarray(_risk_scores(estimator, X), dtype=np.float64)
+        if not self.higher_is_risk:
+            risk = -risk
+
+        time = self.time.loc[X.index].to_numpy()
+        event = self.event.loc[X.index].to_numpy()
+
+        if self.groups is None:
+            return concordance_index(time, event, risk)
+
+        score, _ = stratified_concordance(time, event, risk, self.groups.loc[X.index].to_numpy(),
+                                          penalize_std=self.penalize_std)
+
+        return score
+
+    def __repr__(self):
+        return (f"ConcordanceScorer(n={len(self.time)}, stratified={self.groups is not None}, "
+                f"penalize_std={self.penalize_std}, higher_is_risk={self.higher_is_risk})")
@@ -0,0 +1,129 @@
+"""
+Loading the HCT data, encoded and cached.
+
+load_encoded_data reads train and test, runs HCTPreprocessor and keeps the result
+in a DatasetCache, so the next run with the same files and settings gets the
+encoded matrices straight from disk as memory maps. On a miss the preprocessor is fit on ColumnStats.from_csv, cached in the same folder,
+so the column statistics are only ever scanned once per train.csv.
+"""
+import numpy as np
+import pandas as pd
+
+from .column_stats import ColumnStats
+from .compact import compact_dtypes, memory_report
+from .data_cache import DatasetCache
+from .preprocessing import HCTPreprocessor
+from .profiling import get_profiler
+
+
+def read_in_data(train_path, test_path, compact=False, id_column='ID', verbose=False):
+    """
+    Reads train and test, optionally with compact dtypes (see compact.py).
+
+    Args:
+        compact: Downcast numbers to float32/small ints and strings to category.
+        id_column: Left as is when compacting.
+        verbose: Print the before/after memory when compacting.
+    """
+    train_df = pd.read_csv(train_path)
+    test_df = pd.read_csv(test_path)
+
+    if compact:
+        compact_train = compact_dtypes(train_df, exclude=[id_column])
+        # same categoricals in test as in train, whatever test's own share of distinct values is
+        categorical_columns = [col for col in compact_train.columns
+                               if isinstance(compact_train[col].dtype, pd.CategoricalDtype)]
+        compact_test = compact_dtypes(test_df, categorical_columns=[col for col in categorical_columns
+                                                                    if col in test_df.columns],
+                                      exclude=[id_column])
+        if verbose:
+            print(memory_report({'train': train_df, 'test': test_df}, {'train': compact_train, 'test': compact_test}))
+        train_df, test_df = compact_train, compact_test
+
+    return train_df, test_df
+
+
+def load_encoded_data(train_path, test_path, preprocessor=None, id_column='ID', cache_dir='data_cache',
+                      use_cache=True, dtype=np.float64, compact=False, column_stats=None, profiler=None):
+    """
+    Encoded train and test data for the models, cached on the file contents and preprocessor settings.
+
+    Args:
+        train_path: train.csv
+        test_path: test.csv
+        preprocessor: Unfitted HCTPreprocessor with the settings to use, defaults to HCTPreprocessor().
+        id_column: Test column kept for the submission file.
+        cache_dir: Cache folder.
+        use_cache: False always rebuilds and doesn't write to the cache.
+        dtype: dtype of the encoded matrices, np.float32 halves their memory and LightGBM/Keras take it as is.
+        compact: Read the CSVs with compact dtypes, lowers the peak memory while encoding.
+        column_stats: ColumnStats of train.csv for the preprocessor, by default ColumnStats.from_csv
+            (cached in cache_dir), so a script that already printed them doesn't scan again.
+        profiler: StageProfiler for the load/preprocess stages (see profiling.py), None records nothing.
+
+    Returns:
+        x_train_encoded, x_test_encoded, targets (efs / efs_time DataFrame), test_ids, fitted preprocessor.
+        On a cache hit the frames are memory mapped. Don't hand them to joblib.Parallel as DataFrames, its
+        workers rebuild the transposed memory map in the wrong order and every column arrives scrambled;
+        ModelSearch and StackingEnsemble send them as plain arrays (search._to_array).
+    """
+    preprocessor = HCTPreprocessor() if preprocessor is None else preprocessor
+    profiler = get_profiler(profiler)
+    cache = DatasetCache(cache_dir)
+    config = {
+        'version': 1,
+        'preprocessor': preprocessor.get_params(),
+        'id_column': id_column,
+        'dtype': np.dtype(dtype).name,
+        'compact': compact
+    }
+
+    with profiler.stage('cache_lookup'):
+        key = cache.key([train_path, test_path], config) if use_cache else None
+        cached = cache.load(key) if use_cache else None
+
+    if cached is not None:
+        arrays, meta = cached
+        preprocessor = HCTPreprocessor.from_dict(meta['preprocessor'])
+        columns = preprocessor.feature_names_out_
+
+        # copy=False keeps the memory maps, nothing is read until a column is used
+        x_train_encoded = pd.DataFrame(arrays['x_train'], columns=columns, copy=False)
+        x_test_encoded = pd.DataFrame(arrays['x_test'], columns=columns, copy=False)
+        targets = pd.DataFrame(arrays['targets'], columns=meta['target_columns'], copy=False)
+        test_ids = pd.Series(meta['test_ids'], name=id_column)
+
+        return x_train_encoded, x_test_encoded, targets, test_ids, preprocessor
+
+    with profiler.stage('column_stats'):
+        if column_stats is None:
+            column_stats = ColumnStats.from_csv(train_path, cache_dir=cache_dir, use_cache=use_cache)
+
+    with profiler.stage('load', compact=compact):
+        train_df, test_df = read_in_data(train_path, test_path, compact=compact, id_column=id_column)
+
+    with profiler.stage('preprocess_train', rows=len(train_df)):
+        x_train_encoded = preprocessor.fit_transform(train_df, test_columns=test_df.columns, profiler=profiler,
+                                                     stats=column_stats).astype(dtype)
+    with profiler.stage('preprocess_test', rows=len(test_df)):
+        x_test_encoded = preprocessor.transform(test_df, profiler=profiler).astype(dtype)
+
+    target_columns = [col for col in preprocessor.target_columns if col in train_df.columns]
+    targets = train_df[target_columns].reset_index(drop=True)
+    test_ids = test_df[id_column].reset_index(drop=True) if id_column in test_df.columns else pd.Series(dtype=object)
+
+    if use_cache:
+        arrays = {
+            'x_train': x_train_encoded.to_numpy(dtype=dtype),
+            'x_test': x_test_encoded.to_numpy(dtype=dtype),
+            'targets': targets.to_numpy(dtype=np.float64)
+        }
+        meta = {
+            'preprocessor': preprocessor.to_dict(),
+            'target_columns': target_columns,
+            'test_ids': test_ids.tolist()
+        }
+        with profiler.stage('cache_save'):
+            cache.save(key, arrays, meta)
+
+    return x_train_encoded, x_test_encoded, targets, test_ids, preprocessor
@@ -0,0 +1,149 @@
+"""
+Dummy coding with a vocabulary learned from train.
+
+pd.get_dummies only knows the levels in the frame it is given, so the notebooks
+concatenated train and test to get matching columns. CategoryEncoder learns the
+levels once, always produces the same columns, and sends levels it has never seen
+to an explicit "<column>_Unknown_value" column, so test data can be encoded in any
+batch size, down to a single patient.
+"""
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+UNKNOWN_VALUE = 'Unknown_value'
+
+
+class CategoryEncoder:
+    """
+    One-hot encoder with a fixed vocabulary and an unknown bucket.
+
+    Args:
+        columns: Columns to encode, None means every column of the frame passed to fit.
+        drop_first: Drop the first (sorted) level of each column like get_dummies(drop_first=True).
+        handle_unknown: "bucket" adds an unknown column per variable, "ignore" leaves unseen levels as all zeros.
+        sparse_output: Return a CSR matrix instead of a dense uint8 array.
+    """
+
+    def __init__(self, columns=None, drop_first=True, handle_unknown='bucket', sparse_output=False):
+        if handle_unknown not in ('bucket', 'ignore'):
+            raise ValueError(f"handle_unknown must be 'bucket' or 'ignore', got {handle_unknown}")
+
+        self.columns = columns
+        self.drop_first = drop_first
+        self.handle_unknown = handle_unknown
+        self.sparse_output = sparse_output
+
+    def fit(self, df):
+        columns = list(df.columns) if self.columns is None else list(self.columns)
+        self.categories_ = {col: sorted(df[col].dropna().astype(str).unique()) for col in columns}
+        self._build_layout()
+
+        return self
+
+    def transform(self, df):
+        """
+        Encodes a batch into a pre-allocated matrix, one vectorized lookup per column.
+
+        Returns:
+            uint8 array (or CSR matrix if sparse_output) with len(feature_names_out_) columns.
+        """
+        if not hasattr(self, 'categories_'):
+            raise ValueError("CategoryEncoder is not fitted yet, call fit first")
+
+        n_rows = len(df)
+        rows = np.arange(n_rows)
+        row_idx, col_idx = [], []
+
+        for col, offset, unknown_idx in zip(self.categories_, self._offsets, self._unknown_idx):
+            values = df[col]
+            codes = pd.Categorical(values.astype(str).where(values.notna()),
+                                   categories=self.categories_[col]).codes.astype(np.intp)
+
+            # codes are -1 for unseen levels and missing values
+            known = codes >= (1 if self.drop_first else 0)
+            out_cols = offset + codes - (1 if self.drop_first else 0)
+
+            row_idx.append(rows[known])
+            col_idx.append(out_cols[known])
+
+            if unknown_idx is not None:
+                unknown = codes < 0
+                row_idx.append(rows[unknown])
+                col_idx.append(np.full(unknown.sum(), unknown_idx, dtype=np.intp))
+
+        row_idx = np.concatenate(row_idx) if row_idx else np.array([], dtype=np.intp)
+        col_idx = np.concatenate(col_idx) if col_idx else np.array([], dtype=np.intp)
+
+        if self.sparse_output:
+            data = np.ones(len(row_idx), dtype=np.uint8)
+            return sp.csr_matrix((data, (row_idx, col_idx)), shape=(n_rows, self.n_features_out_))
+
+        out = np.zeros((n_rows, self.n_features_out_), dtype=np.uint8)
+        out[row_idx, col_idx] = 1
+
+        return out
+
+    def transform_row(self, record):
+        """
+        Encodes a single record (dict or Series) without building a DataFrame.
+
+        Returns:
+            1-D uint8 array with len(feature_names_out_) entries.
+        """
+        out = np.zeros(self.n_features_out_, dtype=np.uint8)
+
+        for col, offset, unknown_idx in zip(self.categories_, self._offsets, self._unknown_idx):
+            value = record.get(col)
+            code = None if value is None or value != value else self._lookup[col].get(str(value))
+
+            if code is None:
+                if unknown_idx is not None:
+                    out[unknown_idx] = 1
+            elif code > 0 or not self.drop_first:
+                out[offset + code - (1 if self.drop_first else 0)] = 1
+
+        return out
+
+    def fit_transform(self, df):
+        return self.fit(df).transform(df)
+
+    def to_dict(self):
+        return {
+            'drop_first': self.drop_first,
+            'handle_unknown': self.handle_unknown,
+            'sparse_output': self.sparse_output,
+            'categories': self.categories_
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        encoder = cls(columns=list(state['categories']), drop_first=state['drop_first'],
+                      handle_unknown=state['handle_unknown'], sparse_output=state['sparse_output'])
+        encoder.categories_ = state['categories']
+        encoder._build_layout()
+
+        return encoder
+
+    def _build_layout(self):
+        # each column gets its kept levels, then its unknown bucket
+        names, offsets, unknown_idx = [], [], []
+        self._lookup = {}
+
+        for col, levels in self.categories_.items():
+            self._lookup[col] = {level: code for code, level in enumerate(levels)}
+            kept = levels[1:] if self.drop_first else levels
+
+            offsets.append(len(names))
+            names += [f"{col}_{level}" for level in kept]
+
+            if self.handle_unknown == 'bucket':
+                unknown_idx.append(len(names))
+                names.append(f"{col}_{UNKNOWN_VALUE}")
+            else:
+                unknown_idx.append(None)
+
+        self._offsets = offsets
+        self._unknown_idx = unknown_idx
+        self.feature_names_out_ = names
+        self.n_features_out_ = len(names)
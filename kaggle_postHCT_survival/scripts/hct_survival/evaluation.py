@@ -0,0 +1,200 @@
+"""
+Scoring many models' predictions at once.
+
+model_evaluation in Inital Analysis.py and the regression/classification
+evaluation functions in the notebooks score one model at a time with sklearn and
+print the numbers. evaluate_models takes every model's predictions as the columns
+of one array and computes all metrics for all of them together, with bootstrap
+confidence intervals, and returns a tidy table.
+
+Every metric is written in terms of per row weights, so the point estimate (all
+weights 1) and a block of bootstrap resamples (weights = how often each row was
+drawn) are the same matrix products, instead of re-indexing the data once per
+resample and model.
+"""
+import numpy as np
+import pandas as pd
+
+REGRESSION_METRICS = ('r2', 'mse', 'mae')
+CLASSIFICATION_METRICS = ('accuracy', 'precision', 'recall', 'f1', 'auc')
+
+
+def _as_prediction_matrix(predictions, model_names=None):
+    if isinstance(predictions, pd.DataFrame):
+        return predictions.to_numpy(dtype=np.float64), list(predictions.columns)
+
+    if isinstance(predictions, dict):
+        names = list(predictions)
+        return np.column_stack([np.asarray(predictions[name], dtype=np.float64).ravel() for name in names]), names
+
+    matrix = np.asarray(predictions, dtype=np.float64)
+    if matrix.ndim == 1:
+        matrix = matrix[:, None]
+    names = list(model_names) if model_names is not None else [f"model_{idx}" for idx in range(matrix.shape[1])]
+
+    return matrix, names
+
+
+def _safe_divide(numerator, denominator):
+    # 0 where the denominator is 0, same as sklearn's zero_division=0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(denominator > 0, numerator / np.where(denominator > 0, denominator, 1), 0.0)
+
+
+def _regression(weights, y, P):
+    # weights (b, n), y (n,), P (n, m) -> {metric: (b, m)}
+    total = weights.sum(axis=1, keepdims=True)
+    errors = P - y[:, None]
+
+    sse = weights @ errors ** 2
+    y_mean = (weights @ y)[:, None] / total
+    sst = (weights @ y ** 2)[:, None] - total * y_mean ** 2
+
+    # resamples that drew a constant y have no R2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r2 = np.where(sst > 0, 1 - sse / sst, np.nan)
+
+    return {
+        'r2': r2,
+        'mse': sse / total,
+        'mae': (weights @ np.abs(errors)) / total
+    }
+
+
+def _classification(weights, y, labels):
+    total = weights.sum(axis=1, keepdims=True)
+
+    true_positive = weights @ (labels * y[:, None])
+    predicted_positive = weights @ labels
+    actual_positive = (weights @ y)[:, None]
+    correct = weights @ (labels == y[:, None])
+
+    return {
+        'accuracy': correct / total,
+        'precision': _safe_divide(true_positive, predicted_positive),
+        'recall': _safe_divide(true_positive, np.broadcast_to(actual_positive, true_positive.shape)),
+        'f1': _safe_divide(2 * true_positive, predicted_positive + actual_positive)
+    }
+
+
+def _auc_layout(y, scores):
+    # per model: sort order plus where each run of tied scores starts, computed once and reused by every resample
+    layout = []
+    for col in range(scores.shape[1]):
+        order = np.argsort(scores[:, col], kind='mergesort')
+        sorted_scores = scores[order, col]
+        starts = np.flatnonzero(np.r_[True, sorted_scores[1:] != sorted_scores[:-1]])
+        layout.append((order, starts, y[order]))
+
+    return layout
+
+
+def _auc(weights, layout):
+    # weighted Mann-Whitney: each positive counts the negatives scored below it, ties count half.
+    # A sample or resample without both classes has no AUC (NaN, left out of the interval), not 0
+    out = np.empty((weights.shape[0], len(layout)))
+
+    for col, (order, starts, y_sorted) in enumerate(layout):
+        w = weights[:, order]
+        positive = np.add.reduceat(w * y_sorted, starts, axis=1)
+        negative = np.add.reduceat(w * (1 - y_sorted), starts, axis=1)
+        negative_below = np.cumsum(negative, axis=1) - negative
+
+        numerator = (positive * (negative_below + 0.5 * negative)).sum(axis=1)
+        pairs = positive.sum(axis=1) * negative.sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            out[:, col] = np.where(pairs > 0, numerator / np.where(pairs > 0, pairs, 1), np.nan)
+
+    return out
+
+
+def _all_metrics(weights, y, P, labels, layout, metrics):
+    values = {}
+    if any(metric in REGRESSION_METRICS for metric in metrics):
+        values.update(_regression(weights, y, P))
+    if labels is not None:
+        values.update(_classification(weights, y, labels))
+    if 'auc' in metrics:
+        values['auc'] = _auc(weights, layout)
+
+    return {metric: values[metric] for metric in metrics}
+
+
+def _bootstrap_weights(rng, n_rows, n_draws):
+    # how many times each row shows up in each resample, one bincount for the whole block
+    idx = rng.integers(0, n_rows, size=(n_draws, n_rows))
+    idx += (np.arange(n_draws) * n_rows)[:, None]
+
+    return np.bincount(idx.ravel(), minlength=n_draws * n_rows).reshape(n_draws, n_rows).astype(np.float64)
+
+
+def evaluate_models(y_true, predictions, model_names=None, metrics=None, threshold=0.5, n_bootstrap=1000,
+                    confidence=0.95, random_state=0, max_block_bytes=64 * 1024 ** 2):
+    """
+    Scores every model's predictions in one go.
+
+    Args:
+        y_true: Observed outcome, e.g. efs.
+        predictions: {name: predictions}, a DataFrame with one column per model, or an (n, models) array.
+            For the classification metrics these are scores/probabilities, labels are score >= threshold.
+        model_names: Column names when predictions is an array.
+        metrics: Which metrics to compute, defaults to r2/mse/mae plus, when y_true is 0/1, accuracy,
+            precision, recall, f1 and auc.
+        threshold: Cut off that turns scores into 0/1 labels.
+        n_bootstrap: Bootstrap resamples for the confidence intervals, 0 skips them.
+        confidence: Confidence level of the percentile intervals.
+        random_state: Seed for the resamples, the same seed gives every model the same resamples.
+        max_block_bytes: Roughly how much memory one block of resample weights may use.
+
+    Returns:
+        DataFrame with one row per (model, metric): model, metric, value, ci_lower, ci_upper.
+    """
+    y = np.asarray(y_true, dtype=np.float64).ravel()
+    P, names = _as_prediction_matrix(predictions, model_names)
+    if P.shape[0] != y.shape[0]:
+        raise ValueError(f"predictions have {P.shape[0]} rows but y_true has {y.shape[0]}")
+
+    binary = np.isin(y, (0, 1)).all()
+    if metrics is None:
+        metrics = REGRESSION_METRICS + (CLASSIFICATION_METRICS if binary else ())
+    metrics = tuple(metrics)
+
+    unknown = set(metrics) - set(REGRESSION_METRICS) - set(CLASSIFICATION_METRICS)
+    if unknown:
+        raise ValueError(f"Unknown metrics {sorted(unknown)}")
+    if not binary and set(metrics) & set(CLASSIFICATION_METRICS):
+        raise ValueError("Classification metrics need a 0/1 y_true")
+
+    labels = (P >= threshold).astype(np.float64) if set(metrics) & {'accuracy', 'precision', 'recall', 'f1'} else None
+    layout = _auc_layout(y, P) if 'auc' in metrics else None
+
+    n_rows = y.shape[0]
+    point = _all_metrics(np.ones((1, n_rows)), y, P, labels, layout, metrics)
+
+    table = pd.DataFrame({
+        'model': np.repeat(names, len(metrics)),
+        'metric': list(metrics) * len(names),
+        'value': np.column_stack([point[metric][0] for metric in metrics]).ravel()
+    })
+
+    if n_bootstrap:
+        rng = np.random.default_rng(random_state)
+        block = max(1, min(n_bootstrap, max_block_bytes // (8 * n_rows * max(1, P.shape[1]))))
+        draws = {metric: [] for metric in metrics}
+
+        for start in range(0, n_bootstrap, block):
+            weights = _bootstrap_weights(rng, n_rows, min(block, n_bootstrap - start))
+            for metric, values in _all_metrics(weights, y, P, labels, layout, metrics).items():
+                draws[metric].append(values)
+
+        alpha = (1 - confidence) / 2
+        lower, upper = [], []
+        for metric in metrics:
+            values = np.concatenate(draws[metric])
+            lower.append(np.nanquantile(values, alpha, axis=0))
+            upper.append(np.nanquantile(values, 1 - alpha, axis=0))
+
+        table['ci_lower'] = np.column_stack(lower).ravel()
+        table['ci_upper'] = np.column_stack(upper).ravel()
+
+    return table
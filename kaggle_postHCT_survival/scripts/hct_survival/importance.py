@@ -0,0 +1,337 @@
+"""
+Feature importance for the interaction models, without ranking every term by hand.
+
+dat.csv came from a DataFrame of every name in poly.get_feature_names_out() next to
+its coefficient, sorted in full and written as text, just to plot the top 30.
+FeatureImportance keeps the values as one float array and every term as the base
+columns it multiplies, so:
+
+    - top(k) picks the k largest with argpartition and only builds those k names
+    - by_parent() sums the terms back to the variables they came from, e.g. every
+      hla_low_res_6|tce_div_match_* term into hla_low_res_6|tce_div_match
+    - save()/load() use one .npz file instead of a text CSV
+
+permutation_importance shuffles base columns (all dummies of a categorical together)
+in parallel workers and lets the model rebuild its interactions from the shuffled
+data, so it works for any fitted model, not just linear ones.
+"""
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.metrics import check_scoring
+
+from .interactions import infer_feature_groups
+from .screening import _top_k
+
+IMPORTANCE_FORMAT = 1
+
+
+def _terms_from_expander(expander):
+    # base columns of every output column, padded with -1, in the expander's output order
+    if hasattr(expander, 'pairs_'):
+        interactions = np.asarray(expander.pairs_, dtype=np.int64)
+    else:
+        degree = max((len(term) for term in expander.terms_), default=1)
+        interactions = np.full((len(expander.terms_), degree), -1, dtype=np.int64)
+        for row, term in enumerate(expander.terms_):
+            interactions[row, :len(term)] = term
+
+    width = max(interactions.shape[1], 1)
+    blocks = []
+    if expander.include_base:
+        base = np.full((expander.n_features_in_, width), -1, dtype=np.int64)
+        base[:, 0] = np.arange(expander.n_features_in_)
+        blocks.append(base)
+    blocks.append(interactions.reshape(-1, width))
+
+    return np.concatenate(blocks)
+
+
+def _terms_from_names(feature_names, delimiter):
+    # "a|b" style names back to base columns, the base columns being every distinct part
+    parts = [str(name).split(delimiter) for name in feature_names]
+    base_names = list(dict.fromkeys(part for name in parts for part in name))
+    position = {name: idx for idx, name in enumerate(base_names)}
+
+    terms = np.full((len(parts), max((len(name) for name in parts), default=1)), -1, dtype=np.int64)
+    for row, name in enumerate(parts):
+        terms[row, :len(name)] = [position[part] for part in name]
+
+    return terms, np.asarray(base_names, dtype=object)
+
+
+def _model_values(model):
+    # coefficients for linear models (the positive class of a binary classifier), else feature_importances_
+    if hasattr(model, 'coef_'):
+        coef = np.asarray(model.coef_, dtype=np.float64)
+        return coef.reshape(-1) if coef.ndim == 1 or coef.shape[0] == 1 else np.abs(coef).mean(axis=0), \
+            'coefficient'
+
+    if hasattr(model, 'feature_importances_'):
+        return np.asarray(model.feature_importances_, dtype=np.float64), 'feature_importance'
+
+    raise ValueError(f"{type(model).__name__} has neither coef_ nor feature_importances_")
+
+
+class FeatureImportance:
+    """
+    Importance values of a fitted model, one per (possibly interaction) feature.
+
+    Args:
+        values: Coefficient or importance per feature.
+        terms: int array (n_features, degree) of the base columns each feature multiplies, -1 padded.
+        base_names: Names of the base (encoded) columns.
+        delimiter: Joins base names into interaction names, "|" like dat.csv.
+        kind: "coefficient", "feature_importance" or "permutation", only kept as a label.
+    """
+
+    def __init__(self, values, terms, base_names, delimiter='|', kind='coefficient'):
+        self.values = np.asarray(values, dtype=np.float64)
+        self.terms = np.asarray(terms, dtype=np.int64).reshape(len(self.values), -1)
+        self.base_names = np.asarray(base_names, dtype=object)
+        self.delimiter = delimiter
+        self.kind = kind
+
+    @classmethod
+    def from_model(cls, model, expander=None, feature_names=None, delimiter='|'):
+        """
+        Reads the values off a fitted model.
+
+        Args:
+            model: Fitted linear model (coef_), tree model (feature_importances_), a Pipeline ending
+                in one, or an OutOfCoreInteractionModel (coefficients on its scaled columns).
+            expander: Fitted SparseInteractionFeatures / ScreenedInteractionFeatures that built the
+                model's columns, picked up from a Pipeline or OutOfCoreInteractionModel when left out.
+            feature_names: Names of the model's columns when there is no expander, interactions
+                split on the delimiter (e.g. poly.get_feature_names_out() with custom names).
+        """
+        if hasattr(model, 'estimator_') and hasattr(model, 'expander_'):
+            expander = model.expander_ if expander is None else expander
+            model = model.estimator_
+        elif hasattr(model, 'steps'):
+            if expander is None:
+                expander = next((step for _, step in model.steps[:-1] if hasattr(step, 'pairs_')
+                                 or hasattr(step, 'terms_')), None)
+            model = model.steps[-1][1]
+
+        values, kind = _model_values(model)
+
+        if expander is not None:
+            terms = _terms_from_expander(expander)
+            base_names = expander._input_names()
+        else:
+            if feature_names is None:
+                feature_names = getattr(model, 'feature_names_in_', None)
+            if feature_names is None:
+                feature_names = [f"x{i}" for i in range(len(values))]
+            terms, base_names = _terms_from_names(feature_names, delimiter)
+
+        if len(terms) != len(values):
+            raise ValueError(f"model has {len(values)} values but the features describe {len(terms)}")
+
+        return cls(values, terms, base_names, delimiter=delimiter, kind=kind)
+
+    @property
+    def degree(self):
+        return (self.terms >= 0).sum(axis=1)
+
+    def feature_names(self, idx=None):
+        """
+        Names of the features at idx (all of them by default), built only for those.
+        """
+        terms = self.terms if idx is None else self.terms[np.asarray(idx)]
+        names = [self.delimiter.join(self.base_names[term[term >= 0]]) for term in terms]
+
+        return np.asarray(names, dtype=object)
+
+    def top(self, k=30, interactions_only=False, by_abs=True):
+        """
+        The k most important features, largest first, same columns as dat.csv.
+
+        Args:
+            k: Number of features.
+            interactions_only: Skip the base columns, like the "|" filter in the notebooks.
+            by_abs: Rank on the absolute value (coefficients), False ranks on the signed value.
+        """
+        scores = np.abs(self.values) if by_abs else self.values.copy()
+        if interactions_only:
+            scores[self.degree < 2] = -np.inf
+
+        idx = _top_k(scores, k)
+        if interactions_only:
+            idx = idx[np.isfinite(scores[idx])]
+
+        return pd.DataFrame({
+            'Feature': self.feature_names(idx),
+            'Coefficient': self.values[idx],
+            'Importance': np.abs(self.values[idx])
+        }, index=idx)
+
+    def by_parent(self, categorical_columns=None, feature_groups=None, level='term'):
+        """
+        Sums the importance of every feature back to the variables it came from.
+
+        Args:
+            categorical_columns: Dummy coded columns, their levels are folded into the column
+                (tce_div_match_Missing_value -> tce_div_match), see infer_feature_groups.
+            feature_groups: Parent of every base column instead of inferring it.
+            level: "term" keeps interactions apart (hla_low_res_6|tce_div_match), "variable" gives
+                every variable the total of all terms it appears in.
+
+        Returns:
+            DataFrame sorted by total absolute importance, with the signed sum, the largest single
+            absolute value and the number of features behind each parent.
+        """
+        if feature_groups is None:
+            feature_groups = infer_feature_groups(self.base_names, categorical_columns) \
+                if categorical_columns is not None else list(self.base_names)
+        group_names, group_codes = np.unique(np.asarray(feature_groups, dtype=str), return_inverse=True)
+
+        # base columns -> parent codes, the padding stays -1
+        codes = np.where(self.terms >= 0, group_codes[np.maximum(self.terms, 0)], -1)
+        values = self.values
+
+        if level == 'variable':
+            rows, cols = np.nonzero(codes >= 0)
+            # a term like a_x|a_y counts once for a
+            pairs = np.unique(np.column_stack([rows, codes[rows, cols]]), axis=0)
+            rows, parent = pairs[:, 0], pairs[:, 1]
+            names = group_names[parent]
+            values = values[rows]
+            parent_names, parent_idx = np.unique(names, return_inverse=True)
+        elif level == 'term':
+            codes = np.sort(codes, axis=1)[:, ::-1]
+            parent_codes, parent_idx = np.unique(codes, axis=0, return_inverse=True)
+            parent_names = np.asarray([self.delimiter.join(group_names[np.sort(row[row >= 0])])
+                                       for row in parent_codes], dtype=object)
+        else:
+            raise ValueError(f"level must be 'term' or 'variable', got {level!r}")
+
+        parent_idx = parent_idx.reshape(-1)
+        n_parents = len(parent_names)
+        abs_values = np.abs(values)
+        max_abs = np.zeros(n_parents)
+        np.maximum.at(max_abs, parent_idx, abs_values)
+
+        summary = pd.DataFrame({
+            'parent': parent_names,
+            'total_importance': np.bincount(parent_idx, weights=abs_values, minlength=n_parents),
+            'total_coefficient': np.bincount(parent_idx, weights=values, minlength=n_parents),
+            'max_importance': max_abs,
+            'n_features': np.bincount(parent_idx, minlength=n_parents)
+        })
+
+        return summary.sort_values('total_importance', ascending=False, kind='stable').reset_index(drop=True)
+
+    def to_frame(self):
+        """
+        Every feature as a DataFrame in the dat.csv layout, sorted by importance. Builds every name.
+        """
+        return self.top(len(self.values))
+
+    def save(self, path):
+        """
+        Writes the values, terms and base names to one .npz file.
+
+        Values are float32 and terms the smallest int that holds the base column count,
+        a few MB for the ~116k interaction terms instead of a text CSV.
+        """
+        term_dtype = np.int16 if len(self.base_names) < np.iinfo(np.int16).max else np.int32
+        np.savez(
+            path,
+            format=np.array(IMPORTANCE_FORMAT),
+            values=self.values.astype(np.float32),
+            terms=self.terms.astype(term_dtype),
+            base_names=self.base_names.astype(str),
+            delimiter=np.array(self.delimiter),
+            kind=np.array(self.kind)
+        )
+
+    @classmethod
+    def load(cls, path):
+        """
+        Reads a file written by save().
+        """
+        with np.load(path, allow_pickle=False) as saved:
+            if int(saved['format']) != IMPORTANCE_FORMAT:
+                raise ValueError(f"{path} is importance format {int(saved['format'])}, expected {IMPORTANCE_FORMAT}")
+
+            return cls(saved['values'], saved['terms'], saved['base_names'].astype(object),
+                       delimiter=str(saved['delimiter']), kind=str(saved['kind']))
+
+
+def _take_columns(X, columns):
+    if isinstance(X, pd.DataFrame):
+        return X.iloc[:, columns].to_numpy()
+
+    return np.asarray(X[:, columns])
+
+
+def _permuted_scores(model, X, y, scorer, columns, n_repeats, seed):
+    # runs in the worker processes, X comes in as a read only memory map when it is large
+    rng = np.random.default_rng(seed)
+    X_permuted = X.copy()
+    original = _take_columns(X, columns)
+
+    scores = np.empty(n_repeats)
+    for repeat in range(n_repeats):
+        # the whole group moves together so a row keeps exactly one dummy of a categorical
+        shuffled = original[rng.permutation(len(original))]
+        if isinstance(X_permuted, pd.DataFrame):
+            X_permuted.iloc[:, columns] = shuffled
+        else:
+            X_permuted[:, columns] = shuffled
+        scores[repeat] = scorer(model, X_permuted, y)
+
+    return scores
+
+
+def permutation_importance(model, X, y, scoring=None, categorical_columns=None, feature_groups=None,
+                           n_repeats=5, n_jobs=-3, random_state=0):
+    """
+    Drop in score when a base variable is shuffled, every variable in parallel.
+
+    Unlike sklearn's permutation_importance the dummies of one categorical are shuffled
+    together, and X is the base encoded matrix, so models that build their own
+    interactions (a Pipeline with the expander, OutOfCoreInteractionModel) are handled
+    by shuffling the inputs rather than thousands of interaction columns.
+
+    Args:
+        model: Fitted model taking X.
+        X: Base encoded validation data, DataFrame or array.
+        y: Target.
+        scoring: Anything sklearn's check_scoring takes (or a ConcordanceScorer), higher is better.
+        categorical_columns: Dummy coded columns, their levels are shuffled as one variable.
+        feature_groups: Variable of every column instead of inferring it.
+        n_repeats: Shuffles per variable.
+        n_jobs: Worker processes, -3 is all cores but 2 like the searches.
+        random_state: Seed, every variable gets its own stream from it.
+
+    Returns:
+        DataFrame with importance_mean and importance_std per variable, most important first.
+    """
+    scorer = check_scoring(model, scoring=scoring)
+    baseline = scorer(model, X, y)
+
+    names = [str(col) for col in X.columns] if isinstance(X, pd.DataFrame) \
+        else [f"x{i}" for i in range(X.shape[1])]
+    if feature_groups is None:
+        feature_groups = infer_feature_groups(names, categorical_columns) if categorical_columns is not None \
+            else names
+    group_names, group_codes = np.unique(np.asarray(feature_groups, dtype=str), return_inverse=True)
+
+    seeds = np.random.SeedSequence(random_state).spawn(len(group_names))
+    scores = Parallel(n_jobs=n_jobs)(
+        delayed(_permuted_scores)(model, X, y, scorer, np.flatnonzero(group_codes == group), n_repeats, seed)
+        for group, seed in enumerate(seeds)
+    )
+    drops = baseline - np.asarray(scores)
+
+    result = pd.DataFrame({
+        'variable': group_names,
+        'importance_mean': drops.mean(axis=1),
+        'importance_std': drops.std(axis=1),
+        'n_columns': np.bincount(group_codes, minlength=len(group_names))
+    })
+
+    return result.sort_values('importance_mean', ascending=False, kind='stable').reset_index(drop=True)
@@ -0,0 +1,198 @@
+"""
+Sparse pairwise interaction features for the HCT models.
+
+PolynomialFeatures(degree=2, interaction_only=True) on the dummy coded HCT data
+builds a dense matrix with one column for every pair of encoded columns (~116k),
+even though most of those products are zero. SparseInteractionFeatures builds the
+same kind of design matrix as a CSR sparse matrix and never creates the pairs that
+can only ever be zero, like two dummies of the same categorical
+(tce_div_match_* x tce_div_match_*).
+"""
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.base import BaseEstimator, TransformerMixin
+
+
+def infer_feature_groups(feature_names, categorical_columns):
+    """
+    Maps every encoded column back to the column it came from.
+
+    pd.get_dummies names its columns "<source>_<level>", so a dummy belongs to the
+    longest categorical name it starts with. Anything else (numeric columns) is its
+    own group.
+
+    Args:
+        feature_names: Encoded column names, e.g. x_train_encoded.columns.
+        categorical_columns: The categorical columns that were dummy coded.
+
+    Returns:
+        A list with the source column name for every encoded column.
+    """
+    # longest first so "hla_match_a_low" doesn't swallow "hla_match_a_low_x" dummies
+    sources = sorted((str(col) for col in categorical_columns), key=len, reverse=True)
+
+    groups = []
+    for name in feature_names:
+        name = str(name)
+        source = next((src for src in sources if name.startswith(src + '_')), name)
+        groups.append(source)
+
+    return groups
+
+
+def _to_csc(X):
+    # DataFrames from get_dummies mix bool and float columns, so cast everything to float first
+    if isinstance(X, pd.DataFrame):
+        X = X.to_numpy(dtype=np.float64)
+
+    if sp.issparse(X):
+        return sp.csc_matrix(X, dtype=np.float64)
+
+    return sp.csc_matrix(np.asarray(X, dtype=np.float64))
+
+
+class SparseInteractionFeatures(TransformerMixin, BaseEstimator):
+    """
+    Degree 2 interaction terms as a CSR sparse matrix.
+
+    Output columns follow PolynomialFeatures(degree=2, interaction_only=True,
+    include_bias=False): the original columns first (if include_base), then every
+    kept pair (i, j) with i < j in the same order PolynomialFeatures would use.
+
+    A pair is skipped when:
+        - both columns come from the same source column (mutually exclusive dummies)
+        - the two columns are non-zero together in fewer than min_support training rows
+
+    Args:
+        feature_groups: Source column for every input column (see infer_feature_groups).
+            Columns with the same group are never paired. None means every column is its own group.
+        categorical_columns: Shortcut for feature_groups, the groups are inferred from the
+            dummy column names when X is a DataFrame.
+        min_support: Minimum number of training rows where both columns are non-zero. Pairs
+            below this are always zero (or nearly) in train and only add dead columns. 0 keeps them.
+        include_base: Keep the original columns in front of the interactions.
+        delimiter: Separator used when naming interaction columns, "|" matches dat.csv.
+        chunk_size: Number of pairs multiplied per batch, trades memory for speed.
+    """
+
+    def __init__(self, feature_groups=None, categorical_columns=None, min_support=1,
+                 include_base=True, delimiter='|', chunk_size=4096):
+        self.feature_groups = feature_groups
+        self.categorical_columns = categorical_columns
+        self.min_support = min_support
+        self.include_base = include_base
+        self.delimiter = delimiter
+        self.chunk_size = chunk_size
+
+    def fit(self, X, y=None):
+        if isinstance(X, pd.DataFrame):
+            self.feature_names_in_ = np.asarray(X.columns, dtype=object)
+        elif hasattr(self, 'feature_names_in_'):
+            del self.feature_names_in_
+
+        X = _to_csc(X)
+        self.n_features_in_ = X.shape[1]
+
+        groups = self._resolve_groups()
+        left, right = np.triu_indices(self.n_features_in_, k=1)
+
+        # drop pairs from the same source column, these are structurally zero
+        if groups is not None:
+            _, group_codes = np.unique(np.asarray(groups, dtype=str), return_inverse=True)
+            keep = group_codes[left] != group_codes[right]
+            left, right = left[keep], right[keep]
+
+        # co-occurrence counts for every pair in one sparse product instead of per pair
+        if self.min_support > 0:
+            nonzero = X.copy()
+            nonzero.data = (nonzero.data != 0).astype(np.float64)
+            support = (nonzero.T @ nonzero).toarray()
+            keep = support[left, right] >= self.min_support
+            left, right = left[keep], right[keep]
+
+        self.pairs_ = np.column_stack([left, right]).astype(np.intp)
+        self.n_output_features_ = len(self.pairs_) + (self.n_features_in_ if self.include_base else 0)
+
+        # names are only built when someone asks for them
+        self._feature_names = None
+        self._feature_index = None
+
+        return self
+
+    def transform(self, X):
+        if not hasattr(self, 'pairs_'):
+            raise ValueError("SparseInteractionFeatures is not fitted yet, call fit first")
+
+        X = _to_csc(X)
+        if X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has {X.shape[1]} columns, expected {self.n_features_in_}")
+
+        blocks = [X] if self.include_base else []
+
+        # multiply a batch of pairs at once, column slicing is cheap on CSC
+        for start in range(0, len(self.pairs_), self.chunk_size):
+            chunk = self.pairs_[start:start + self.chunk_size]
+            block = X[:, chunk[:, 0]].multiply(X[:, chunk[:, 1]])
+            blocks.append(sp.csc_matrix(block))
+
+        if not blocks:
+            return sp.csr_matrix((X.shape[0], 0), dtype=np.float64)
+
+        out = sp.hstack(blocks, format='csr')
+        out.eliminate_zeros()
+
+        return out
+
+    def get_feature_names_out(self, input_features=None):
+        """
+        Names of the output columns, interactions are named "<left><delimiter><right>".
+
+        The list is built on the first call and cached, so transform never pays for it.
+        """
+        if input_features is not None:
+            input_features = np.asarray(input_features, dtype=object)
+            if len(input_features) != self.n_features_in_:
+                raise ValueError(f"input_features has {len(input_features)} names, expected {self.n_features_in_}")
+            return self._build_names(input_features)
+
+        if self._feature_names is None:
+            self._feature_names = self._build_names(self._input_names())
+
+        return self._feature_names
+
+    def feature_index(self, name):
+        """
+        Column position of an output feature name, e.g. "hla_low_res_6|tce_div_match_Missing_value".
+        """
+        if self._feature_index is None:
+            names = self.get_feature_names_out()
+            self._feature_index = {feature: idx for idx, feature in enumerate(names)}
+
+        return self._feature_index[name]
+
+    def _input_names(self):
+        if hasattr(self, 'feature_names_in_'):
+            return self.feature_names_in_
+
+        return np.asarray([f"x{i}" for i in range(self.n_features_in_)], dtype=object)
+
+    def _build_names(self, input_features):
+        input_features = np.asarray([str(name) for name in input_features], dtype=object)
+        pair_names = input_features[self.pairs_[:, 0]] + self.delimiter + input_features[self.pairs_[:, 1]]
+
+        if self.include_base:
+            return np.concatenate([input_features, pair_names])
+
+        return pair_names
+
+    def _resolve_groups(self):
+        if self.feature_groups is not None:
+            if len(self.feature_groups) != self.n_features_in_:
+                raise ValueError(f"feature_groups has {len(self.feature_groups)} entries, expected {self.n_features_in_}")
+            return list(self.feature_groups)
+
+        if self.categorical_columns is not None:
+            return infer_feature_groups(self._input_names(), self.categorical_columns)
+
+        return None
@@ -0,0 +1,258 @@
+"""
+Out-of-core training of the interaction models.
+
+LogisticRegression(max_iter=10000) on the interaction matrix needs every row of
+every interaction term in memory at once. OutOfCoreInteractionModel never builds
+that matrix: it cuts the base encoded matrix (a DataFrame, array or the read only
+memory maps from load_encoded_data) into mini-batches, expands each batch with a
+fitted SparseInteractionFeatures / ScreenedInteractionFeatures on the fly and feeds
+it to an incremental learner (SGDClassifier by default) through partial_fit. Only
+one expanded batch and the coefficients are ever in memory, so the number of
+interaction terms is limited by the coefficient vector rather than n x terms.
+
+A held out share of the rows is scored after every epoch. Training stops once that
+loss stops improving, the best epoch's model is kept and history_ has the loss
+curve to check convergence.
+"""
+import copy
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.base import BaseEstimator, clone, is_classifier
+from sklearn.linear_model import SGDClassifier
+from sklearn.metrics import log_loss, mean_squared_error
+from sklearn.preprocessing import StandardScaler
+
+from .interactions import SparseInteractionFeatures
+from .profiling import get_profiler
+
+
+def _take_rows(X, idx):
+    if isinstance(X, (pd.DataFrame, pd.Series)):
+        return X.iloc[idx].to_numpy()
+
+    return X[idx]
+
+
+def iter_row_batches(n_rows, batch_size, rows=None, shuffle=False, random_state=None):
+    """
+    Row index batches over rows (default all rows), each sorted so memory maps are read in order.
+    """
+    rows = np.arange(n_rows) if rows is None else np.asarray(rows)
+    if shuffle:
+        rows = np.random.default_rng(random_state).permutation(rows)
+
+    for start in range(0, len(rows), batch_size):
+        yield np.sort(rows[start:start + batch_size])
+
+
+def iter_interaction_batches(X, y, expander, batch_size=2048, rows=None, shuffle=False, random_state=None):
+    """
+    Yields (expanded batch, y batch) without ever expanding all rows at once.
+
+    Args:
+        X: Base encoded matrix, DataFrame, array or memory map.
+        y: Targets, None yields None in their place.
+        expander: Fitted transformer that builds the interaction terms of a batch.
+        batch_size: Rows per batch.
+        rows: Row positions to go over, all rows by default.
+        shuffle: Visit the rows in random order.
+        random_state: Seed for the shuffle.
+    """
+    y = None if y is None else np.asarray(y)
+
+    for idx in iter_row_batches(X.shape[0], batch_size, rows=rows, shuffle=shuffle, random_state=random_state):
+        yield expander.transform(_take_rows(X, idx)), None if y is None else y[idx]
+
+
+class OutOfCoreInteractionModel(BaseEstimator):
+    """
+    An incremental learner trained on interaction terms built one mini-batch at a time.
+
+    Args:
+        expander: SparseInteractionFeatures or ScreenedInteractionFeatures, fitted or not (fit
+            learns it from the training rows first). Defaults to SparseInteractionFeatures(min_support=5).
+        estimator: Anything with partial_fit, defaults to a logistic SGDClassifier. Regressors
+            (SGDRegressor) work the same way and are scored on MSE instead of log loss.
+        batch_size: Rows per mini-batch.
+        max_epochs: Passes over the training rows at most.
+        validation_fraction: Share of the rows held out to track convergence, 0 tracks the
+            training loss instead.
+        tol: Improvement in the held out loss that counts as progress.
+        n_iter_no_change: Epochs without progress before stopping.
+        scale: Scale the expanded columns to unit variance (no centering, they stay sparse) and
+            the rows to a mean squared norm of 1, learned in one extra streaming pass. SGD needs
+            it, products of scaled columns are far from unit variance.
+        random_state: Seed for the split, the batch order and the default estimator.
+        verbose: Print the loss after every epoch.
+    """
+
+    def __init__(self, expander=None, estimator=None, batch_size=2048, max_epochs=20, validation_fraction=0.1,
+                 tol=1e-4, n_iter_no_change=3, scale=True, random_state=0, verbose=0):
+        self.expander = expander
+        self.estimator = estimator
+        self.batch_size = batch_size
+        self.max_epochs = max_epochs
+        self.validation_fraction = validation_fraction
+        self.tol = tol
+        self.n_iter_no_change = n_iter_no_change
+        self.scale = scale
+        self.random_state = random_state
+        self.verbose = verbose
+
+    def fit(self, X, y, profiler=None):
+        """
+        Streams mini-batches through partial_fit until the held out loss stops improving.
+
+        Args:
+            X: Base encoded matrix (not expanded), e.g. x_train_encoded.
+            y: Target.
+            profiler: StageProfiler timing the interactions and partial_fit steps, see profiling.py.
+        """
+        profiler = get_profiler(profiler)
+        y = np.asarray(y)
+        n_rows = X.shape[0]
+
+        rng = np.random.default_rng(self.random_state)
+        rows = rng.permutation(n_rows)
+        n_validation = int(round(self.validation_fraction * n_rows))
+        validation_rows, train_rows = np.sort(rows[:n_validation]), rows[n_validation:]
+
+        # learned from the training rows only, a screening expander that saw the held out rows would
+        # flatter the validation loss
+        expander = SparseInteractionFeatures(min_support=5) if self.expander is None else self.expander
+        if not (hasattr(expander, 'pairs_') or hasattr(expander, 'terms_')):
+            with profiler.stage('fit_interactions'):
+                # a DataFrame stays one, the expander may take its groups from the column names
+                fit_rows = np.sort(train_rows)
+                X_fit = X if not n_validation else X.iloc[fit_rows] if isinstance(X, pd.DataFrame) else X[fit_rows]
+                expander = clone(expander).fit(X_fit, y[fit_rows] if n_validation else y)
+        self.expander_ = expander
+
+        estimator = SGDClassifier(loss='log_loss', alpha=1e-4, random_state=self.random_state) \
+            if self.estimator is None else clone(self.estimator)
+        self._is_classifier = is_classifier(estimator)
+        if self._is_classifier:
+            self.classes_ = np.unique(y)
+
+        self.scaler_ = None
+        if self.scale:
+            with profiler.stage('fit_scaler'):
+                self.scaler_ = StandardScaler(with_mean=False)
+                for batch, _ in iter_interaction_batches(X, None, expander, self.batch_size, rows=train_rows):
+                    self.scaler_.partial_fit(batch)
+
+            # thousands of unit variance columns make each row's squared norm huge, which blows up SGD's
+            # steps, so the whole matrix is also shrunk to a mean squared row norm of 1
+            variance = self.scaler_.var_
+            used = variance > 0
+            self.row_scale_ = 1 / np.sqrt(max(np.sum((variance[used] + self.scaler_.mean_[used] ** 2)
+                                                     / variance[used]), 1.0))
+
+        self.history_ = []
+        best_loss, best_estimator, stale_epochs = np.inf, None, 0
+        self.converged_ = False
+
+        for epoch in range(1, self.max_epochs + 1):
+            start = time.perf_counter()
+            train_loss, scored = 0.0, 0
+            batches = iter_row_batches(n_rows, self.batch_size, rows=train_rows, shuffle=True,
+                                       random_state=rng.integers(2 ** 31))
+
+            with profiler.stage('epoch', epoch=epoch):
+                for idx in batches:
+                    with profiler.stage('interactions'):
+                        batch = self._expand(_take_rows(X, idx))
+                    y_batch = y[idx]
+
+                    # progressive validation, each batch is scored before the model learns from it
+                    # (except the very first one, there is no model yet)
+                    if hasattr(estimator, 'coef_'):
+                        train_loss += self._loss(estimator, batch, y_batch) * len(idx)
+                        scored += len(idx)
+                    with profiler.stage('partial_fit'):
+                        if self._is_classifier:
+                            estimator.partial_fit(batch, y_batch, classes=self.classes_)
+                        else:
+                            estimator.partial_fit(batch, y_batch)
+
+                train_loss = train_loss / scored if scored else np.nan
+
+                with profiler.stage('evaluation'):
+                    validation_loss = self._stream_loss(estimator, X, y, validation_rows) if n_validation \
+                        else train_loss
+
+            self.history_.append({'epoch': epoch, 'train_loss': train_loss, 'validation_loss': validation_loss,
+                                  'seconds': time.perf_counter() - start})
+            if self.verbose:
+                print(f"epoch {epoch}: train loss {train_loss:.5f}, validation loss {validation_loss:.5f}")
+
+            if validation_loss < best_loss - self.tol:
+                best_loss, best_estimator, stale_epochs = validation_loss, copy.deepcopy(estimator), 0
+            else:
+                stale_epochs += 1
+                if stale_epochs >= self.n_iter_no_change:
+                    self.converged_ = True
+                    break
+
+        self.estimator_ = best_estimator if best_estimator is not None else estimator
+        self.best_loss_ = best_loss
+        self.n_epochs_ = len(self.history_)
+
+        return self
+
+    def decision_function(self, X):
+        return self._stream(X, 'decision_function')
+
+    def predict(self, X):
+        return self._stream(X, 'predict')
+
+    def predict_proba(self, X):
+        return self._stream(X, 'predict_proba')
+
+    def history(self):
+        """
+        The per epoch losses as a DataFrame.
+        """
+        return pd.DataFrame(self.history_)
+
+    def get_feature_names_out(self):
+        return self.expander_.get_feature_names_out()
+
+    def _expand(self, base_batch):
+        batch = self.expander_.transform(base_batch)
+        if self.scaler_ is not None:
+            batch = self.scaler_.transform(batch) * self.row_scale_
+
+        return batch
+
+    def _stream(self, X, method):
+        if not hasattr(self, 'estimator_'):
+            raise ValueError("OutOfCoreInteractionModel is not fitted yet, call fit first")
+
+        outputs = [getattr(self.estimator_, method)(self._expand(_take_rows(X, idx)))
+                   for idx in iter_row_batches(X.shape[0], self.batch_size)]
+
+        return np.concatenate(outputs) if outputs else np.empty(0)
+
+    def _loss(self, estimator, batch, y_batch):
+        if not self._is_classifier:
+            return mean_squared_error(y_batch, estimator.predict(batch))
+
+        # hinge style losses have no probabilities, fall back to the error rate
+        if hasattr(estimator, 'predict_proba'):
+            try:
+                return log_loss(y_batch, estimator.predict_proba(batch), labels=self.classes_)
+            except AttributeError:
+                pass
+
+        return float(np.mean(estimator.predict(batch) != y_batch))
+
+    def _stream_loss(self, estimator, X, y, rows):
+        total = 0.0
+        for idx in iter_row_batches(X.shape[0], self.batch_size, rows=rows):
+            batch = self._expand(_take_rows(X, idx))
+            total += self._loss(estimator, batch, y[idx]) * len(idx)
+
+        return total / len(rows)
@@ -0,0 +1,234 @@
+"""
+Headless rendering of the training and grid search diagnostics.
+
+Inital Analysis.py draws the "Performance vs. Number of Estimators" plots with
+plt.show() between the search and the next model, so every run stops until the
+window is closed. Here a plot is first described as a spec, a plain dict of panels,
+lines and an optional table (search_spec from cv_results, history_spec from a loss
+history), which pickles cheaply. render() draws a spec on an Agg canvas and writes
+PNG and/or HTML (the PNG inline plus the table), and PlotQueue does the same in a
+pool of worker processes, so training carries on while the plots are drawn:
+
+    with PlotQueue('plots', formats=('png', 'html')) as plots:
+        model_search.fit(x_train_encoded, y_train)
+        plots.submit(search_spec({'lightgbm': model_search.cv_results('lightgbm')}, 'lightgbm_search'))
+        best_models = model_search.refit(x_train_encoded, y_train)
+    print(plots.paths)
+"""
+import base64
+import html
+import io
+import multiprocessing
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import pandas as pd
+
+# the setting drawn as separate lines in the search plots, the others are maxed over
+LINE_PARAMS = {'lightgbm': 'num_leaves', 'random_forest': 'max_features', 'catboost': 'depth'}
+
+
+def _floats(values):
+    return [None if pd.isna(value) else float(value) for value in values]
+
+
+def search_spec(results, name, x_param='n_estimators', line_params=None, higher_is_better=False, title=None):
+    """
+    The cv score against x_param, one panel per model and one line per value of its line parameter.
+
+    Args:
+        results: {model name: cv_results DataFrame} (ModelSearch.cv_results or the saved CSVs).
+        name: File name of the plot, without extension.
+        x_param: Setting on the x axis.
+        line_params: {model name: setting drawn as separate lines}, LINE_PARAMS by default.
+        higher_is_better: The score is a C-index rather than a negated MSE.
+        title: Figure title.
+    """
+    line_params = LINE_PARAMS if line_params is None else line_params
+    ylabel = 'Mean Test Score (Stratified C-index)' if higher_is_better else 'Mean Test Score (Positive MSE)'
+
+    panels, tables = [], []
+    for model, cv_results in results.items():
+        line_param = line_params.get(model)
+        groups = cv_results.groupby(f"param_{line_param}", dropna=False) if line_param else [('all', cv_results)]
+        lines = []
+        for value, subset in groups:
+            best = subset.groupby(f"param_{x_param}")['mean_test_score'].max()
+            scores = best if higher_is_better else -best
+            lines.append({'x': _floats(best.index), 'y': _floats(scores), 'label': f"{line_param}: {value}",
+                          'marker': 'o'})
+        panels.append({'title': f"{model}: Performance vs. Number of Estimators",
+                       'xlabel': f"Number of Estimators ({x_param})", 'ylabel': ylabel, 'lines': lines,
+                       'legend': line_param})
+
+        columns = [col for col in cv_results.columns if col.startswith('param_')] + \
+                  [col for col in ('mean_test_score', 'std_test_score', 'rank_test_score') if col in cv_results]
+        tables.append(cv_results[columns].assign(model=model))
+
+    table = pd.concat(tables, ignore_index=True).sort_values(['model', 'rank_test_score'] if 'rank_test_score'
+                                                             in tables[0] else ['model']) if tables else None
+
+    return {'name': name, 'title': title, 'panels': panels, 'table': table}
+
+
+def history_spec(history, name, title=None):
+    """
+    Training and validation loss per epoch, e.g. OutOfCoreInteractionModel.history_.
+
+    Args:
+        history: List of per epoch dicts or {metric: [values]}, columns starting with train_ and
+            validation_ (or keras' val_) are paired up in one panel per metric.
+        name: File name of the plot, without extension.
+        title: Figure title.
+    """
+    history = pd.DataFrame(history)
+    epochs = history['epoch'] if 'epoch' in history else pd.Series(range(1, len(history) + 1))
+
+    panels = []
+    for col in history.columns:
+        if col in ('epoch', 'seconds') or col.startswith(('validation_', 'val_')):
+            continue
+        metric = col[len('train_'):] if col.startswith('train_') else col
+        lines = [{'x': _floats(epochs), 'y': _floats(history[col]), 'label': f"Train {metric}"}]
+        for validation_col in (f"validation_{metric}", f"val_{metric}"):
+            if validation_col in history:
+                lines.append({'x': _floats(epochs), 'y': _floats(history[validation_col]),
+                              'label': f"Validation {metric}", 'linestyle': '--'})
+        panels.append({'title': metric, 'xlabel': 'Epochs', 'ylabel': metric, 'lines': lines})
+
+    return {'name': name, 'title': title, 'panels': panels, 'table': history.assign(epoch=epochs.to_numpy())}
+
+
+def draw(fig, spec):
+    """
+    Draws a spec on a matplotlib Figure, one panel per axes side by side.
+    """
+    axs = fig.subplots(1, max(len(spec['panels']), 1), squeeze=False)[0]
+    for ax, panel in zip(axs, spec['panels']):
+        for line in panel['lines']:
+            ax.plot(line['x'], line['y'], label=line.get('label'), marker=line.get('marker'),
+                    linestyle=line.get('linestyle', '-'))
+        ax.set_title(panel.get('title', ''))
+        ax.set_xlabel(panel.get('xlabel', ''))
+        ax.set_ylabel(panel.get('ylabel', ''))
+        if any(line.get('label') for line in panel['lines']):
+            ax.legend(title=panel.get('legend'))
+        ax.grid(True)
+    if spec.get('title'):
+        fig.suptitle(spec['title'])
+
+    return fig
+
+
+def _write_html(path, spec, png):
+    title = html.escape(spec.get('title') or spec['name'])
+    table = '' if spec.get('table') is None else spec['table'].to_html(index=False, float_format=lambda v: f"{v:.4f}")
+    with open(path, 'w') as f:
+        f.write(f"<!DOCTYPE html>\n<html lang=\"en\">\n<head>\n<meta charset=\"utf-8\"/>\n<title>{title}</title>\n"
+                f"</head>\n<body>\n<h2>{title}</h2>\n"
+                f"<img src=\"data:image/png;base64,{base64.b64encode(png).decode('ascii')}\"/>\n"
+                f"{table}\n</body>\n</html>\n")
+
+
+def render(spec, output_dir, formats=('png',), dpi=100):
+    """
+    Draws a spec with the Agg backend and writes output_dir/<name>.<format> for every format.
+
+    Args:
+        spec: From search_spec, history_spec or a dict of the same shape.
+        output_dir: Folder for the files.
+        formats: 'png' and/or 'html' (the PNG embedded next to the spec's table).
+        dpi: Resolution of the PNG.
+
+    Returns:
+        The written paths.
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    n_panels = max(len(spec['panels']), 1)
+    fig = Figure(figsize=(min(10 * n_panels, 30), 6))
+    FigureCanvasAgg(fig)
+    draw(fig, spec)
+    fig.tight_layout()
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=dpi)
+    png = buffer.getvalue()
+
+    os.makedirs(output_dir, exist_ok=True)
+    paths = []
+    for extension in formats:
+        path = os.path.join(output_dir, f"{spec['name']}.{extension}")
+        if extension == 'png':
+            with open(path, 'wb') as f:
+                f.write(png)
+        elif extension == 'html':
+            _write_html(path, spec, png)
+        else:
+            raise ValueError(f"unknown plot format {extension!r}, use 'png' or 'html'")
+        paths.append(path)
+
+    return paths
+
+
+def _use_agg():
+    # nothing in a worker may try to open a window
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+class PlotQueue:
+    """
+    Renders plot specs in worker processes while the caller gets on with training.
+
+    Args:
+        output_dir: Folder for the files.
+        formats: 'png' and/or 'html'.
+        n_workers: Worker processes, 0 renders right away in this process.
+        dpi: Resolution of the PNGs.
+    """
+
+    def __init__(self, output_dir, formats=('png',), n_workers=2, dpi=100):
+        self.output_dir = output_dir
+        self.formats = tuple(formats)
+        self.n_workers = n_workers
+        self.dpi = dpi
+        self.futures = []
+        # spawn, the workers shouldn't inherit a half initialized GUI backend or joblib's pools
+        self._pool = ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context('spawn'),
+                                         initializer=_use_agg) if n_workers else None
+
+    def submit(self, spec):
+        """
+        Queues a spec and returns a Future of its paths.
+        """
+        if self._pool is not None:
+            future = self._pool.submit(render, spec, self.output_dir, self.formats, self.dpi)
+        else:
+            future = Future()
+            try:
+                future.set_result(render(spec, self.output_dir, self.formats, self.dpi))
+            except Exception as error:
+                future.set_exception(error)
+        self.futures.append(future)
+
+        return future
+
+    @property
+    def paths(self):
+        """
+        Every written file so far, waits for the queued plots to finish.
+        """
+        return [path for future in self.futures for path in future.result()]
+
+    def close(self, wait=True):
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait)
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,256 @@
+"""
+Fitted preprocessing for the HCT data.
+
+Inital Analysis.py and the CLASSIFICATION notebooks all run the same chain by hand:
+align columns with test_df, drop mostly missing columns, mean impute and scale the
+numeric columns, clean up the categorical values, fill missing categories with
+"Missing_value" and dummy code. HCTPreprocessor learns all of that once from the
+training data, can be saved to disk, and transforms any new batch in one pass.
+"""
+import json
+
+import numpy as np
+import pandas as pd
+
+from .column_stats import ColumnStats
+from .encoding import CategoryEncoder
+from .profiling import get_profiler
+
+MISSING_VALUE = 'Missing_value'
+
+# values whose names get messy after cleaning and dummy coding
+DEFAULT_VALUE_REPLACEMENTS = {
+    'tbi_status': {
+        'TBI +- Other, >cGy': 'TBI_Other_GreatercGY',
+        'TBI +- Other, <=cGy': 'TBI_Other_LesserEqualcGY'
+    },
+    'cmv_status': {
+        '+/+': 'pospos',
+        '-/+': 'negpos',
+        '+/-': 'posneg',
+        '-/-': 'negneg'
+    }
+}
+
+
+def clean_categoricals(frame, value_replacements=None):
+    """
+    Standardizes categorical values across every column at once.
+
+    Instead of running str.replace column by column, the distinct values of the whole
+    frame are cleaned once and mapped back through their codes.
+
+    Args:
+        frame: DataFrame holding only the categorical columns.
+        value_replacements: {column: {old: new}} applied before cleaning.
+
+    Returns:
+        DataFrame of cleaned strings, missing values set to "Missing_value".
+    """
+    if value_replacements:
+        frame = frame.copy()
+        for col, mapping in value_replacements.items():
+            if col in frame.columns:
+                # replace on a category column would only rename categories, go through object values
+                frame[col] = frame[col].astype(object).replace(mapping)
+
+    values = frame.to_numpy(dtype=object)
+    codes, uniques = pd.factorize(values.ravel())
+
+    cleaned = pd.Series(uniques, dtype=object).astype(str).str.replace(r'[^a-zA-Z0-9]', '_', regex=True)
+
+    # factorize gives missing values the code -1, which lands on the last slot
+    lookup = np.append(cleaned.to_numpy(dtype=object), MISSING_VALUE)
+    out = lookup[codes].reshape(values.shape)
+
+    return pd.DataFrame(out, index=frame.index, columns=frame.columns)
+
+
+class HCTPreprocessor:
+    """
+    Fit once on train, then transform train, test or a new batch of patients.
+
+    Args:
+        target_columns: Outcome columns, never used as features.
+        drop_columns: Extra columns to leave out (e.g. cmv_status in Inital Analysis.py).
+        max_missing_pct: Drop columns with at least this percent missing in train, None keeps all.
+        value_replacements: {column: {old: new}} for categorical values, defaults to the
+            tbi_status and cmv_status fixes from the notebooks.
+        drop_first: Drop the first level of every categorical like get_dummies(drop_first=True).
+        handle_unknown: What to do with category levels not seen in train, see CategoryEncoder.
+    """
+
+    def __init__(self, target_columns=('efs', 'efs_time'), drop_columns=(), max_missing_pct=None,
+                 value_replacements=None, drop_first=True, handle_unknown='bucket'):
+        self.target_columns = list(target_columns)
+        self.drop_columns = list(drop_columns)
+        self.max_missing_pct = max_missing_pct
+        self.value_replacements = DEFAULT_VALUE_REPLACEMENTS if value_replacements is None else value_replacements
+        self.drop_first = drop_first
+        self.handle_unknown = handle_unknown
+
+    def fit(self, train_df, test_columns=None, profiler=None, stats=None):
+        """
+        Learns columns, means, scales and category levels from the training data.
+
+        Args:
+            train_df: Training data, targets included is fine.
+            test_columns: Columns of the test data, train columns missing from test are dropped.
+            profiler: StageProfiler timing the impute, scale and encode steps, see profiling.py.
+            stats: ColumnStats of train_df if they were already computed (e.g. chunked from the CSV),
+                otherwise they are computed here in one pass.
+        """
+        profiler = get_profiler(profiler)
+        excluded = set(self.target_columns) | set(self.drop_columns)
+        columns = [col for col in train_df.columns if col not in excluded]
+
+        if test_columns is not None:
+            test_columns = set(test_columns)
+            columns = [col for col in columns if col in test_columns]
+
+        x_train = train_df[columns]
+
+        # null rates, means and spreads all come from this one sweep instead of a scan each
+        with profiler.stage('column_stats'):
+            stats = ColumnStats.from_frame(x_train) if stats is None else stats
+
+        if self.max_missing_pct is not None:
+            missing_percentage = stats.missing_percentage().reindex(x_train.columns)
+            x_train = x_train.loc[:, missing_percentage < self.max_missing_pct]
+
+        self.numeric_columns_ = list(x_train.select_dtypes(include='number').columns)
+        self.categorical_columns_ = [col for col in x_train.columns if col not in self.numeric_columns_]
+
+        # impute then scale, same numbers StandardScaler would learn after the mean impute
+        # (accumulated in float64, so compact float32/small int columns lose nothing)
+        with profiler.stage('impute'):
+            self.means_ = stats.mean.reindex(self.numeric_columns_)
+        with profiler.stage('scale'):
+            self.scales_ = stats.imputed_std().reindex(self.numeric_columns_).replace(0, 1.0)
+
+        with profiler.stage('encode'):
+            cleaned = clean_categoricals(x_train[self.categorical_columns_], self.value_replacements)
+            self.encoder_ = CategoryEncoder(drop_first=self.drop_first,
+                                            handle_unknown=self.handle_unknown).fit(cleaned)
+
+        self._set_feature_names()
+
+        return self
+
+    def transform(self, df, profiler=None):
+        """
+        Imputes, scales, cleans and dummy codes a batch in one pass.
+
+        Columns the fitted data had but df doesn't are treated as missing, category levels
+        not seen in train go to the unknown bucket (or all zeros with handle_unknown="ignore").
+
+        Args:
+            df: Batch to transform.
+            profiler: StageProfiler timing the impute, scale and encode steps, see profiling.py.
+
+        Returns:
+            DataFrame with exactly the columns in feature_names_out_.
+        """
+        if not hasattr(self, 'means_'):
+            raise ValueError("HCTPreprocessor is not fitted yet, call fit first")
+        profiler = get_profiler(profiler)
+
+        df = df.reindex(columns=self.numeric_columns_ + self.categorical_columns_)
+
+        numeric = df[self.numeric_columns_].astype(np.float64)
+        with profiler.stage('impute'):
+            numeric = numeric.fillna(self.means_)
+        with profiler.stage('scale'):
+            numeric = (numeric - self.means_) / self.scales_
+
+        with profiler.stage('encode'):
+            cleaned = clean_categoricals(df[self.categorical_columns_], self.value_replacements)
+            dummies = pd.DataFrame(self.encoder_.transform(cleaned), index=df.index,
+                                   columns=self.encoder_.feature_names_out_)
+
+        return pd.concat([numeric, dummies], axis=1)
+
+    def transform_native(self, df):
+        """
+        The same columns without imputing, scaling or dummy coding, for models with native
+        missing value and categorical handling (LightGBM, CatBoost, see boosting.py).
+
+        Numeric columns keep their NaNs, categoricals are cleaned like transform() and become
+        pandas categoricals with the levels learned in fit, so every batch gets the same codes.
+        Levels not seen in train become NaN.
+
+        Returns:
+            DataFrame with the columns in native_feature_names_, index kept.
+        """
+        if not hasattr(self, 'means_'):
+            raise ValueError("HCTPreprocessor is not fitted yet, call fit first")
+
+        df = df.reindex(columns=self.numeric_columns_ + self.categorical_columns_)
+        numeric = df[self.numeric_columns_].astype(np.float32)
+
+        cleaned = clean_categoricals(df[self.categorical_columns_], self.value_replacements)
+        categorical = pd.DataFrame({
+            col: pd.Categorical(cleaned[col], categories=self.encoder_.categories_[col])
+            for col in self.categorical_columns_
+        }, index=df.index)
+
+        return pd.concat([numeric, categorical], axis=1)
+
+    def fit_transform(self, train_df, test_columns=None, profiler=None, stats=None):
+        return self.fit(train_df, test_columns=test_columns, profiler=profiler, stats=stats).transform(
+            train_df, profiler=profiler
+        )
+
+    def get_params(self):
+        return {
+            'target_columns': self.target_columns,
+            'drop_columns': self.drop_columns,
+            'max_missing_pct': self.max_missing_pct,
+            'value_replacements': self.value_replacements,
+            'drop_first': self.drop_first,
+            'handle_unknown': self.handle_unknown
+        }
+
+    def to_dict(self):
+        """
+        Fitted state as plain JSON friendly types.
+        """
+        return {
+            'params': self.get_params(),
+            'numeric_columns': self.numeric_columns_,
+            'categorical_columns': self.categorical_columns_,
+            'means': self.means_.tolist(),
+            'scales': self.scales_.tolist(),
+            'encoder': self.encoder_.to_dict()
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        preprocessor = cls(**state['params'])
+        preprocessor.numeric_columns_ = state['numeric_columns']
+        preprocessor.categorical_columns_ = state['categorical_columns']
+        preprocessor.means_ = pd.Series(state['means'], index=preprocessor.numeric_columns_, dtype=np.float64)
+        preprocessor.scales_ = pd.Series(state['scales'], index=preprocessor.numeric_columns_, dtype=np.float64)
+        preprocessor.encoder_ = CategoryEncoder.from_dict(state['encoder'])
+        preprocessor._set_feature_names()
+
+        return preprocessor
+
+    def save(self, path):
+        """
+        Writes the fitted state to a JSON file.
+        """
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Rebuilds a fitted preprocessor saved with save().
+        """
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    def _set_feature_names(self):
+        self.feature_names_out_ = self.numeric_columns_ + self.encoder_.feature_names_out_
+        self.native_feature_names_ = self.numeric_columns_ + self.categorical_columns_
@@ -0,0 +1,252 @@
+"""
+Opt-in timing of the HCT pipeline stages.
+
+When the interaction model or a grid search is slow, the question is always where
+the time goes: reading the CSVs, imputing, scaling, dummy coding, building the
+interaction terms, fitting or predicting. StageProfiler times named stages with
+wall clock, CPU time and peak RSS, can run each top level stage under cProfile, and
+writes everything to one JSON report. The pipeline functions take profiler=None and
+do nothing extra unless one is passed in:
+
+    profiler = StageProfiler(profile_dir='profiles')
+    x_train, x_test, targets, test_ids, preprocessor = load_encoded_data(train_path, test_path, profiler=profiler)
+    with profiler.stage('interactions'):
+        x_poly = poly.fit_transform(x_train)
+    with profiler.stage('fit', model='logistic'):
+        model.fit(x_poly, y_train)
+    profiler.save('timings.json')
+
+Stages nest, a stage opened inside another is named "<outer>/<inner>". CPU time and
+RSS are for this process only, work done in joblib worker processes (n_jobs) shows
+up as wall time with little CPU. For a sampling profile of the whole run including
+native code, py-spy attaches from outside: py-spy record -- python -m hct_survival train ...
+"""
+import cProfile
+import datetime
+import json
+import os
+import platform
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+try:
+    import psutil
+except ImportError:  # pragma: no cover - optional, /proc or getrusage is used instead
+    psutil = None
+
+
+def _rss_reader():
+    """
+    Best available (function, source name) for the current RSS in bytes.
+    """
+    if psutil is not None:
+        process = psutil.Process()
+        return (lambda: process.memory_info().rss), 'psutil'
+
+    if os.path.exists('/proc/self/statm'):
+        page_size = os.sysconf('SC_PAGE_SIZE')
+
+        def read_statm():
+            with open('/proc/self/statm') as f:
+                return int(f.read().split()[1]) * page_size
+
+        return read_statm, 'proc'
+
+    try:
+        import resource
+    except ImportError:
+        return (lambda: None), None
+
+    # only the high water mark of the whole process, kilobytes on Linux and bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return (lambda: resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale), 'ru_maxrss'
+
+
+def _mb(value):
+    return None if value is None else value / 2 ** 20
+
+
+class StageProfiler:
+    """
+    Records wall time, CPU time and peak RSS per named stage.
+
+    Args:
+        enabled: False turns every stage into a no-op, so code can always call stage().
+        cprofile: Run each top level stage under cProfile and keep its stats.
+        profile_dir: Folder for the cProfile .prof files (readable by pstats and snakeviz),
+            implies cprofile=True.
+        sample_interval: Seconds between RSS samples while a stage runs.
+    """
+
+    def __init__(self, enabled=True, cprofile=False, profile_dir=None, sample_interval=0.01):
+        self.enabled = enabled
+        self.cprofile = cprofile or profile_dir is not None
+        self.profile_dir = profile_dir
+        self.sample_interval = sample_interval
+        self.records = []
+        self.profiles = {}
+
+        self._read_rss, self.rss_source = _rss_reader()
+        self._open = []
+        self._lock = threading.Lock()
+        self._sampler = None
+        self._stop = threading.Event()
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name, **info):
+        """
+        Times the block inside the with statement as one stage.
+
+        Args:
+            name: Stage name, e.g. "impute" or "fit".
+            info: Extra JSON friendly details stored with the stage (model name, shapes, ...).
+        """
+        if not self.enabled:
+            yield
+            return
+
+        path = f"{self._open[-1]['stage']}/{name}" if self._open else name
+        rss = self._read_rss()
+        record = {'stage': path, 'depth': len(self._open), 'wall_s': None, 'cpu_s': None,
+                  'rss_start_mb': _mb(rss), 'rss_end_mb': None, 'peak_rss_mb': _mb(rss), 'profile': None,
+                  'info': info}
+
+        with self._lock:
+            self._open.append(record)
+            self.records.append(record)
+        self._start_sampler()
+
+        # cProfile can't nest, the outermost stage profiles everything inside it
+        profile = cProfile.Profile() if self.cprofile and record['depth'] == 0 else None
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        if profile is not None:
+            profile.enable()
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            record['wall_s'] = time.perf_counter() - wall_start
+            record['cpu_s'] = time.process_time() - cpu_start
+
+            rss = self._read_rss()
+            with self._lock:
+                self._open.remove(record)
+                record['rss_end_mb'] = _mb(rss)
+                if rss is not None:
+                    record['peak_rss_mb'] = max(record['peak_rss_mb'], _mb(rss))
+            if not self._open:
+                self._stop_sampler()
+
+            if profile is not None:
+                self._keep_profile(record, profile)
+
+    def wrap(self, name, fn, **info):
+        """
+        fn wrapped so every call is timed as the stage name.
+        """
+        def timed(*args, **kwargs):
+            with self.stage(name, **info):
+                return fn(*args, **kwargs)
+
+        return timed
+
+    def to_frame(self):
+        """
+        One row per stage run, in the order they started.
+        """
+        columns = ['stage', 'depth', 'wall_s', 'cpu_s', 'rss_start_mb', 'rss_end_mb', 'peak_rss_mb']
+        return pd.DataFrame([{col: record[col] for col in columns} for record in self.records], columns=columns)
+
+    def summary(self):
+        """
+        Totals per stage name, for stages that ran more than once (e.g. transform on train and test).
+        """
+        summary = self.to_frame().groupby('stage', sort=False).agg(
+            calls=('wall_s', 'size'), wall_s=('wall_s', 'sum'), cpu_s=('cpu_s', 'sum'),
+            peak_rss_mb=('peak_rss_mb', 'max')
+        )
+        # above 1 means several threads were busy, well below 1 means waiting on I/O or worker processes
+        summary['cpu_per_wall'] = summary['cpu_s'] / summary['wall_s'].where(summary['wall_s'] > 0)
+
+        return summary.reset_index()
+
+    def report(self, **meta):
+        """
+        The whole run as a JSON friendly dict.
+
+        Args:
+            meta: Anything worth keeping with the timings, e.g. the command line arguments.
+        """
+        return {
+            'created': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'rss_source': self.rss_source,
+            'elapsed_s': time.perf_counter() - self._started,
+            'meta': meta,
+            'stages': self.records
+        }
+
+    def save(self, path, **meta):
+        """
+        Writes report() to a JSON file and returns the path.
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(self.report(**meta), f, indent=2, default=str)
+
+        return path
+
+    def _keep_profile(self, record, profile):
+        self.profiles[record['stage']] = profile
+        if self.profile_dir is None:
+            return
+
+        os.makedirs(self.profile_dir, exist_ok=True)
+        file_name = f"{len(self.records):02d}_{re.sub(r'[^A-Za-z0-9_.-]', '_', record['stage'])}.prof"
+        record['profile'] = os.path.join(self.profile_dir, file_name)
+        profile.dump_stats(record['profile'])
+
+    def _sample(self):
+        while not self._stop.wait(self.sample_interval):
+            rss = _mb(self._read_rss())
+            if rss is None:
+                return
+            with self._lock:
+                for record in self._open:
+                    record['peak_rss_mb'] = max(record['peak_rss_mb'], rss)
+
+    def _start_sampler(self):
+        if self._sampler is not None or self.rss_source is None:
+            return
+
+        self._stop.clear()
+        self._sampler = threading.Thread(target=self._sample, name='stage-profiler-rss', daemon=True)
+        self._sampler.start()
+
+    def _stop_sampler(self):
+        if self._sampler is None:
+            return
+
+        self._stop.set()
+        self._sampler.join()
+        self._sampler = None
+
+
+NULL_PROFILER = StageProfiler(enabled=False)
+
+
+def get_profiler(profiler=None):
+    """
+    The profiler that was passed in, or one that does nothing.
+    """
+    return NULL_PROFILER if profiler is None else profiler
@@ -0,0 +1,320 @@
+"""
+Screen interaction terms before building them.
+
+The old workflow built every pairwise term, fit a model on all of them and then
+ranked by absolute coefficient (feature_importance_df_sorted / dat.csv). Here
+every candidate is scored first by its correlation with the residuals, computed
+for all pairs at once from three p x p gram matrices that are accumulated over
+row chunks, and only the top_k terms are ever materialized. Degree 3 terms are
+screened the same way by extending the best scoring pairs with one more column.
+"""
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.base import BaseEstimator, TransformerMixin
+
+from .interactions import _to_csc, infer_feature_groups
+
+
+def _as_float_matrix(X):
+    if isinstance(X, pd.DataFrame):
+        return X.to_numpy(dtype=np.float64)
+
+    if sp.issparse(X):
+        return sp.csr_matrix(X, dtype=np.float64)
+
+    return np.asarray(X, dtype=np.float64)
+
+
+def _row_chunks(X, chunk_size):
+    for start in range(0, X.shape[0], chunk_size):
+        yield start, X[start:start + chunk_size]
+
+
+def _dense(block):
+    return block.toarray() if sp.issparse(block) else block
+
+
+def _correlation(sum_zr, sum_z, sum_z2, n, r_mean, r_ss):
+    # corr(z, r) from running sums, z being the (never built) interaction column
+    cov = sum_zr - sum_z * r_mean
+    z_ss = sum_z2 - sum_z ** 2 / n
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corr = cov / np.sqrt(z_ss * r_ss)
+
+    # constant interaction columns (all zero etc) get no score
+    return np.where(z_ss > 1e-12, np.abs(corr), 0.0)
+
+
+def pairwise_interaction_scores(X, residuals, chunk_size=2048):
+    """
+    |corr(x_i * x_j, residuals)| for every pair of columns in one streaming pass.
+
+    Only p x p accumulators are kept, so memory does not depend on the number of rows
+    and the n x p(p-1)/2 interaction matrix is never built.
+
+    Args:
+        X: Encoded feature matrix (DataFrame, array or sparse).
+        residuals: What is left to explain, y - y.mean() or the residuals of a main effects model.
+        chunk_size: Rows per chunk.
+
+    Returns:
+        A (p, p) symmetric array of absolute correlations, zero on the diagonal.
+    """
+    X = _as_float_matrix(X)
+    r = np.asarray(residuals, dtype=np.float64).ravel()
+    n, p = X.shape
+
+    sum_zr = np.zeros((p, p))
+    sum_z = np.zeros((p, p))
+    sum_z2 = np.zeros((p, p))
+
+    for start, block in _row_chunks(X, chunk_size):
+        block = _dense(block)
+        r_block = r[start:start + block.shape[0]]
+        squared = block ** 2
+
+        sum_zr += block.T @ (block * r_block[:, None])
+        sum_z += block.T @ block
+        sum_z2 += squared.T @ squared
+
+    r_mean = r.mean()
+    r_ss = ((r - r_mean) ** 2).sum()
+
+    scores = _correlation(sum_zr, sum_z, sum_z2, n, r_mean, r_ss)
+    np.fill_diagonal(scores, 0.0)
+
+    return scores
+
+
+def extended_interaction_scores(X, residuals, seeds, chunk_size=2048):
+    """
+    |corr(z_s * x_k, residuals)| for every seed term z_s and every column k.
+
+    Used for degree 3 screening, each seed is a pair whose product is extended with one more column.
+
+    Args:
+        X: Encoded feature matrix.
+        residuals: Same residuals used for the pair scores.
+        seeds: (s, d) array of column indices, the product of each row is one seed term.
+        chunk_size: Rows per chunk.
+
+    Returns:
+        A (s, p) array of absolute correlations.
+    """
+    X = _as_float_matrix(X)
+    r = np.asarray(residuals, dtype=np.float64).ravel()
+    seeds = np.asarray(seeds, dtype=np.intp)
+    n, p = X.shape
+
+    sum_zr = np.zeros((len(seeds), p))
+    sum_z = np.zeros((len(seeds), p))
+    sum_z2 = np.zeros((len(seeds), p))
+
+    for start, block in _row_chunks(X, chunk_size):
+        block = _dense(block)
+        r_block = r[start:start + block.shape[0]]
+
+        # seed products for this chunk only, (rows, s)
+        seed_block = np.prod(block[:, seeds], axis=2)
+
+        sum_zr += (seed_block * r_block[:, None]).T @ block
+        sum_z += seed_block.T @ block
+        sum_z2 += (seed_block ** 2).T @ (block ** 2)
+
+    r_mean = r.mean()
+    r_ss = ((r - r_mean) ** 2).sum()
+
+    return _correlation(sum_zr, sum_z, sum_z2, n, r_mean, r_ss)
+
+
+def _top_k(scores, k):
+    # argpartition then sort just the winners, no full sort of every candidate
+    k = min(k, scores.size)
+    if k <= 0:
+        return np.array([], dtype=np.intp)
+
+    top = np.argpartition(-scores, k - 1)[:k]
+
+    return top[np.argsort(-scores[top], kind='stable')]
+
+
+def screen_interactions(X, y, degree=2, top_k=500, residuals=None, feature_groups=None,
+                        n_seeds=None, chunk_size=2048):
+    """
+    Picks the top_k interaction terms without building any of them.
+
+    Args:
+        X: Encoded feature matrix.
+        y: Outcome, only used when residuals is None.
+        degree: 2 for pairs, 3 to also screen triples grown from the best pairs.
+        top_k: Number of terms to keep across all degrees.
+        residuals: Residuals to screen against, defaults to y - y.mean().
+        feature_groups: Source column of every feature, terms with two columns from
+            the same group are structurally zero and are never scored.
+        n_seeds: How many of the best pairs are extended to triples, defaults to top_k.
+        chunk_size: Rows per chunk.
+
+    Returns:
+        DataFrame with columns term (tuple of column indices), degree and score, best first.
+    """
+    if degree not in (2, 3):
+        raise ValueError(f"degree must be 2 or 3, got {degree}")
+
+    if residuals is None:
+        y = np.asarray(y, dtype=np.float64).ravel()
+        residuals = y - y.mean()
+
+    p = X.shape[1]
+    if feature_groups is None:
+        group_codes = np.arange(p)
+    else:
+        _, group_codes = np.unique(np.asarray(feature_groups, dtype=str), return_inverse=True)
+
+    pair_scores = pairwise_interaction_scores(X, residuals, chunk_size=chunk_size)
+
+    left, right = np.triu_indices(p, k=1)
+    keep = group_codes[left] != group_codes[right]
+    left, right = left[keep], right[keep]
+    flat_scores = pair_scores[left, right]
+
+    best_pairs = _top_k(flat_scores, top_k)
+    terms = [(int(left[i]), int(right[i])) for i in best_pairs]
+    scores = [float(flat_scores[i]) for i in best_pairs]
+
+    if degree == 3 and terms:
+        seeds = np.asarray(terms[:n_seeds or top_k], dtype=np.intp)
+        ext_scores = extended_interaction_scores(X, residuals, seeds, chunk_size=chunk_size)
+
+        # the third column can't repeat a column or a group already in the seed
+        seed_groups = group_codes[seeds]
+        invalid = (group_codes[None, :] == seed_groups[:, [0]]) | (group_codes[None, :] == seed_groups[:, [1]])
+        ext_scores[invalid] = 0.0
+
+        # only the best extensions can make the cut, a triple can show up from up to 3 seeds
+        best = _top_k(ext_scores.ravel(), 3 * top_k)
+        best = best[ext_scores.ravel()[best] > 0]
+        seed_idx, cols = np.unravel_index(best, ext_scores.shape)
+
+        # (a, b) + c and (a, c) + b are the same triple, keep each once
+        triples = {}
+        for s, k in zip(seed_idx, cols):
+            triple = tuple(sorted((int(seeds[s, 0]), int(seeds[s, 1]), int(k))))
+            triples[triple] = max(triples.get(triple, 0.0), float(ext_scores[s, k]))
+
+        terms += list(triples.keys())
+        scores += list(triples.values())
+
+        order = _top_k(np.asarray(scores), top_k)
+        terms = [terms[i] for i in order]
+        scores = [scores[i] for i in order]
+
+    return pd.DataFrame({
+        'term': terms,
+        'degree': [len(term) for term in terms],
+        'score': scores
+    })
+
+
+class ScreenedInteractionFeatures(TransformerMixin, BaseEstimator):
+    """
+    Keeps only the top_k screened interaction terms, as a CSR sparse matrix.
+
+    fit runs screen_interactions, transform multiplies out just the selected terms.
+    Output is the original columns (if include_base) followed by the terms, best score first.
+
+    Args:
+        degree: 2 or 3, see screen_interactions.
+        top_k: Number of interaction terms to keep.
+        feature_groups: Source column for every input column, same as SparseInteractionFeatures.
+        categorical_columns: Infer feature_groups from the dummy column names instead.
+        n_seeds: Pairs extended to triples when degree=3.
+        include_base: Keep the original columns in front of the interactions.
+        delimiter: Separator used when naming interaction columns.
+        chunk_size: Rows per chunk while screening.
+    """
+
+    def __init__(self, degree=2, top_k=500, feature_groups=None, categorical_columns=None,
+                 n_seeds=None, include_base=True, delimiter='|', chunk_size=2048):
+        self.degree = degree
+        self.top_k = top_k
+        self.feature_groups = feature_groups
+        self.categorical_columns = categorical_columns
+        self.n_seeds = n_seeds
+        self.include_base = include_base
+        self.delimiter = delimiter
+        self.chunk_size = chunk_size
+
+    def fit(self, X, y, residuals=None):
+        if isinstance(X, pd.DataFrame):
+            self.feature_names_in_ = np.asarray(X.columns, dtype=object)
+        elif hasattr(self, 'feature_names_in_'):
+            del self.feature_names_in_
+
+        self.n_features_in_ = X.shape[1]
+
+        groups = self.feature_groups
+        if groups is None and self.categorical_columns is not None:
+            groups = infer_feature_groups(self._input_names(), self.categorical_columns)
+
+        self.screening_results_ = screen_interactions(
+            X, y,
+            degree=self.degree,
+            top_k=self.top_k,
+            residuals=residuals,
+            feature_groups=groups,
+            n_seeds=self.n_seeds,
+            chunk_size=self.chunk_size
+        )
+        self.terms_ = list(self.screening_results_['term'])
+        self._feature_names = None
+
+        return self
+
+    def transform(self, X):
+        if not hasattr(self, 'terms_'):
+            raise ValueError("ScreenedInteractionFeatures is not fitted yet, call fit first")
+
+        X = _to_csc(X)
+        if X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has {X.shape[1]} columns, expected {self.n_features_in_}")
+
+        columns = []
+        for term in self.terms_:
+            column = X[:, term[0]]
+            for idx in term[1:]:
+                column = column.multiply(X[:, idx])
+            columns.append(sp.csc_matrix(column))
+
+        blocks = ([X] if self.include_base else []) + columns
+        if not blocks:
+            return sp.csr_matrix((X.shape[0], 0), dtype=np.float64)
+
+        out = sp.hstack(blocks, format='csr')
+        out.eliminate_zeros()
+
+        return out
+
+    def get_feature_names_out(self, input_features=None):
+        if input_features is None:
+            if self._feature_names is None:
+                self._feature_names = self._build_names(self._input_names())
+            return self._feature_names
+
+        return self._build_names(np.asarray(input_features, dtype=object))
+
+    def _input_names(self):
+        if hasattr(self, 'feature_names_in_'):
+            return self.feature_names_in_
+
+        return np.asarray([f"x{i}" for i in range(self.n_features_in_)], dtype=object)
+
+    def _build_names(self, input_features):
+        input_features = [str(name) for name in input_features]
+        term_names = [self.delimiter.join(input_features[idx] for idx in term) for term in self.terms_]
+
+        if self.include_base:
+            return np.asarray(input_features + term_names, dtype=object)
+
+        return np.asarray(term_names, dtype=object)
@@ -0,0 +1,318 @@
+"""
+One hyperparameter search for the whole HCT model zoo.
+
+Inital Analysis.py and the ALL ALGORTIHMS notebooks run a GridSearchCV per
+estimator, each re-splitting the data and re-running the preprocessing, then refit
+the best model by hand. ModelSearch splits the data once, builds the fold matrices
+once, runs every (estimator, params, fold) cell of every estimator through one
+shared process pool, and caches each cell's score on disk, so adding a value to a
+grid only computes the new cells. Optional successive halving scores every
+candidate on a few folds first and only keeps the best ones for the rest.
+"""
+import copy
+import hashlib
+import json
+import math
+import os
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed, hash as joblib_hash
+from sklearn.base import clone, is_classifier
+from sklearn.metrics import check_scoring
+from sklearn.model_selection import KFold, ParameterGrid, StratifiedKFold
+
+
+def _take_rows(X, idx):
+    if isinstance(X, (pd.DataFrame, pd.Series)):
+        return X.iloc[idx]
+
+    return X[idx]
+
+
+def _to_array(X):
+    """
+    A numeric DataFrame as a plain C ordered array plus its column names, (X, None) for anything else.
+
+    Frames are sent to joblib's workers in this form: pandas keeps a transposed block, and for a
+    frame over a memory map the workers rebuild that block in the wrong order.
+    """
+    if isinstance(X, pd.DataFrame) and all(pd.api.types.is_numeric_dtype(dtype) for dtype in X.dtypes):
+        return np.ascontiguousarray(X.to_numpy()), list(X.columns)
+
+    return X, None
+
+
+def _to_frame(values, columns):
+    # the other half of _to_array, run in the worker so the model still sees the feature names
+    return values if columns is None else pd.DataFrame(values, columns=columns, copy=False)
+
+
+def _fit_and_score(estimator, params, X_train, y_train, X_val, y_val, scoring):
+    # runs in the worker processes, so keep it a plain module level function
+    model = clone(estimator).set_params(**params)
+
+    start = time.perf_counter()
+    try:
+        model.fit(X_train, y_train)
+        fit_time = time.perf_counter() - start
+        score = check_scoring(model, scoring=scoring)(model, X_val, y_val)
+    except Exception as exc:  # same idea as GridSearchCV(error_score=np.nan)
+        warnings.warn(f"{type(estimator).__name__} failed with {params}: {exc}")
+        return np.nan, time.perf_counter() - start
+
+    return float(score), fit_time
+
+
+def _fit_final(estimator, params, X, y, columns=None):
+    return clone(estimator).set_params(**params).fit(_to_frame(X, columns), y)
+
+
+class ModelSearch:
+    """
+    Cached, parallel grid search over several estimators at once.
+
+    Args:
+        estimators: {name: (estimator, param_grid)}, e.g. {'lightgbm': (lgb.LGBMRegressor(), lgb_param_grid)}.
+        scoring: Anything sklearn's check_scoring takes, higher is better.
+        cv: Number of folds.
+        n_jobs: Worker processes shared by every estimator, -3 is all cores but 2 like the grid searches.
+        cache_dir: Folder for the per cell scores, None turns caching off.
+        halving: Use successive halving over folds instead of scoring every candidate on every fold.
+        eta: Halving rate, only the best 1/eta candidates of each estimator move on to the next round.
+        min_folds: Folds used in the first halving round.
+        preprocessor: Optional unfitted preprocessor (e.g. HCTPreprocessor). When given, X is the raw
+            data and a copy is fit on every training fold, so nothing leaks from the validation fold.
+        random_state: Seed for the fold split.
+        verbose: Print progress.
+    """
+
+    def __init__(self, estimators, scoring='neg_mean_squared_error', cv=5, n_jobs=-3, cache_dir='search_cache',
+                 halving=False, eta=3, min_folds=1, preprocessor=None, random_state=0, verbose=1):
+        self.estimators = estimators
+        self.scoring = scoring
+        self.cv = cv
+        self.n_jobs = n_jobs
+        self.cache_dir = cache_dir
+        self.halving = halving
+        self.eta = eta
+        self.min_folds = min_folds
+        self.preprocessor = preprocessor
+        self.random_state = random_state
+        self.verbose = verbose
+
+    def make_folds(self, X, y):
+        """
+        Splits once and builds every fold's train and validation matrices up front.
+        """
+        classification = any(is_classifier(est) for est, _ in self.estimators.values())
+        splitter_cls = StratifiedKFold if classification else KFold
+        splitter = splitter_cls(n_splits=self.cv, shuffle=True, random_state=self.random_state)
+
+        y = np.asarray(y)
+        folds = []
+        for train_idx, val_idx in splitter.split(X, y):
+            X_train, X_val = _take_rows(X, train_idx), _take_rows(X, val_idx)
+
+            if self.preprocessor is not None:
+                preprocessor = copy.deepcopy(self.preprocessor)
+                X_train = preprocessor.fit_transform(X_train)
+                X_val = preprocessor.transform(X_val)
+
+            folds.append((X_train, y[train_idx], X_val, y[val_idx]))
+
+        return folds
+
+    def fit(self, X, y):
+        """
+        Scores every candidate of every estimator, reusing any cached cells.
+
+        Sets results_ (one row per cell), summary_ (one row per candidate) and
+        best_params_ / best_scores_ per estimator.
+        """
+        self.folds_ = self.make_folds(X, y)
+        self._data_key = joblib_hash((self.folds_, self.scoring))
+
+        candidates = {name: list(ParameterGrid(grid)) for name, (_, grid) in self.estimators.items()}
+        alive = {name: list(range(len(params))) for name, params in candidates.items()}
+
+        if self.halving:
+            n_folds = max(1, min(self.min_folds, self.cv))
+        else:
+            n_folds = self.cv
+
+        scores = {}
+        while True:
+            cells = [(name, cand, fold) for name, cands in alive.items() for cand in cands for fold in range(n_folds)]
+            self._run_cells(cells, candidates, scores)
+
+            if n_folds >= self.cv:
+                break
+
+            # keep the best 1/eta of each estimator's candidates and give them more folds
+            for name, cands in alive.items():
+                means = [pd.Series([scores[(name, cand, fold)][0] for fold in range(n_folds)]).mean() for cand in cands]
+                order = np.argsort(-np.nan_to_num(means, nan=-np.inf), kind='stable')
+                keep = max(1, math.ceil(len(cands) / self.eta))
+                alive[name] = sorted(cands[i] for i in order[:keep])
+
+            n_folds = min(self.cv, n_folds * self.eta)
+
+        self._collect(candidates, scores)
+
+        return self
+
+    def cv_results(self, name):
+        """
+        The summary for one estimator laid out like GridSearchCV.cv_results_, so the
+        existing plotting code can read param_<name> and mean_test_score columns.
+        """
+        summary = self.summary_[self.summary_['estimator'] == name]
+        params = pd.DataFrame(list(summary['params']), index=summary.index).add_prefix('param_')
+
+        return pd.concat([params, summary.drop(columns=['estimator'])], axis=1).reset_index(drop=True)
+
+    def refit(self, X, y, names=None):
+        """
+        Fits the best candidate of each estimator on all of X, in parallel.
+
+        Returns:
+            {name: fitted estimator}, also kept as best_estimators_.
+        """
+        names = list(self.estimators) if names is None else list(names)
+        X_fit = copy.deepcopy(self.preprocessor).fit_transform(X) if self.preprocessor is not None else X
+
+        if len(names) == 1:
+            fitted = [_fit_final(self.estimators[names[0]][0], self.best_params_[names[0]], X_fit, y)]
+        else:
+            values, columns = _to_array(X_fit)
+            fitted = Parallel(n_jobs=self.n_jobs)(
+                delayed(_fit_final)(self.estimators[name][0], self.best_params_[name], values, y, columns)
+                for name in names
+            )
+        self.best_estimators_ = dict(zip(names, fitted))
+
+        return self.best_estimators_
+
+    def _run_cells(self, cells, candidates, scores):
+        todo = []
+        for cell in cells:
+            if cell in scores:
+                continue
+
+            cached = self._read_cache(cell, candidates)
+            if cached is not None:
+                scores[cell] = cached
+            else:
+                todo.append(cell)
+
+        if self.verbose:
+            print(f"{len(cells)} cells, {len(cells) - len(todo)} already scored, fitting {len(todo)}")
+
+        if not todo:
+            return
+
+        for cell, result in zip(todo, self._score_cells(todo, candidates)):
+            scores[cell] = result
+            self._write_cache(cell, candidates, result)
+
+    def _score_cells(self, cells, candidates):
+        # every estimator's cells go through the same pool, so small models fill the gaps left by big ones
+        return Parallel(n_jobs=self.n_jobs, verbose=0)(
+            delayed(_fit_and_score)(
+                self.estimators[name][0],
+                candidates[name][cand],
+                *self.folds_[fold],
+                self.scoring
+            )
+            for name, cand, fold in cells
+        )
+
+    def _collect(self, candidates, scores):
+        rows = []
+        for (name, cand, fold), (score, fit_time) in scores.items():
+            rows.append({
+                'estimator': name,
+                'candidate': cand,
+                'params': candidates[name][cand],
+                'fold': fold,
+                'score': score,
+                'fit_time': fit_time
+            })
+        self.results_ = pd.DataFrame(rows).sort_values(['estimator', 'candidate', 'fold']).reset_index(drop=True)
+
+        summary = self.results_.groupby(['estimator', 'candidate'], sort=True).agg(
+            mean_test_score=('score', 'mean'),
+            std_test_score=('score', 'std'),
+            mean_fit_time=('fit_time', 'mean'),
+            n_folds=('fold', 'count')
+        ).reset_index()
+        summary['params'] = [candidates[name][cand] for name, cand in zip(summary['estimator'], summary['candidate'])]
+
+        # halving can leave candidates with fewer folds, only fully scored ones can be ranked best
+        full = summary['n_folds'] == self.cv
+        summary['rank_test_score'] = (
+            summary['mean_test_score'].where(full).groupby(summary['estimator']).rank(ascending=False, method='min')
+        )
+        self.summary_ = summary
+
+        self.best_params_, self.best_scores_ = {}, {}
+        for name, group in summary[full].groupby('estimator'):
+            best = group.loc[group['mean_test_score'].idxmax()] if group['mean_test_score'].notna().any() else group.iloc[0]
+            self.best_params_[name] = best['params']
+            self.best_scores_[name] = best['mean_test_score']
+
+    def _cache_key(self, cell, candidates):
+        # everything a cell's score depends on, subclasses add their own settings
+        name, cand, fold = cell
+        estimator = self.estimators[name][0]
+
+        return {
+            'estimator': f"{type(estimator).__module__}.{type(estimator).__qualname__}",
+            'base_params': estimator.get_params(deep=False),
+            'params': candidates[name][cand],
+            'fold': fold,
+            'data': self._data_key
+        }
+
+    def _cache_path(self, cell, candidates):
+        name = cell[0]
+        key = json.dumps(self._cache_key(cell, candidates), sort_keys=True, default=repr)
+        digest = hashlib.sha1(key.encode()).hexdigest()
+
+        return os.path.join(self.cache_dir, name, f"{digest}.json")
+
+    def _read_cache(self, cell, candidates):
+        if self.cache_dir is None:
+            return None
+
+        path = self._cache_path(cell, candidates)
+        if not os.path.exists(path):
+            return None
+
+        with open(path) as f:
+            cached = json.load(f)
+
+        score = np.nan if cached['score'] is None else cached['score']
+
+        return score, cached['fit_time']
+
+    def _write_cache(self, cell, candidates, result):
+        if self.cache_dir is None:
+            return
+
+        path = self._cache_path(cell, candidates)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # write then rename so a killed run never leaves half a file behind
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'params': candidates[cell[0]][cell[1]],
+                'fold': cell[2],
+                'score': None if np.isnan(result[0]) else result[0],
+                'fit_time': result[1]
+            }, f, default=repr)
+        os.replace(tmp_path, path)
@@ -0,0 +1,322 @@
+"""
+Stacking the HCT models on out-of-fold predictions.
+
+The notebooks list a stacking model as a next step, but every estimator is refit on
+the whole training set after its grid search and nothing it predicted during
+cross-validation is kept. StackingEnsemble fits each base model on every fold,
+writes its out-of-fold (OOF) predictions into one memory mapped matrix shared by the
+worker processes, trains a meta-learner on those columns and keeps the full data
+refits. Columns and refits are stored under a fingerprint of the model, its
+settings and the data/folds, so changing one base model only fits that one again.
+Columns of models that are no longer used stay in the store until prune_store()
+drops them.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import uuid
+
+import joblib
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed, hash as joblib_hash
+from sklearn.base import clone, is_classifier
+from sklearn.linear_model import LogisticRegression, Ridge
+from sklearn.model_selection import KFold, StratifiedKFold
+
+from .search import _take_rows, _to_array, _to_frame
+
+OOF_FILE = 'oof.npy'
+INDEX_FILE = 'index.json'
+
+
+def _base_predictions(model, X):
+    # probability of the positive class for classifiers, plain predictions otherwise
+    if is_classifier(model) and hasattr(model, 'predict_proba'):
+        return model.predict_proba(X)[:, 1]
+    if is_classifier(model) and hasattr(model, 'decision_function'):
+        return model.decision_function(X)
+
+    return model.predict(X)
+
+
+class OOFStore:
+    """
+    Out-of-fold prediction columns for one dataset, in a single .npy memory map.
+
+    index.json maps each model fingerprint to its column. Workers open the matrix
+    themselves and write their fold's rows straight into it, only the parent process
+    touches the index, and a column only counts as done once every fold has written it.
+
+    Args:
+        store_dir: Folder for the matrix, the index and the cached refits.
+        n_rows: Rows of the training data, a store is tied to one dataset.
+    """
+
+    def __init__(self, store_dir, n_rows):
+        self.store_dir = store_dir
+        self.n_rows = n_rows
+        self.path = os.path.join(store_dir, OOF_FILE)
+        os.makedirs(os.path.join(store_dir, 'models'), exist_ok=True)
+
+        index_path = os.path.join(store_dir, INDEX_FILE)
+        if os.path.exists(index_path):
+            with open(index_path) as f:
+                self.index = json.load(f)
+            if self.index['n_rows'] != n_rows:
+                raise ValueError(f"{store_dir} holds predictions for {self.index['n_rows']} rows, not {n_rows}")
+        else:
+            self.index = {'n_rows': n_rows, 'capacity': 0, 'columns': {}}
+            self._resize(8)
+
+    def _save_index(self):
+        index_path = os.path.join(self.store_dir, INDEX_FILE)
+        tmp_path = f"{index_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.index, f)
+        os.replace(tmp_path, index_path)
+
+    def _resize(self, capacity):
+        # grows by doubling, so the copy happens rarely
+        tmp_path = f"{self.path}.{uuid.uuid4().hex}.tmp"
+        matrix = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float64, shape=(self.n_rows, capacity))
+        matrix[:] = np.nan
+        if self.index['capacity']:
+            matrix[:, :self.index['capacity']] = np.load(self.path, mmap_mode='r')
+        matrix.flush()
+        del matrix
+
+        os.replace(tmp_path, self.path)
+        self.index['capacity'] = capacity
+        self._save_index()
+
+    def is_complete(self, fingerprint):
+        entry = self.index['columns'].get(fingerprint)
+        return entry is not None and entry['complete']
+
+    def column_for(self, fingerprint, name):
+        """
+        The column a fingerprint writes to, allocated (and the matrix grown) if it is new.
+        """
+        if fingerprint not in self.index['columns']:
+            used = len(self.index['columns'])
+            if used >= self.index['capacity']:
+                self._resize(self.index['capacity'] * 2)
+            self.index['columns'][fingerprint] = {'column': used, 'name': name, 'complete': False}
+            self._save_index()
+
+        return self.index['columns'][fingerprint]['column']
+
+    def mark_complete(self, fingerprint):
+        self.index['columns'][fingerprint]['complete'] = True
+        self._save_index()
+
+    def read(self, fingerprints):
+        """
+        (n_rows, len(fingerprints)) array of the stored columns, in that order.
+        """
+        matrix = np.load(self.path, mmap_mode='r')
+        columns = [self.index['columns'][fingerprint]['column'] for fingerprint in fingerprints]
+
+        return np.asarray(matrix[:, columns])
+
+    def model_path(self, fingerprint):
+        return os.path.join(self.store_dir, 'models', f"{fingerprint}.joblib")
+
+    def prune(self, fingerprints):
+        """
+        Drops every column and cached refit whose fingerprint isn't in fingerprints.
+
+        Returns:
+            Number of columns dropped.
+        """
+        fingerprints = set(fingerprints)
+        keep = [fingerprint for fingerprint in self.index['columns'] if fingerprint in fingerprints]
+        n_dropped = len(self.index['columns']) - len(keep)
+
+        if n_dropped:
+            capacity = max(8, self.index['capacity'])
+            while capacity // 2 >= max(8, len(keep)):
+                capacity //= 2
+
+            old = np.load(self.path, mmap_mode='r')
+            tmp_path = f"{self.path}.{uuid.uuid4().hex}.tmp"
+            matrix = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float64, shape=(self.n_rows, capacity))
+            matrix[:] = np.nan
+            columns = {}
+            for column, fingerprint in enumerate(keep):
+                entry = self.index['columns'][fingerprint]
+                matrix[:, column] = old[:, entry['column']]
+                columns[fingerprint] = dict(entry, column=column)
+            matrix.flush()
+            del matrix, old
+
+            os.replace(tmp_path, self.path)
+            self.index['capacity'] = capacity
+            self.index['columns'] = columns
+            self._save_index()
+
+        for name in os.listdir(os.path.join(self.store_dir, 'models')):
+            if os.path.splitext(name)[0] not in fingerprints:
+                os.remove(os.path.join(self.store_dir, 'models', name))
+
+        return n_dropped
+
+
+def _fit_fold(estimator, X, y, train_idx, val_idx, store_path, column, columns=None):
+    # runs in the worker processes: fit one fold and write its OOF rows into the shared matrix
+    X = _to_frame(X, columns)
+    model = clone(estimator).fit(_take_rows(X, train_idx), y[train_idx])
+    predictions = _base_predictions(model, _take_rows(X, val_idx))
+
+    matrix = np.load(store_path, mmap_mode='r+')
+    matrix[val_idx, column] = predictions
+    matrix.flush()
+
+
+def _fit_full(estimator, X, y, path, columns=None):
+    model = clone(estimator).fit(_to_frame(X, columns), y)
+    joblib.dump(model, path)
+
+    return model
+
+
+class StackingEnsemble:
+    """
+    Base models stacked by a meta-learner trained on their out-of-fold predictions.
+
+    Args:
+        base_models: {name: estimator}, e.g. the tuned models from ModelSearch.best_estimators_.
+        meta_learner: Model fit on the OOF columns, defaults to LogisticRegression for a 0/1 y, Ridge otherwise.
+        cv: Folds for the OOF predictions.
+        store_dir: OOF store folder, reused between runs. None keeps nothing and refits everything, in a
+            temporary folder removed at the end of fit.
+        n_jobs: Worker processes shared by every (model, fold).
+        passthrough: Give the meta-learner the original features as well as the OOF columns.
+        random_state: Seed for the fold split.
+        verbose: Print which models had to be fit.
+    """
+
+    def __init__(self, base_models, meta_learner=None, cv=5, store_dir='oof_store', n_jobs=-3, passthrough=False,
+                 random_state=0, verbose=1):
+        self.base_models = base_models
+        self.meta_learner = meta_learner
+        self.cv = cv
+        self.store_dir = store_dir
+        self.n_jobs = n_jobs
+        self.passthrough = passthrough
+        self.random_state = random_state
+        self.verbose = verbose
+
+    def _fingerprint(self, estimator, data_key):
+        key = json.dumps({
+            'estimator': f"{type(estimator).__module__}.{type(estimator).__qualname__}",
+            'params': estimator.get_params(deep=False),
+            'data': data_key,
+            # version 2: X reaches the workers as a plain array, older columns may come from scrambled frames
+            'version': 2
+        }, sort_keys=True, default=repr)
+
+        return hashlib.sha1(key.encode()).hexdigest()
+
+    def fit(self, X, y):
+        """
+        Fills in any missing OOF columns and refits, then trains the meta-learner.
+
+        Sets oof_ (DataFrame, one column per base model), base_estimators_ (full data refits),
+        meta_learner_, fitted_models_ (the names that actually had to be fit this time) and
+        fingerprints_ (each base model's key in the store).
+        """
+        y = np.asarray(y)
+        binary = np.isin(y, (0, 1)).all()
+
+        splitter_cls = StratifiedKFold if binary else KFold
+        folds = list(splitter_cls(n_splits=self.cv, shuffle=True, random_state=self.random_state).split(X, y))
+        data_key = joblib_hash((X, y, [val_idx for _, val_idx in folds]))
+
+        self.fingerprints_ = {name: self._fingerprint(est, data_key) for name, est in self.base_models.items()}
+        if self.store_dir is None:
+            with tempfile.TemporaryDirectory(prefix='oof_store_') as store_dir:
+                self._fill_store(OOFStore(store_dir, len(y)), X, y, folds)
+        else:
+            self._fill_store(OOFStore(self.store_dir, len(y)), X, y, folds)
+
+        if self.meta_learner is not None:
+            meta_learner = clone(self.meta_learner)
+        else:
+            meta_learner = LogisticRegression(max_iter=1000) if binary else Ridge()
+        self.meta_learner_ = meta_learner.fit(self._meta_features(self.oof_.to_numpy(), X), y)
+
+        return self
+
+    def _fill_store(self, store, X, y, folds):
+        # fits what the store is missing, then reads oof_ and base_estimators_ into memory
+        fingerprints = self.fingerprints_
+        todo = [name for name, fingerprint in fingerprints.items() if not store.is_complete(fingerprint)]
+        refit = [name for name, fingerprint in fingerprints.items() if not os.path.exists(store.model_path(fingerprint))]
+
+        if self.verbose:
+            print(f"{len(self.base_models)} base models, {len(todo)} need OOF predictions, {len(refit)} need a refit")
+
+        columns = {name: store.column_for(fingerprints[name], name) for name in todo}
+        values, feature_names = _to_array(X)
+        jobs = [
+            delayed(_fit_fold)(self.base_models[name], values, y, train_idx, val_idx, store.path, columns[name],
+                               feature_names)
+            for name in todo for train_idx, val_idx in folds
+        ]
+        jobs += [delayed(_fit_full)(self.base_models[name], values, y, store.model_path(fingerprints[name]),
+                                    feature_names)
+                 for name in refit]
+        if jobs:
+            Parallel(n_jobs=self.n_jobs)(jobs)
+
+        for name in todo:
+            store.mark_complete(fingerprints[name])
+
+        names = list(self.base_models)
+        self.oof_ = pd.DataFrame(store.read([fingerprints[name] for name in names]), columns=names)
+        self.base_estimators_ = {name: joblib.load(store.model_path(fingerprints[name])) for name in names}
+        self.fitted_models_ = sorted(set(todo) | set(refit))
+
+    def prune_store(self):
+        """
+        Drops the store's columns and refits of every model other than the ones of the last fit,
+        the store otherwise keeps them all in case an older setting comes back.
+
+        Returns:
+            Number of columns dropped.
+        """
+        if self.store_dir is None:
+            return 0
+
+        return OOFStore(self.store_dir, len(self.oof_)).prune(self.fingerprints_.values())
+
+    def _meta_features(self, base_predictions, X):
+        if not self.passthrough:
+            return base_predictions
+
+        X = X.to_numpy(dtype=np.float64) if isinstance(X, pd.DataFrame) else np.asarray(X, dtype=np.float64)
+
+        return np.hstack([base_predictions, X])
+
+    def base_predictions(self, X):
+        """
+        Every base model's predictions on new rows, laid out like oof_.
+        """
+        return pd.DataFrame({name: _base_predictions(model, X) for name, model in self.base_estimators_.items()})
+
+    def predict(self, X):
+        return self.meta_learner_.predict(self._meta_features(self.base_predictions(X).to_numpy(), X))
+
+    def predict_proba(self, X):
+        return self.meta_learner_.predict_proba(self._meta_features(self.base_predictions(X).to_numpy(), X))
+
+    def meta_weights(self):
+        """
+        The meta-learner's coefficient on each base model, when it has coefficients.
+        """
+        coef = np.ravel(getattr(self.meta_learner_, 'coef_', np.full(len(self.oof_.columns), np.nan)))
+
+        return pd.Series(coef[:len(self.oof_.columns)], index=self.oof_.columns, name='weight')
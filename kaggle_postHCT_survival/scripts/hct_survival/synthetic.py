@@ -0,0 +1,100 @@
+"""
+Synthetic HCT data with the same layout as the competition's train.csv/test.csv.
+
+Used by the benchmarks, and handy for trying code without the Kaggle files. It has
+the ID, efs and efs_time columns, HLA match counts and other numeric columns with
+missing values, and string categoricals (race_group, tbi_status, cmv_status, ...)
+with missing values and a few levels each. efs_time and efs depend on a couple of
+the columns, so the C-index of a fitted model isn't just noise.
+"""
+import numpy as np
+import pandas as pd
+
+CATEGORICAL_LEVELS = {
+    'dri_score': ['Low', 'Intermediate', 'High', 'Very high', 'N/A - non-malignant indication'],
+    'psych_disturb': ['No', 'Yes', 'Not done'],
+    'cyto_score': ['Favorable', 'Intermediate', 'Poor', 'Other', 'TBD'],
+    'diabetes': ['No', 'Yes', 'Not done'],
+    'tbi_status': ['No TBI', 'TBI +- Other, >cGy', 'TBI +- Other, <=cGy', 'TBI + Cy +- Other'],
+    'arrhythmia': ['No', 'Yes', 'Not done'],
+    'graft_type': ['Bone marrow', 'Peripheral blood'],
+    'vent_hist': ['No', 'Yes'],
+    'renal_issue': ['No', 'Yes', 'Not done'],
+    'pulm_severe': ['No', 'Yes', 'Not done'],
+    'prim_disease_hct': ['AML', 'ALL', 'MDS', 'IPA', 'MPN', 'NHL', 'IEA', 'HIS', 'SAA', 'Other leukemia'],
+    'cmv_status': ['+/+', '-/+', '+/-', '-/-'],
+    'tce_imm_match': ['P/P', 'G/G', 'H/H', 'G/B', 'H/B', 'P/H'],
+    'rituximab': ['No', 'Yes'],
+    'prod_type': ['BM', 'PB'],
+    'conditioning_intensity': ['MAC', 'RIC', 'NMA', 'TBD', 'No drugs reported'],
+    'ethnicity': ['Not Hispanic or Latino', 'Hispanic or Latino', 'Non-resident of the U.S.'],
+    'mrd_hct': ['Negative', 'Positive'],
+    'race_group': ['White', 'Asian', 'Black or African-American', 'More than one race',
+                   'American Indian or Alaska Native', 'Native Hawaiian or other Pacific Islander'],
+    'sex_match': ['M-M', 'M-F', 'F-M', 'F-F'],
+    'donor_related': ['Related', 'Unrelated', 'Multiple donor (non-UCB)'],
+    'melphalan_dose': ['N/A, Mel not given', 'MEL'],
+    'gvhd_proph': ['FK+ MMF +- others', 'Cyclophosphamide alone', 'FK+ MTX +- others(not MMF)', 'Other GVHD Prophylaxis'],
+    'in_vivo_tcd': ['No', 'Yes']
+}
+
+HLA_COLUMNS = ('hla_match_c_high', 'hla_high_res_8', 'hla_low_res_6', 'hla_high_res_6', 'hla_high_res_10',
+               'hla_match_dqb1_high', 'hla_nmdp_6', 'hla_match_c_low', 'hla_match_drb1_low', 'hla_match_dqb1_low',
+               'hla_match_a_high', 'hla_match_b_low', 'hla_match_a_low', 'hla_match_b_high', 'hla_low_res_8',
+               'hla_match_drb1_high', 'hla_low_res_10')
+
+
+def make_hct_data(n_rows=28800, n_test=3, missing_rate=0.1, seed=0):
+    """
+    Train and test frames in the train.csv / test.csv layout.
+
+    Args:
+        n_rows: Training rows.
+        n_test: Test rows, the competition's public test.csv has 3.
+        missing_rate: Share of missing values in the columns that have them.
+        seed: Random seed.
+
+    Returns:
+        (train_df, test_df), test_df without efs and efs_time.
+    """
+    rng = np.random.default_rng(seed)
+    n_total = n_rows + n_test
+
+    def with_missing(values, rate):
+        values = pd.Series(values)
+        return values.mask(rng.random(n_total) < rate)
+
+    columns = {'ID': np.arange(n_total)}
+
+    for col, levels in CATEGORICAL_LEVELS.items():
+        # a bit of imbalance like the real levels, the race groups are balanced in the competition data
+        weights = np.ones(len(levels)) if col == 'race_group' else rng.dirichlet(np.full(len(levels), 2.0))
+        columns[col] = with_missing(rng.choice(levels, size=n_total, p=weights / weights.sum()),
+                                    0 if col == 'race_group' else missing_rate)
+
+    for col in HLA_COLUMNS:
+        top = 10 if col.endswith('_10') else 8 if col.endswith('_8') else 6 if col.endswith('_6') else 2
+        columns[col] = with_missing(rng.integers(max(0, top - 3), top + 1, size=n_total).astype(np.float64),
+                                    missing_rate)
+
+    columns['year_hct'] = rng.integers(2008, 2021, size=n_total)
+    columns['donor_age'] = with_missing(rng.normal(38, 12, size=n_total).clip(18, 75).round(3), missing_rate)
+    columns['age_at_hct'] = rng.uniform(0.5, 73, size=n_total).round(3)
+    columns['karnofsky_score'] = with_missing(rng.choice([40., 50., 60., 70., 80., 90., 100.], size=n_total),
+                                              missing_rate / 2)
+    columns['comorbidity_score'] = with_missing(rng.integers(0, 10, size=n_total).astype(np.float64), missing_rate / 2)
+
+    df = pd.DataFrame(columns)
+
+    # survival times from a proportional hazards model on a few columns
+    risk = (0.02 * df['age_at_hct'] + 0.15 * df['comorbidity_score'].fillna(2)
+            - 0.02 * (df['karnofsky_score'].fillna(80) - 80) + 0.5 * (df['dri_score'] == 'High'))
+    event_time = rng.exponential(20 * np.exp(-(risk - risk.mean())))
+    censor_time = rng.uniform(5, 80, size=n_total)
+    df['efs'] = (event_time <= censor_time).astype(np.float64)
+    df['efs_time'] = np.minimum(event_time, censor_time).round(3)
+
+    train_df = df.iloc[:n_rows].reset_index(drop=True)
+    test_df = df.iloc[n_rows:].drop(columns=['efs', 'efs_time']).reset_index(drop=True)
+
+    return train_df, test_df
@@ -0,0 +1,20 @@
+import numpy as np
+import pandas as pd
+
+from hct_survival.column_stats import ColumnStats
+
+
+def test_column_empty_in_the_first_chunk_turns_categorical(tmp_path):
+    path = tmp_path / 'train.csv'
+    pd.DataFrame({'a': np.arange(10, dtype=float), 'c': [np.nan] * 5 + ['x', 'y', 'x', np.nan, 'z']}).to_csv(
+        path, index=False)
+
+    stats = ColumnStats.from_csv(path, chunksize=5, use_cache=False)
+    whole = ColumnStats.from_csv(path, chunksize=100, use_cache=False)
+
+    assert stats.numeric_columns == ['a'] == whole.numeric_columns
+    assert stats.categorical_columns == ['c'] == whole.categorical_columns
+    assert stats.value_counts('c').to_dict() == {'x': 2, 'y': 1, 'z': 1}
+    assert stats.null_rate['c'] == whole.null_rate['c'] == 0.6
+    np.testing.assert_allclose(stats.mean, whole.mean)
+    np.testing.assert_allclose(stats.variance(), whole.variance())
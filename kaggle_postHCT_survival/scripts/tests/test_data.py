@@ -0,0 +1,42 @@
+import numpy as np
+from sklearn.linear_model import Ridge
+
+from hct_survival.data import load_encoded_data
+from hct_survival.search import ModelSearch
+from hct_survival.stacking import StackingEnsemble
+from hct_survival.synthetic import make_hct_data
+
+
+def _is_memory_mapped(array):
+    while array is not None:
+        if isinstance(array, np.memmap):
+            return True
+        array = array.base
+
+    return False
+
+
+def test_cache_hit_is_memory_mapped_and_survives_the_workers(tmp_path):
+    train_df, test_df = make_hct_data(n_rows=3000, n_test=3)
+    train_path, test_path = tmp_path / 'train.csv', tmp_path / 'test.csv'
+    train_df.to_csv(train_path, index=False)
+    test_df.to_csv(test_path, index=False)
+
+    cache_dir = tmp_path / 'cache'
+    built, _, targets = load_encoded_data(train_path, test_path, cache_dir=cache_dir)[:3]
+    cached = load_encoded_data(train_path, test_path, cache_dir=cache_dir)[0]
+    y = targets['efs_time'].to_numpy()
+
+    assert _is_memory_mapped(cached.to_numpy())
+    np.testing.assert_array_equal(cached.to_numpy(), built.to_numpy())
+
+    search = ModelSearch({'ridge': (Ridge(), {'alpha': [1.0]}), 'strong_ridge': (Ridge(), {'alpha': [100.0]})},
+                         cv=2, n_jobs=2, cache_dir=None, verbose=0)
+    search.best_params_ = {'ridge': {'alpha': 1.0}, 'strong_ridge': {'alpha': 100.0}}
+    np.testing.assert_allclose(search.refit(cached, y)['ridge'].coef_, Ridge(alpha=1.0).fit(built, y).coef_)
+
+    stack = StackingEnsemble({'ridge': Ridge(), 'strong_ridge': Ridge(alpha=100.0)}, store_dir=None, n_jobs=2,
+                             verbose=0)
+    expected = StackingEnsemble({'ridge': Ridge(), 'strong_ridge': Ridge(alpha=100.0)}, store_dir=None, n_jobs=1,
+                                verbose=0)
+    np.testing.assert_allclose(stack.fit(cached, y).oof_, expected.fit(built, y).oof_)
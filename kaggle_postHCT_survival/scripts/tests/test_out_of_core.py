@@ -0,0 +1,50 @@
+import numpy as np
+from sklearn.linear_model import SGDClassifier
+
+from hct_survival.interactions import SparseInteractionFeatures
+from hct_survival.out_of_core import OutOfCoreInteractionModel
+
+
+def _data(n_rows=600, n_columns=6, seed=0):
+    rng = np.random.default_rng(seed)
+    X = (rng.random((n_rows, n_columns)) < 0.4).astype(np.float64)
+    y = (X[:, 0] * X[:, 1] + 0.3 * X[:, 2] + rng.normal(0, 0.3, n_rows) > 0.5).astype(int)
+
+    return X, y
+
+
+def test_streamed_batch_matches_in_memory_fit():
+    X, y = _data()
+    expander = SparseInteractionFeatures(min_support=5).fit(X)
+
+    model = OutOfCoreInteractionModel(expander=expander, batch_size=len(X), max_epochs=1, validation_fraction=0,
+                                      scale=False).fit(X, y)
+    reference = SGDClassifier(loss='log_loss', alpha=1e-4, random_state=0).partial_fit(
+        expander.transform(X), y, classes=np.unique(y))
+
+    np.testing.assert_allclose(model.estimator_.coef_, reference.coef_)
+    np.testing.assert_allclose(model.predict_proba(X), reference.predict_proba(expander.transform(X)))
+
+
+def test_stops_once_the_validation_loss_stalls():
+    X, y = _data()
+
+    model = OutOfCoreInteractionModel(batch_size=100, max_epochs=50, tol=10.0, n_iter_no_change=2).fit(X, y)
+
+    assert model.converged_
+    assert model.n_epochs_ == 3
+    assert model.best_loss_ == model.history_[0]['validation_loss']
+
+
+def test_expander_is_fit_on_the_training_rows_only():
+    X, y = _data()
+    model = OutOfCoreInteractionModel(expander=SparseInteractionFeatures(min_support=60), max_epochs=1,
+                                      validation_fraction=0.5, random_state=0).fit(X, y)
+
+    # the same split fit uses, the first half of the seeded permutation is held out
+    train_rows = np.sort(np.random.default_rng(0).permutation(len(X))[len(X) // 2:])
+    on_train = SparseInteractionFeatures(min_support=60).fit(X[train_rows])
+    on_all = SparseInteractionFeatures(min_support=60).fit(X)
+
+    np.testing.assert_array_equal(model.expander_.pairs_, on_train.pairs_)
+    assert len(on_all.pairs_) > len(on_train.pairs_)
@@ -0,0 +1,22 @@
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import Lasso, Ridge
+
+from hct_survival.search import ModelSearch
+
+
+def test_refit_on_memory_mapped_frame_matches_in_process_fit(tmp_path):
+    rng = np.random.default_rng(0)
+    values = rng.normal(size=(3000, 129))
+    y = values[:, 0] - 2 * values[:, 1] + rng.normal(size=3000)
+    np.save(tmp_path / 'x.npy', values)
+    X = pd.DataFrame(np.load(tmp_path / 'x.npy', mmap_mode='r'), columns=[f"f{idx}" for idx in range(129)],
+                     copy=False)
+
+    search = ModelSearch({'ridge': (Ridge(), {'alpha': [1.0]}), 'lasso': (Lasso(), {'alpha': [0.01]})}, cv=2,
+                         n_jobs=2, cache_dir=None, verbose=0)
+    search.best_params_ = {'ridge': {'alpha': 1.0}, 'lasso': {'alpha': 0.01}}
+    fitted = search.refit(X, y)
+
+    np.testing.assert_allclose(fitted['ridge'].coef_, Ridge(alpha=1.0).fit(values, y).coef_)
+    assert list(fitted['ridge'].feature_names_in_) == list(X.columns)
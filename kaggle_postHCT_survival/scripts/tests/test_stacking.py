@@ -0,0 +1,57 @@
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LinearRegression, Ridge
+
+from hct_survival.stacking import StackingEnsemble
+
+
+def test_oof_columns_on_memory_mapped_frame(tmp_path):
+    rng = np.random.default_rng(0)
+    values = rng.normal(size=(3000, 129))
+    y = values[:, 0] + rng.normal(size=3000)
+    np.save(tmp_path / 'x.npy', values)
+    X = pd.DataFrame(np.load(tmp_path / 'x.npy', mmap_mode='r'), columns=[f"f{idx}" for idx in range(129)],
+                     copy=False)
+
+    stack = StackingEnsemble({'linear': LinearRegression(), 'ridge': Ridge()}, store_dir=str(tmp_path / 'store'),
+                             n_jobs=2, verbose=0).fit(X, y)
+
+    assert np.corrcoef(stack.oof_['linear'], y)[0, 1] > 0.5
+    np.testing.assert_allclose(stack.base_estimators_['linear'].coef_, LinearRegression().fit(values, y).coef_)
+
+
+def test_temporary_store_is_removed(tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, 'tempdir', str(tmp_path))
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(200, 3))
+    y = X[:, 0] + rng.normal(size=200)
+
+    stack = StackingEnsemble({'ridge': Ridge()}, store_dir=None, n_jobs=1, verbose=0).fit(X, y)
+
+    assert list(tmp_path.iterdir()) == []
+    assert stack.oof_['ridge'].notna().all()
+    assert stack.predict(X[:5]).shape == (5,)
+
+
+def test_prune_store_keeps_only_the_last_fit(tmp_path):
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(200, 3))
+    y = X[:, 0] + rng.normal(size=200)
+    store_dir = str(tmp_path / 'store')
+
+    StackingEnsemble({'ridge': Ridge(alpha=1.0), 'linear': LinearRegression()}, store_dir=store_dir, n_jobs=1,
+                     verbose=0).fit(X, y)
+    stack = StackingEnsemble({'ridge': Ridge(alpha=10.0), 'linear': LinearRegression()}, store_dir=store_dir,
+                             n_jobs=1, verbose=0).fit(X, y)
+    expected = stack.oof_.copy()
+
+    assert stack.prune_store() == 1
+    assert len(os.listdir(os.path.join(store_dir, 'models'))) == 2
+
+    again = StackingEnsemble({'ridge': Ridge(alpha=10.0), 'linear': LinearRegression()}, store_dir=store_dir,
+                             n_jobs=1, verbose=0).fit(X, y)
+    assert again.fitted_models_ == []
+    pd.testing.assert_frame_equal(again.oof_, expected)
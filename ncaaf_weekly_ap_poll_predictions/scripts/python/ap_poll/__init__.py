@@ -0,0 +1,45 @@
+"""
+Reusable pieces of the AP poll vote predictions, shared by the exploratory scripts.
+
+Names are imported on first use, so loading the package (or running the command
+line, see cli.py) doesn't pull in pandas until something needs it.
+"""
+import importlib
+
+_EXPORTS = {
+    'CategoryEncoder': 'encoding',
+    'PreparedData': 'data',
+    'load_prepared_data': 'data',
+    'prepare_data': 'data',
+    'read_in_data': 'data',
+    'DatasetCache': 'data_cache',
+    'Predictor': 'artifacts',
+    'predict_csv': 'artifacts',
+    'save_bundle': 'artifacts',
+    'StreamingCorrelation': 'eda',
+    'ReservoirSampler': 'eda',
+    'run_eda': 'eda',
+    'PlotQueue': 'plots',
+    'history_spec': 'plots',
+    'sweep_spec': 'plots',
+    'BacktestResult': 'backtest',
+    'run_backtest': 'backtest',
+    'ranking_table': 'report',
+    'write_reports': 'report'
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(f".{_EXPORTS[name]}", __name__), name)
+    globals()[name] = value
+
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,255 @@
+"""
+Versioned model bundles and light weight inference for the AP vote model.
+
+Predicting a new week used to mean re-running training, nothing but the (commented
+out) model was ever saved and the scaler and dummy columns were rebuilt from the
+training CSV. save_bundle writes everything a prediction needs into its own
+numbered folder:
+
+    artifacts/v003/
+        manifest.json   column order, scaler mean/scale, team vocabulary, layer sizes
+        weights.npz     Dense kernels and biases
+        model.keras     the full Keras model, for fine tuning or evaluate()
+
+The network is a plain stack of Dense layers, so Predictor runs it in numpy from
+weights.npz and never imports TensorFlow, seaborn or matplotlib. Nothing is read
+until the first prediction.
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+BUNDLE_FORMAT = 1
+MANIFEST_FILE = 'manifest.json'
+WEIGHTS_FILE = 'weights.npz'
+MODEL_FILE = 'model.keras'
+LATEST_FILE = 'LATEST'
+COLD_START_FILE = 'cold_start.json'
+HEAVY_MODULES = ('tensorflow', 'keras', 'matplotlib', 'seaborn', 'sklearn')
+
+_ACTIVATIONS = {
+    'linear': lambda x: x,
+    'relu': lambda x: np.maximum(x, 0),
+    'sigmoid': lambda x: 1 / (1 + np.exp(-x)),
+    'tanh': np.tanh,
+    'elu': lambda x: np.where(x > 0, x, np.expm1(np.minimum(x, 0))),
+    'selu': lambda x: 1.0507009873554805 * np.where(x > 0, x, 1.6732632423543772 * np.expm1(np.minimum(x, 0))),
+    'exponential': np.exp
+}
+
+
+def _next_version(bundle_root):
+    existing = [int(name[1:]) for name in os.listdir(bundle_root) if name.startswith('v') and name[1:].isdigit()]
+
+    return f"v{max(existing, default=0) + 1:03d}"
+
+
+def save_bundle(model, data, bundle_root='artifacts', notes=None):
+    """
+    Writes the model plus its preprocessing state as the next version under bundle_root.
+
+    Args:
+        model: A trained Sequential of Dense layers, e.g. from build_model.
+        data: The PreparedData the model was trained on, its scaler and encoder are saved.
+        bundle_root: Folder holding every version, LATEST points at the newest.
+        notes: Anything JSON serializable to keep with the bundle (config, test scores, ...).
+
+    Returns:
+        Path to the new version folder.
+    """
+    layer_specs, weights = [], {}
+    for idx, layer in enumerate(model.layers):
+        activation = layer.get_config().get('activation', 'linear')
+        if not hasattr(layer, 'kernel') or activation not in _ACTIVATIONS:
+            raise ValueError(f"Layer {layer.name} can't be run without TensorFlow, only Dense layers with "
+                             f"{sorted(_ACTIVATIONS)} activations are supported")
+
+        kernel, bias = layer.get_weights()
+        weights[f"kernel_{idx}"] = kernel.astype(np.float32)
+        weights[f"bias_{idx}"] = bias.astype(np.float32)
+        layer_specs.append({'units': int(kernel.shape[1]), 'activation': activation})
+
+    os.makedirs(bundle_root, exist_ok=True)
+    version = _next_version(bundle_root)
+    tmp_dir = os.path.join(bundle_root, f".{version}.tmp")
+    os.makedirs(tmp_dir)
+
+    manifest = {
+        'format': BUNDLE_FORMAT,
+        'version': version,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'feature_names': list(data.feature_names),
+        'scaled_columns': list(data.scaled_columns),
+        'scaler_mean': np.asarray(data.scaler_mean).tolist(),
+        'scaler_scale': np.asarray(data.scaler_scale).tolist(),
+        'encoder': data.encoder.to_dict(),
+        'layers': layer_specs,
+        'notes': notes
+    }
+
+    np.savez(os.path.join(tmp_dir, WEIGHTS_FILE), **weights)
+    model.save(os.path.join(tmp_dir, MODEL_FILE))
+    with open(os.path.join(tmp_dir, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f)
+
+    version_dir = os.path.join(bundle_root, version)
+    os.replace(tmp_dir, version_dir)
+    with open(os.path.join(bundle_root, LATEST_FILE), 'w') as f:
+        f.write(version)
+
+    return version_dir
+
+
+def resolve_bundle(path):
+    """
+    A version folder as is, or the LATEST version if path is a bundle root.
+    """
+    if os.path.exists(os.path.join(path, MANIFEST_FILE)):
+        return path
+
+    with open(os.path.join(path, LATEST_FILE)) as f:
+        return os.path.join(path, f.read().strip())
+
+
+class Predictor:
+    """
+    Predicts votes for new weeks from a saved bundle, in numpy only.
+
+    Args:
+        bundle_dir: A version folder or a bundle root (uses LATEST).
+    """
+
+    def __init__(self, bundle_dir='artifacts'):
+        self.bundle_dir = bundle_dir
+        self._loaded = False
+
+    def _load(self):
+        if self._loaded:
+            return
+
+        from .encoding import CategoryEncoder
+
+        start = time.perf_counter()
+        self.bundle_dir = resolve_bundle(self.bundle_dir)
+        with open(os.path.join(self.bundle_dir, MANIFEST_FILE)) as f:
+            self.manifest_ = json.load(f)
+
+        if self.manifest_['format'] != BUNDLE_FORMAT:
+            raise ValueError(f"Bundle format {self.manifest_['format']} isn't supported, expected {BUNDLE_FORMAT}")
+
+        with np.load(os.path.join(self.bundle_dir, WEIGHTS_FILE)) as weights:
+            self._layers = [
+                (weights[f"kernel_{idx}"], weights[f"bias_{idx}"], _ACTIVATIONS[spec['activation']])
+                for idx, spec in enumerate(self.manifest_['layers'])
+            ]
+
+        self._scaled_columns = self.manifest_['scaled_columns']
+        self._mean = np.asarray(self.manifest_['scaler_mean'], dtype=np.float32)
+        self._scale = np.asarray(self.manifest_['scaler_scale'], dtype=np.float32)
+        self.encoder_ = CategoryEncoder.from_dict(self.manifest_['encoder'])
+        self.load_seconds_ = time.perf_counter() - start
+        self._loaded = True
+
+    def encode(self, df):
+        """
+        Scales and dummy codes raw rows exactly like training did.
+        """
+        self._load()
+        scaled = (df[self._scaled_columns].to_numpy(dtype=np.float32) - self._mean) / self._scale
+
+        return np.hstack([scaled, self.encoder_.transform(df).astype(np.float32)])
+
+    def predict_log_votes(self, df):
+        self._load()
+        out = self.encode(df)
+        for kernel, bias, activation in self._layers:
+            out = activation(out @ kernel + bias)
+
+        return out.ravel()
+
+    def predict(self, df):
+        """
+        Predicted_Votes for each row, back on the vote scale like the scripts' np.exp(y_pred).
+        """
+        return np.exp(self.predict_log_votes(df))
+
+    def predict_frame(self, df, id_columns=('year', 'week', 'analytical_points', 'pos_team')):
+        """
+        The scripts' output_df: the id columns plus Predicted_Votes. year and week (when the
+        CSV has them) let several weeks' outputs go straight into report.write_reports.
+        """
+        output_df = df[[col for col in id_columns if col in df.columns]].reset_index(drop=True)
+        output_df['Predicted_Votes'] = self.predict(df)
+
+        return output_df
+
+
+def predict_csv(bundle_dir, csv_path, output_path=None):
+    """
+    Reads a week's CSV, predicts it and optionally writes the result.
+    """
+    import pandas as pd
+
+    output_df = Predictor(bundle_dir).predict_frame(pd.read_csv(csv_path))
+    if output_path is not None:
+        output_df.to_csv(output_path, index=False)
+
+    return output_df
+
+
+def time_command(argv):
+    """
+    Runs python -m ap_poll <argv> in a fresh interpreter.
+
+    Returns:
+        dict with the seconds from interpreter start up to exit and the heavy modules it imported.
+    """
+    code = (
+        "import json, runpy, sys, time\n"
+        "start = time.perf_counter()\n"
+        f"sys.argv = ['ap_poll'] + {list(argv)!r}\n"
+        "try:\n"
+        "    runpy.run_module('ap_poll', run_name='__main__')\n"
+        "except SystemExit:\n"
+        "    pass\n"
+        f"heavy = [name for name in {HEAVY_MODULES!r} if name in sys.modules]\n"
+        "sys.stderr.write(json.dumps({'seconds': time.perf_counter() - start, 'heavy_imports': heavy}) + '\\n')\n"
+    )
+    package_parent = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, cwd=os.getcwd(),
+                            env=dict(os.environ, PYTHONPATH=os.pathsep.join(
+                                filter(None, [package_parent, os.environ.get('PYTHONPATH')]))))
+    if result.returncode != 0:
+        raise RuntimeError(f"{' '.join(argv)} failed:\n{result.stderr}")
+
+    return json.loads(result.stderr.strip().splitlines()[-1])
+
+
+def measure_cold_start(bundle_dir, csv_path, repeats=3):
+    """
+    Times the predict command in fresh interpreters (import, load, predict) and keeps the
+    numbers in the bundle's cold_start.json so they can be compared between versions.
+    train records it for every new bundle, startup --bundle refreshes it.
+
+    Returns:
+        dict with the median and every run's seconds, plus which heavy modules got imported.
+    """
+    bundle_dir = resolve_bundle(bundle_dir)
+    runs = [time_command(['predict', bundle_dir, csv_path, '-o', os.devnull]) for _ in range(repeats)]
+
+    report = {
+        'version': os.path.basename(bundle_dir),
+        'measured': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'median_seconds': float(np.median([run['seconds'] for run in runs])),
+        'seconds': [run['seconds'] for run in runs],
+        'heavy_imports': runs[-1]['heavy_imports']
+    }
+
+    with open(os.path.join(bundle_dir, COLD_START_FILE), 'w') as f:
+        json.dump(report, f)
+
+    return report
@@ -0,0 +1,314 @@
+"""
+Walk-forward backtest of the AP vote model, one fold per historical week.
+
+The scripts check a model on the single held out week, which says little about how
+it does early in a season or after the bowl games. run_backtest replays every week
+w of the training CSV: fit on the weeks before w, predict w, and score it with the
+MAE/MSE of log_votes and how well the predicted order matches the poll (Spearman
+rank correlation and the overlap of the predicted and actual top 25), then rolls
+the weeks up per season.
+
+The history is encoded once (prepare_history) into the on disk cache, and every
+worker memory maps that one matrix and takes its fold's rows by week, instead of
+re-reading and re-encoding the CSV for each of the ~140 folds. The scaled columns
+are re-standardized with the training weeks' own means and stds, which gives the
+same numbers as fitting the scaler on those weeks alone, so no later week leaks
+into a fold through the scaling. The team vocabulary is the one of the full
+history: a team first seen in week w has an all zero column before it, the same
+as the unknown team column it would get from a per fold encoder.
+"""
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from .data import CATEGORICAL_COLUMNS, DROP_COLUMNS, prepare_data
+from .data_cache import DatasetCache
+from .training import DEFAULT_CONFIG
+
+TOP_N = 25
+
+
+def prepare_history(train_path, drop_columns=DROP_COLUMNS, categorical_columns=CATEGORICAL_COLUMNS,
+                    cache_dir='data_cache', dtype=np.float32):
+    """
+    Encodes every week of the training CSV into one cached matrix for the backtest folds.
+
+    Returns:
+        The cache key, DatasetCache(cache_dir).load(key) memory maps x, y, period
+        (year * 100 + week) and team (codes into meta['teams']).
+    """
+    cache = DatasetCache(cache_dir)
+    config = {
+        'kind': 'backtest',
+        'version': 1,
+        'drop_columns': list(drop_columns),
+        'categorical_columns': list(categorical_columns),
+        'dtype': np.dtype(dtype).name
+    }
+    key = cache.key([train_path], config)
+    if cache.load(key) is not None:
+        return key
+
+    history = pd.read_csv(train_path)
+    missing = [col for col in ('year', 'week', 'pos_team') if col not in history.columns]
+    if missing:
+        raise ValueError(f"the backtest needs the {missing} columns to order the weeks")
+
+    data = prepare_data(history, history.iloc[:0], drop_columns=drop_columns, categorical_columns=categorical_columns,
+                        dtype=dtype)
+    teams, team_codes = np.unique(history['pos_team'].astype(str).to_numpy(), return_inverse=True)
+
+    arrays = {
+        'x': data.x_train,
+        'y': data.y_train,
+        'period': (history['year'].to_numpy(dtype=np.int64) * 100 + history['week'].to_numpy(dtype=np.int64)),
+        'team': team_codes.astype(np.int32)
+    }
+    meta = {
+        'feature_names': data.feature_names,
+        'n_scaled': len(data.scaled_columns),
+        'teams': teams.tolist()
+    }
+    cache.save(key, arrays, meta)
+
+    return key
+
+
+def _fit_predict(config, estimator, x_train, y_train, x_test):
+    if estimator is not None:
+        from sklearn.base import clone
+
+        model = clone(estimator).fit(x_train, y_train)
+        return np.asarray(model.predict(x_test), dtype=np.float64).ravel()
+
+    import tensorflow as tf
+    from tensorflow.keras.callbacks import EarlyStopping
+
+    from .input_pipeline import make_datasets
+    from .training import build_model
+
+    tf.keras.utils.set_random_seed(config['seed'])
+
+    validation_fraction = config.get('validation_fraction', 0.2) if config['early_stopping'] else 0.0
+    train_ds, val_ds = make_datasets(x_train, y_train, batch_size=config['batch_size'],
+                                     validation_fraction=validation_fraction, seed=config['seed'])
+    model = build_model(x_train.shape[1], hidden_units=config['hidden_units'], activation=config['activation'],
+                        l2=config['l2'], learning_rate=config['learning_rate'])
+
+    callbacks = []
+    if val_ds is not None:
+        callbacks.append(EarlyStopping(monitor='val_loss', patience=config['patience'], restore_best_weights=True))
+    model.fit(train_ds, epochs=config['epochs'], validation_data=val_ds, callbacks=callbacks, verbose=0)
+
+    return model.predict(x_test, batch_size=1024, verbose=0).astype(np.float64).ravel()
+
+
+def backtest_week(period, cache_dir, key, config=None, estimator=None):
+    """
+    One fold: trains on the weeks before period and predicts period.
+
+    Args:
+        period: year * 100 + week of the predicted week.
+        cache_dir, key: The matrix from prepare_history.
+        config: Model settings, anything left out uses DEFAULT_CONFIG.
+        estimator: A scikit-learn style regressor to use instead of the Keras model.
+
+    Returns:
+        Dict with the predicted rows (as positions in the history), their predictions,
+        the training row count and the fit time.
+    """
+    config = {**DEFAULT_CONFIG, **(config or {})}
+    arrays, meta = DatasetCache(cache_dir).load(key)
+    periods = np.asarray(arrays['period'])
+
+    train_rows = np.flatnonzero(periods < period)
+    test_rows = np.flatnonzero(periods == period)
+
+    # only the fold's rows are read from the memory map, both as fresh float32 copies
+    x_train = np.asarray(arrays['x'][train_rows], dtype=np.float32)
+    x_test = np.asarray(arrays['x'][test_rows], dtype=np.float32)
+    y_train = np.asarray(arrays['y'][train_rows], dtype=np.float32)
+
+    # standardizing again with the training weeks' stats undoes the full history scaler
+    n_scaled = meta['n_scaled']
+    mean = np.nanmean(x_train[:, :n_scaled], axis=0)
+    scale = np.nanstd(x_train[:, :n_scaled], axis=0)
+    scale[~(scale > 0)] = 1.0
+    mean[np.isnan(mean)] = 0.0
+    x_train[:, :n_scaled] = (x_train[:, :n_scaled] - mean) / scale
+    x_test[:, :n_scaled] = (x_test[:, :n_scaled] - mean) / scale
+
+    start = time.perf_counter()
+    predictions = _fit_predict(config, estimator, x_train, y_train, x_test)
+    train_time = time.perf_counter() - start
+
+    return {
+        'period': int(period),
+        'rows': test_rows,
+        'predictions': predictions,
+        'n_train': len(train_rows),
+        'train_time': train_time
+    }
+
+
+def _limit_worker_threads(threads, tensorflow):
+    # numpy (and with it BLAS) is already loaded by the time this runs, so environment variables would come
+    # too late, threadpoolctl resizes the loaded pools for the rest of the worker's life
+    from threadpoolctl import threadpool_limits
+    threadpool_limits(limits=threads)
+
+    if tensorflow:
+        from .training import _limit_threads
+        _limit_threads(threads)
+
+
+def week_metrics(predictions, top_n=TOP_N):
+    """
+    MAE, MSE, Spearman rank correlation and top_n overlap for every week at once.
+
+    Args:
+        predictions: One row per team and week with year, week, actual and predicted.
+        top_n: Size of the ranking compared, 25 for the AP poll.
+    """
+    df = predictions[['year', 'week', 'actual', 'predicted']].copy()
+    weeks = df.groupby(['year', 'week'], sort=True)
+    df['error'] = df['predicted'] - df['actual']
+    df['abs_error'] = df['error'].abs()
+    df['squared_error'] = df['error'] ** 2
+
+    # Spearman is the Pearson correlation of the ranks, taken per week from grouped sums
+    df['actual_rank'] = weeks['actual'].rank(method='average')
+    df['predicted_rank'] = weeks['predicted'].rank(method='average')
+    df['rank_product'] = df['actual_rank'] * df['predicted_rank']
+    df['actual_rank_sq'] = df['actual_rank'] ** 2
+    df['predicted_rank_sq'] = df['predicted_rank'] ** 2
+
+    # top_n by position, ties broken by row order so each list has exactly top_n teams
+    in_actual = weeks['actual'].rank(method='first', ascending=False) <= top_n
+    in_predicted = weeks['predicted'].rank(method='first', ascending=False) <= top_n
+    df['top_hit'] = in_actual & in_predicted
+
+    sums = df.groupby(['year', 'week'], sort=True)[
+        ['abs_error', 'squared_error', 'actual_rank', 'predicted_rank', 'rank_product', 'actual_rank_sq',
+         'predicted_rank_sq', 'top_hit']
+    ].sum()
+    n = weeks.size()
+
+    covariance = sums['rank_product'] - sums['actual_rank'] * sums['predicted_rank'] / n
+    actual_var = sums['actual_rank_sq'] - sums['actual_rank'] ** 2 / n
+    predicted_var = sums['predicted_rank_sq'] - sums['predicted_rank'] ** 2 / n
+    with np.errstate(invalid='ignore', divide='ignore'):
+        spearman = covariance / np.sqrt(actual_var * predicted_var)
+
+    return pd.DataFrame({
+        'n_teams': n,
+        'mae': sums['abs_error'] / n,
+        'mse': sums['squared_error'] / n,
+        'spearman': spearman.where(np.isfinite(spearman)),
+        f"top{top_n}_overlap": sums['top_hit'] / np.minimum(n, top_n)
+    }).reset_index()
+
+
+def season_metrics(weekly, predictions, top_n=TOP_N):
+    """
+    Per season MAE/MSE over every predicted row plus the mean weekly ranking scores.
+    """
+    errors = predictions.assign(abs_error=(predictions['predicted'] - predictions['actual']).abs(),
+                                squared_error=(predictions['predicted'] - predictions['actual']) ** 2)
+    pooled = errors.groupby('year')[['abs_error', 'squared_error']].mean()
+    ranking = weekly.groupby('year').agg(weeks=('week', 'size'), spearman=('spearman', 'mean'),
+                                         **{f"top{top_n}_overlap": (f"top{top_n}_overlap", 'mean')})
+
+    return ranking.join(pooled.rename(columns={'abs_error': 'mae', 'squared_error': 'mse'})) \
+        [['weeks', 'mae', 'mse', 'spearman', f"top{top_n}_overlap"]].reset_index()
+
+
+@dataclass
+class BacktestResult:
+    """
+    Walk-forward results: per week and per season scores and every prediction made.
+    """
+    weekly: pd.DataFrame
+    seasons: pd.DataFrame
+    predictions: pd.DataFrame
+
+    def save(self, output_dir):
+        os.makedirs(output_dir, exist_ok=True)
+        paths = []
+        for name in ('weekly', 'seasons', 'predictions'):
+            path = os.path.join(output_dir, f"{name}.csv")
+            getattr(self, name).to_csv(path, index=False)
+            paths.append(path)
+
+        return paths
+
+
+def run_backtest(train_path, config=None, estimator=None, min_train_weeks=15, seasons=None,
+                 drop_columns=DROP_COLUMNS, cache_dir='data_cache', n_workers=None, threads_per_worker=1,
+                 top_n=TOP_N):
+    """
+    Replays every week of the training CSV, training on the weeks before it.
+
+    Args:
+        train_path: CSV with year and week columns, e.g. full_train_data.csv.
+        config: Keras model settings, anything left out uses DEFAULT_CONFIG. early_stopping holds out
+            config['validation_fraction'] (0.2) of each fold's rows.
+        estimator: A scikit-learn style regressor (e.g. Ridge()) to backtest instead of the Keras model.
+        min_train_weeks: Weeks of history before the first predicted week.
+        seasons: Only predict the weeks of these years, None for all of them.
+        drop_columns: Columns that aren't features.
+        cache_dir: Data cache shared by every worker.
+        n_workers: Worker processes, defaults to cores // threads_per_worker.
+        threads_per_worker: Threads each worker may use.
+        top_n: Size of the ranking compared.
+
+    Returns:
+        BacktestResult
+    """
+    key = prepare_history(train_path, drop_columns=drop_columns, cache_dir=cache_dir)
+    arrays, meta = DatasetCache(cache_dir).load(key)
+
+    all_periods = np.unique(arrays['period'])
+    folds = all_periods[min_train_weeks:]
+    if seasons is not None:
+        folds = folds[np.isin(folds // 100, list(seasons))]
+    if len(folds) == 0:
+        raise ValueError(f"no week to predict after {min_train_weeks} training weeks of {len(all_periods)}")
+
+    n_workers = n_workers or max(1, (os.cpu_count() or 1) // threads_per_worker)
+
+    # the last weeks have the most rows to train on, so they go first to keep the workers busy at the end
+    fold_results = []
+    with ProcessPoolExecutor(max_workers=min(n_workers, len(folds)),
+                             mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_limit_worker_threads,
+                             initargs=(threads_per_worker, estimator is None)) as pool:
+        futures = [pool.submit(backtest_week, period, cache_dir, key, config, estimator) for period in folds[::-1]]
+        for future in as_completed(futures):
+            fold_results.append(future.result())
+
+    fold_results.sort(key=lambda result: result['period'])
+    rows = np.concatenate([result['rows'] for result in fold_results])
+    periods = np.asarray(arrays['period'])[rows]
+
+    predictions = pd.DataFrame({
+        'year': periods // 100,
+        'week': periods % 100,
+        'pos_team': np.asarray(meta['teams'])[np.asarray(arrays['team'])[rows]],
+        'actual': np.asarray(arrays['y'][rows], dtype=np.float64),
+        'predicted': np.concatenate([result['predictions'] for result in fold_results])
+    })
+
+    weekly = week_metrics(predictions, top_n=top_n)
+    fits = pd.DataFrame([{'year': result['period'] // 100, 'week': result['period'] % 100,
+                          'n_train': result['n_train'], 'train_time': result['train_time']}
+                         for result in fold_results])
+    weekly = weekly.merge(fits, on=['year', 'week'], how='left')
+
+    return BacktestResult(weekly=weekly, seasons=season_metrics(weekly, predictions, top_n=top_n),
+                          predictions=predictions)
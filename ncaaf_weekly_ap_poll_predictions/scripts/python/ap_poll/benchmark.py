@@ -0,0 +1,111 @@
+"""
+Benchmarks for the AP vote pipeline: load, preprocess, train and predict.
+
+Runs every stage on synthetic data (see synthetic.py) at a few sizes and records
+wall time and peak Python/numpy memory (tracemalloc) per stage, so a change that
+slows the preprocessing or the training path down shows up as a number instead of
+a feeling. Stages that need TensorFlow are marked skipped when it isn't installed.
+
+    python -m ap_poll benchmark --sizes 1000 5000 18874 -o benchmark.csv
+"""
+import importlib.util
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+
+def measure(fn, *args, **kwargs):
+    """
+    Runs fn and returns (result, wall seconds, peak MB allocated while it ran).
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = fn(*args, **kwargs)
+        wall = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return result, wall, peak / 2 ** 20
+
+
+def run_benchmark(sizes=(1000, 5000, 18874), epochs=2, batch_size=256, n_numeric=361, seed=0, workdir=None):
+    """
+    Times every stage at every size.
+
+    Args:
+        sizes: Training rows to generate, the test week is always 134 rows.
+        epochs: Training epochs, a couple is enough to time an epoch.
+        batch_size: Training batch size.
+        n_numeric: Numeric columns in the synthetic data.
+        seed: Seed for the data and the model.
+        workdir: Where the CSVs, cache and bundles go, a temp folder (removed afterwards) by default.
+
+    Returns:
+        DataFrame with size, stage, wall_s, peak_mb and status per stage.
+    """
+    from .artifacts import Predictor, save_bundle
+    from .data import load_prepared_data, prepare_data, read_in_data
+    from .synthetic import make_ncaaf_data
+
+    has_tensorflow = importlib.util.find_spec('tensorflow') is not None
+    cleanup = workdir is None
+    workdir = tempfile.mkdtemp(prefix='ap_poll_bench_') if workdir is None else workdir
+    rows = []
+
+    def record(size, stage, fn, *args, **kwargs):
+        result, wall, peak = measure(fn, *args, **kwargs)
+        rows.append({'size': size, 'stage': stage, 'wall_s': wall, 'peak_mb': peak, 'status': 'ok'})
+        return result
+
+    def skip(size, stage, reason):
+        rows.append({'size': size, 'stage': stage, 'wall_s': float('nan'), 'peak_mb': float('nan'), 'status': reason})
+
+    try:
+        for size in sizes:
+            train_df, test_df = record(size, 'generate', make_ncaaf_data, n_rows=size, n_numeric=n_numeric, seed=seed)
+
+            size_dir = os.path.join(workdir, str(size))
+            os.makedirs(size_dir, exist_ok=True)
+            train_path, test_path = os.path.join(size_dir, 'train.csv'), os.path.join(size_dir, 'test.csv')
+            train_df.to_csv(train_path, index=False)
+            test_df.to_csv(test_path, index=False)
+
+            record(size, 'load_csv', read_in_data, train_path, test_path)
+            record(size, 'load_csv_compact', read_in_data, train_path, test_path, compact=True)
+            record(size, 'preprocess', prepare_data, train_df, test_df)
+
+            cache_dir = os.path.join(size_dir, 'data_cache')
+            record(size, 'cache_build', load_prepared_data, train_path, test_path, cache_dir=cache_dir)
+            data = record(size, 'cache_hit', load_prepared_data, train_path, test_path, cache_dir=cache_dir)
+
+            if not has_tensorflow:
+                for stage in ('train', 'save_bundle', 'predict'):
+                    skip(size, stage, 'skipped: tensorflow not installed')
+                continue
+
+            def train():
+                import tensorflow as tf
+
+                from .input_pipeline import make_datasets
+                from .training import build_model
+
+                tf.keras.utils.set_random_seed(seed)
+                model = build_model(data.x_train.shape[1])
+                train_ds, val_ds = make_datasets(data.x_train, data.y_train, batch_size=batch_size, seed=seed)
+                model.fit(train_ds, epochs=epochs, validation_data=val_ds, verbose=0)
+                return model
+
+            model = record(size, 'train', train)
+            bundle_dir = record(size, 'save_bundle', save_bundle, model, data, os.path.join(size_dir, 'artifacts'))
+            record(size, 'predict', lambda: Predictor(bundle_dir).predict_frame(test_df))
+    finally:
+        if cleanup:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return pd.DataFrame(rows)
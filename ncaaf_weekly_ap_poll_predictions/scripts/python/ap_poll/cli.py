@@ -0,0 +1,322 @@
+"""
+Command line entry point for the AP vote model, run from scripts/python:
+
+    python -m ap_poll inspect TRAIN.csv TEST.csv
+    python -m ap_poll train TRAIN.csv TEST.csv --bundle-root artifacts
+    python -m ap_poll predict artifacts TEST.csv -o test.csv
+    python -m ap_poll plot history artifacts -o history.png
+    python -m ap_poll plot pairplot TRAIN.csv -o pairplot.png
+    python -m ap_poll eda TRAIN.csv -o eda --pairplot-columns log_votes lagged_log_votes cumulative_games_won
+    python -m ap_poll report week_*.csv -o ../../predictions
+    python -m ap_poll backtest TRAIN.csv -o backtest --min-train-weeks 15
+    python -m ap_poll startup --train TRAIN.csv --test TEST.csv --bundle artifacts
+    python -m ap_poll benchmark --sizes 1000 5000 18874 -o benchmark.csv
+
+The exploratory scripts import TensorFlow, seaborn and matplotlib at the top and
+then do everything at import time. Here every subcommand imports only what it
+uses, inside its handler, so inspect and predict never pay for TensorFlow or the
+plotting libraries. startup times each subcommand in a fresh interpreter and lists
+any heavy module that got imported anyway.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+
+def _inspect(args):
+    from .data import TARGET_COLUMN, load_prepared_data
+
+    data = load_prepared_data(args.train, args.test, cache_dir=args.cache_dir)
+
+    print(f"x_train: {data.x_train.shape[0]} rows x {data.x_train.shape[1]} columns")
+    print(f"x_test:  {data.x_test.shape[0]} rows x {data.x_test.shape[1]} columns")
+    print(f"scaled columns: {len(data.scaled_columns)}, team columns: {data.encoder.n_features_out_}")
+    print(f"teams in train: {len(data.encoder.categories_['pos_team'])}")
+
+    unknown = data.encoder.feature_names_out_.index('pos_team_Unknown_value') + len(data.scaled_columns)
+    print(f"test rows with a team not seen in train: {int(data.x_test[:, unknown].sum())}")
+
+    y_train = data.y_train
+    print(f"{TARGET_COLUMN} (train): mean {y_train.mean():.3f}, sd {y_train.std():.3f}, "
+          f"min {y_train.min():.3f}, max {y_train.max():.3f}")
+
+
+def _train(args):
+    import numpy as np
+
+    from .artifacts import measure_cold_start, save_bundle
+    from .data import load_prepared_data
+    from .input_pipeline import make_datasets
+    from .training import build_model
+
+    import tensorflow as tf
+    tf.keras.utils.set_random_seed(args.seed)
+
+    data = load_prepared_data(args.train, args.test, cache_dir=args.cache_dir)
+    model = build_model(data.x_train.shape[1], hidden_units=args.hidden_units, activation=args.activation,
+                        l2=args.l2, learning_rate=args.learning_rate)
+
+    train_ds, val_ds = make_datasets(data.x_train, data.y_train, batch_size=args.batch_size,
+                                     validation_fraction=args.validation_fraction, seed=args.seed)
+    history = model.fit(train_ds, epochs=args.epochs, validation_data=val_ds, verbose=2)
+
+    notes = {
+        'config': {key: getattr(args, key) for key in ('hidden_units', 'activation', 'l2', 'learning_rate',
+                                                         'batch_size', 'epochs', 'seed')},
+        'history': {key: [float(value) for value in values] for key, values in history.history.items()}
+    }
+    if not np.isnan(data.y_test).any():
+        test_loss, test_mae, test_mse = model.evaluate(data.x_test, data.y_test, verbose=0)
+        notes.update(test_mse=test_mse, test_mae=test_mae)
+        print(f"Test MSE: {test_mse:.4f}, Test MAE: {test_mae:.4f}")
+
+    version_dir = save_bundle(model, data, args.bundle_root, notes=notes)
+    print(f"saved {version_dir}")
+
+    # the tracked number: how long a fresh interpreter takes to predict the test week with this bundle
+    cold_start = measure_cold_start(version_dir, args.test)
+    print(f"cold start predict: median {cold_start['median_seconds']:.3f}s, heavy imports: "
+          f"{', '.join(cold_start['heavy_imports']) or 'none'}")
+
+
+def _predict(args):
+    from .artifacts import predict_csv
+
+    output_df = predict_csv(args.bundle, args.csv, args.output)
+    if args.output is None:
+        print(output_df.to_csv(index=False), end='')
+
+
+def _plot(args):
+    import matplotlib
+    if args.output is not None:
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    if args.kind == 'history':
+        from .artifacts import MANIFEST_FILE, resolve_bundle
+
+        with open(os.path.join(resolve_bundle(args.source), MANIFEST_FILE)) as f:
+            history = (json.load(f).get('notes') or {}).get('history')
+        if not history:
+            raise SystemExit(f"{args.source} has no training history, it was saved without one")
+
+        from .plots import draw, history_spec, render
+
+        spec = history_spec({metric: values for metric, values in history.items()
+                             if metric.replace('val_', '') in ('loss', 'mae', 'mse')}, 'history')
+        if args.output is not None:
+            # straight to the file on an Agg canvas, .html adds the per epoch table under the image
+            stem, extension = os.path.splitext(args.output)
+            spec['name'] = os.path.basename(stem)
+            for path in render(spec, os.path.dirname(stem) or '.', formats=(extension.lstrip('.') or 'png',)):
+                print(f"saved {path}")
+            return
+        draw(plt.figure(figsize=(18, 5)), spec)
+        plt.tight_layout()
+    else:
+        import seaborn as sns
+
+        from .eda import scan
+
+        # every row makes the kde and scatter panels crawl, a reservoir sample looks the same
+        _, sample = scan(args.source, sample_size=args.sample_size, random_state=args.seed, usecols=args.columns)
+        sns.pairplot(sample, diag_kind='kde')
+
+    if args.output is None:
+        plt.show()
+    else:
+        plt.savefig(args.output, dpi=120)
+        print(f"saved {args.output}")
+
+
+def _startup(args):
+    from .artifacts import measure_cold_start, time_command
+
+    commands = {'help': ['--help']}
+    if args.train and args.test:
+        commands['inspect'] = ['inspect', args.train, args.test, '--cache-dir', args.cache_dir]
+
+    rows = []
+    for name, argv in commands.items():
+        runs = [time_command(argv) for _ in range(args.repeats)]
+        seconds = sorted(run['seconds'] for run in runs)
+        rows.append({'command': name, 'median_seconds': seconds[len(seconds) // 2], 'min_seconds': seconds[0],
+                     'heavy_imports': runs[-1]['heavy_imports']})
+    if args.bundle and args.test:
+        # also refreshes the bundle's cold_start.json
+        report = measure_cold_start(args.bundle, args.test, repeats=args.repeats)
+        rows.append({'command': 'predict', 'median_seconds': report['median_seconds'],
+                     'min_seconds': min(report['seconds']), 'heavy_imports': report['heavy_imports']})
+
+    for row in rows:
+        heavy = ', '.join(row['heavy_imports']) or 'none'
+        print(f"{row['command']:<8} median {row['median_seconds']:.3f}s  min {row['min_seconds']:.3f}s  "
+              f"heavy imports: {heavy}")
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump({'measured': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': sys.version.split()[0],
+                       'results': rows}, f, indent=2)
+
+
+def _eda(args):
+    from .eda import run_eda
+
+    paths = run_eda(args.csv, args.output, columns=args.columns, pairplot_columns=args.pairplot_columns,
+                    max_pairplot_columns=args.max_pairplot_columns, sample_size=args.sample_size,
+                    stratify=args.stratify, chunk_size=args.chunk_size, random_state=args.seed)
+    for kind, path in paths.items():
+        print(f"{kind}: {path}")
+
+
+def _report(args):
+    import pandas as pd
+
+    from .report import write_reports
+
+    predictions = pd.concat([pd.read_csv(path) for path in args.csv], ignore_index=True)
+    summary, paths = write_reports(predictions, args.output, predicted=args.predicted, actual=args.actual,
+                                   top_n=args.top_n, formats=args.formats, n_workers=args.workers)
+    print(summary.to_string(index=False, float_format=lambda value: f"{value:.3f}"))
+    print(f"wrote {len(paths)} files to {args.output}")
+
+
+def _backtest(args):
+    from .backtest import run_backtest
+
+    estimator = None
+    if args.model == 'ridge':
+        from sklearn.linear_model import Ridge
+        estimator = Ridge(alpha=args.alpha)
+
+    config = {key: getattr(args, key) for key in ('hidden_units', 'activation', 'l2', 'learning_rate', 'batch_size',
+                                                     'epochs', 'seed')}
+    result = run_backtest(args.train, config=config, estimator=estimator, min_train_weeks=args.min_train_weeks,
+                          seasons=args.seasons, cache_dir=args.cache_dir, n_workers=args.workers,
+                          threads_per_worker=args.threads_per_worker)
+    print(result.seasons.to_string(index=False, float_format=lambda value: f"{value:.3f}"))
+
+    for path in result.save(args.output):
+        print(f"saved {path}")
+
+
+def _benchmark(args):
+    from .benchmark import run_benchmark
+
+    results = run_benchmark(sizes=args.sizes, epochs=args.epochs, n_numeric=args.n_numeric, workdir=args.workdir)
+    print(results.to_string(index=False, float_format=lambda value: f"{value:.3f}"))
+
+    if args.output is not None:
+        results.to_csv(args.output, index=False)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m ap_poll', description='AP poll vote predictions')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    inspect = subparsers.add_parser('inspect', help='load the prepared data and summarize it')
+    inspect.add_argument('train')
+    inspect.add_argument('test')
+    inspect.add_argument('--cache-dir', default='data_cache')
+    inspect.set_defaults(handler=_inspect)
+
+    train = subparsers.add_parser('train', help='train the model and save it as a new bundle version')
+    train.add_argument('train')
+    train.add_argument('test')
+    train.add_argument('--bundle-root', default='artifacts')
+    train.add_argument('--cache-dir', default='data_cache')
+    train.add_argument('--hidden-units', type=int, nargs='+', default=[16, 16])
+    train.add_argument('--activation', default='relu')
+    train.add_argument('--l2', type=float, default=0.0001)
+    train.add_argument('--learning-rate', type=float, default=0.01)
+    train.add_argument('--batch-size', type=int, default=256)
+    train.add_argument('--epochs', type=int, default=100)
+    train.add_argument('--validation-fraction', type=float, default=0.2)
+    train.add_argument('--seed', type=int, default=0)
+    train.set_defaults(handler=_train)
+
+    predict = subparsers.add_parser('predict', help="predict a week's CSV from a saved bundle")
+    predict.add_argument('bundle', help='bundle root (uses LATEST) or a version folder')
+    predict.add_argument('csv')
+    predict.add_argument('-o', '--output', help='output CSV, printed if left out')
+    predict.set_defaults(handler=_predict)
+
+    plot = subparsers.add_parser('plot', help='training history of a bundle, or a pairplot of the training CSV')
+    plot.add_argument('kind', choices=['history', 'pairplot'])
+    plot.add_argument('source', help='bundle for history, CSV for pairplot')
+    plot.add_argument('--columns', nargs='+', default=['log_votes', 'lagged_log_votes', 'cumulative_games_won'])
+    plot.add_argument('--sample-size', type=int, default=5000, help='rows drawn for the pairplot')
+    plot.add_argument('--seed', type=int, default=0)
+    plot.add_argument('-o', '--output', help='image file (.png, or .html for history), shown in a window if left out')
+    plot.set_defaults(handler=_plot)
+
+    eda = subparsers.add_parser('eda', help='correlations, heatmap and a sampled pairplot in one pass, saved to files')
+    eda.add_argument('csv')
+    eda.add_argument('-o', '--output', default='eda', help='folder for the CSVs and images')
+    eda.add_argument('--columns', nargs='+', help='numeric columns to correlate, all by default')
+    eda.add_argument('--pairplot-columns', nargs='+', default=['log_votes', 'lagged_log_votes', 'cumulative_games_won'])
+    eda.add_argument('--max-pairplot-columns', type=int, default=12)
+    eda.add_argument('--sample-size', type=int, default=5000, help='rows drawn for the scatter and KDE panels')
+    eda.add_argument('--stratify', help='column to stratify the sample on (and colour by), e.g. conference')
+    eda.add_argument('--chunk-size', type=int, default=50_000)
+    eda.add_argument('--seed', type=int, default=0)
+    eda.set_defaults(handler=_eda)
+
+    report = subparsers.add_parser('report', help='predicted vs. actual ranking tables for every week, HTML and PNG')
+    report.add_argument('csv', nargs='+', help='predictions with year, week, pos_team and both columns to rank on')
+    report.add_argument('-o', '--output', default='reports')
+    report.add_argument('--predicted', default='Predicted_Votes', help="e.g. 'predicted' for backtest predictions")
+    report.add_argument('--actual', default='analytical_points', help="e.g. 'actual' for backtest predictions")
+    report.add_argument('--top-n', type=int, default=25)
+    report.add_argument('--formats', nargs='+', choices=['html', 'png'], default=['html', 'png'])
+    report.add_argument('--workers', type=int, help='processes drawing the reports, 0 draws them in this one')
+    report.set_defaults(handler=_report)
+
+    backtest = subparsers.add_parser('backtest', help='walk-forward backtest, predicting every week from the ones before')
+    backtest.add_argument('train')
+    backtest.add_argument('-o', '--output', default='backtest', help='folder for the weekly, season and prediction CSVs')
+    backtest.add_argument('--model', choices=['keras', 'ridge'], default='keras',
+                          help='ridge is a quick linear baseline that skips TensorFlow')
+    backtest.add_argument('--alpha', type=float, default=1.0, help='ridge penalty')
+    backtest.add_argument('--min-train-weeks', type=int, default=15)
+    backtest.add_argument('--seasons', type=int, nargs='+', help='only predict the weeks of these years')
+    backtest.add_argument('--cache-dir', default='data_cache')
+    backtest.add_argument('--workers', type=int)
+    backtest.add_argument('--threads-per-worker', type=int, default=1)
+    backtest.add_argument('--hidden-units', type=int, nargs='+', default=[16, 16])
+    backtest.add_argument('--activation', default='relu')
+    backtest.add_argument('--l2', type=float, default=0.0001)
+    backtest.add_argument('--learning-rate', type=float, default=0.01)
+    backtest.add_argument('--batch-size', type=int, default=256)
+    backtest.add_argument('--epochs', type=int, default=100)
+    backtest.add_argument('--seed', type=int, default=0)
+    backtest.set_defaults(handler=_backtest)
+
+    startup = subparsers.add_parser('startup', help='time the subcommands from a cold interpreter')
+    startup.add_argument('--train')
+    startup.add_argument('--test')
+    startup.add_argument('--bundle')
+    startup.add_argument('--cache-dir', default='data_cache')
+    startup.add_argument('--repeats', type=int, default=5)
+    startup.add_argument('-o', '--output', help='JSON file for the timings')
+    startup.set_defaults(handler=_startup)
+
+    benchmark = subparsers.add_parser('benchmark', help='time load/preprocess/train/predict on synthetic data')
+    benchmark.add_argument('--sizes', type=int, nargs='+', default=[1000, 5000, 18874])
+    benchmark.add_argument('--epochs', type=int, default=2)
+    benchmark.add_argument('--n-numeric', type=int, default=361)
+    benchmark.add_argument('--workdir', help='keep the generated files here instead of a temp folder')
+    benchmark.add_argument('-o', '--output', help='CSV file for the results')
+    benchmark.set_defaults(handler=_benchmark)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if getattr(args, 'hidden_units', None) is not None:
+        args.hidden_units = tuple(args.hidden_units)
+    args.handler(args)
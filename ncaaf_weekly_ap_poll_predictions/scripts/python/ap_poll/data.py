@@ -0,0 +1,178 @@
+"""
+Loading and preparing the AP poll data.
+
+Same steps as the exploratory scripts (drop the outcome columns, scale everything
+but pos_team, dummy code pos_team), packaged so the result can be cached on disk
+and reused between runs. See data_cache.py for the cache itself.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from .compact import compact_dtypes, memory_report
+from .data_cache import DatasetCache
+from .encoding import CategoryEncoder
+
+TARGET_COLUMN = 'log_votes'
+DROP_COLUMNS = ('log_votes', 'analytical_points', 'conference')
+CATEGORICAL_COLUMNS = ('pos_team',)
+ID_COLUMNS = ('analytical_points', 'pos_team')
+
+
+# Small function to read in the csv data, compact=True downcasts to float32/small ints/category (see compact.py)
+def read_in_data(train_path, test_path, compact=False, verbose=False):
+    train_df = pd.read_csv(train_path)
+    test_df = pd.read_csv(test_path)
+
+    if compact:
+        categorical_columns = [col for col in ('pos_team', 'conference') if col in train_df.columns]
+        compact_train = compact_dtypes(train_df, categorical_columns=categorical_columns)
+        compact_test = compact_dtypes(test_df, categorical_columns=[col for col in categorical_columns
+                                                                    if col in test_df.columns])
+        if verbose:
+            print(memory_report({'train': train_df, 'test': test_df}, {'train': compact_train, 'test': compact_test}))
+        train_df, test_df = compact_train, compact_test
+
+    return train_df, test_df
+
+
+@dataclass
+class PreparedData:
+    """
+    Model ready train and test matrices plus what is needed to prepare new weeks the same way.
+    """
+    x_train: np.ndarray
+    y_train: np.ndarray
+    x_test: np.ndarray
+    y_test: np.ndarray
+    feature_names: list
+    scaled_columns: list
+    scaler_mean: np.ndarray
+    scaler_scale: np.ndarray
+    encoder: CategoryEncoder
+    test_ids: pd.DataFrame
+
+    def frames(self):
+        """
+        x_train and x_test as DataFrames with the encoded column names, without copying the arrays.
+        """
+        x_train_encoded = pd.DataFrame(self.x_train, columns=self.feature_names, copy=False)
+        x_test_encoded = pd.DataFrame(self.x_test, columns=self.feature_names, copy=False)
+
+        return x_train_encoded, x_test_encoded
+
+
+def _encode(df, scaled_columns, scaler_mean, scaler_scale, encoder, dtype=np.float64):
+    # filled into one pre-allocated matrix, hstack would build a float64 copy first
+    out = np.empty((len(df), len(scaled_columns) + encoder.n_features_out_), dtype=dtype)
+    out[:, :len(scaled_columns)] = (df[scaled_columns].to_numpy(dtype=np.float64) - scaler_mean) / scaler_scale
+    out[:, len(scaled_columns):] = encoder.transform(df)
+
+    return out
+
+
+def prepare_data(train_df, test_df, drop_columns=DROP_COLUMNS, categorical_columns=CATEGORICAL_COLUMNS,
+                 dtype=np.float32):
+    """
+    Scales and dummy codes train and test, learning everything from train only.
+
+    Args:
+        train_df: Training weeks.
+        test_df: Week(s) to predict, log_votes can be missing.
+        drop_columns: Columns that aren't features.
+        categorical_columns: Columns to dummy code, the rest are scaled.
+        dtype: dtype of the x/y matrices, float32 is what Keras trains in anyway.
+
+    Returns:
+        PreparedData
+    """
+    x_train = train_df.drop(columns=[col for col in drop_columns if col in train_df.columns])
+    scaled_columns = [col for col in x_train.columns if col not in categorical_columns]
+
+    # same numbers StandardScaler would learn, accumulated in float64 even when the columns are compact
+    scaled_values = x_train[scaled_columns].to_numpy(dtype=np.float64)
+    scaler_mean = np.nanmean(scaled_values, axis=0)
+    scaler_scale = np.nanstd(scaled_values, axis=0)
+    scaler_scale[scaler_scale == 0] = 1.0
+    del scaled_values
+
+    encoder = CategoryEncoder(columns=categorical_columns).fit(x_train)
+
+    y_test = test_df[TARGET_COLUMN] if TARGET_COLUMN in test_df.columns else pd.Series(np.nan, index=test_df.index)
+
+    return PreparedData(
+        x_train=_encode(x_train, scaled_columns, scaler_mean, scaler_scale, encoder, dtype),
+        y_train=train_df[TARGET_COLUMN].to_numpy(dtype=dtype),
+        x_test=_encode(test_df, scaled_columns, scaler_mean, scaler_scale, encoder, dtype),
+        y_test=y_test.to_numpy(dtype=dtype),
+        feature_names=scaled_columns + encoder.feature_names_out_,
+        scaled_columns=scaled_columns,
+        scaler_mean=scaler_mean,
+        scaler_scale=scaler_scale,
+        encoder=encoder,
+        test_ids=test_df[[col for col in ID_COLUMNS if col in test_df.columns]].reset_index(drop=True)
+    )
+
+
+def load_prepared_data(train_path, test_path, drop_columns=DROP_COLUMNS, categorical_columns=CATEGORICAL_COLUMNS,
+                       cache_dir='data_cache', use_cache=True, dtype=np.float32, compact=False):
+    """
+    prepare_data straight from the CSV files, going through the on disk cache.
+
+    compact=True reads the CSVs with compact dtypes, which lowers the peak memory of a
+    cache miss, dtype is passed on to prepare_data.
+
+    The cache key is the content of both files plus the settings, so editing either
+    CSV or changing the dropped columns builds a new entry. On a hit nothing is parsed
+    and the matrices are memory mapped.
+    """
+    cache = DatasetCache(cache_dir)
+    config = {
+        'version': 1,
+        'drop_columns': list(drop_columns),
+        'categorical_columns': list(categorical_columns),
+        'dtype': np.dtype(dtype).name,
+        'compact': compact
+    }
+
+    key = cache.key([train_path, test_path], config) if use_cache else None
+    cached = cache.load(key) if use_cache else None
+
+    if cached is not None:
+        arrays, meta = cached
+        return PreparedData(
+            x_train=arrays['x_train'],
+            y_train=arrays['y_train'],
+            x_test=arrays['x_test'],
+            y_test=arrays['y_test'],
+            feature_names=meta['feature_names'],
+            scaled_columns=meta['scaled_columns'],
+            scaler_mean=arrays['scaler_mean'],
+            scaler_scale=arrays['scaler_scale'],
+            encoder=CategoryEncoder.from_dict(meta['encoder']),
+            test_ids=pd.DataFrame(meta['test_ids'])
+        )
+
+    train_df, test_df = read_in_data(train_path, test_path, compact=compact)
+    data = prepare_data(train_df, test_df, drop_columns=drop_columns, categorical_columns=categorical_columns,
+                        dtype=dtype)
+
+    if use_cache:
+        arrays = {
+            'x_train': data.x_train,
+            'y_train': data.y_train,
+            'x_test': data.x_test,
+            'y_test': data.y_test,
+            'scaler_mean': data.scaler_mean,
+            'scaler_scale': data.scaler_scale
+        }
+        meta = {
+            'feature_names': data.feature_names,
+            'scaled_columns': data.scaled_columns,
+            'encoder': data.encoder.to_dict(),
+            'test_ids': data.test_ids.to_dict(orient='list')
+        }
+        cache.save(key, arrays, meta)
+
+    return data
@@ -0,0 +1,126 @@
+"""
+Content addressed cache for prepared datasets.
+
+Parsing full_train_data.csv and dummy coding it takes longer than most of the
+model runs we do on it. Entries here are keyed on a hash of the source files plus
+the preprocessing config, hold every array as a .npy file, and are loaded back as
+read only memory maps, so a cache hit skips the CSV parse and the encoding and
+doesn't even copy the data into memory until it is used.
+
+This module is a deliberate copy of
+kaggle_postHCT_survival/scripts/hct_survival/data_cache.py.
+The two projects run from their own folders and don't import each other,
+only the docstrings differ, so a fix to one goes into both.
+"""
+import hashlib
+import json
+import os
+import shutil
+import uuid
+
+import numpy as np
+
+DIGEST_INDEX = 'digests.json'
+
+
+def _sha256(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+class DatasetCache:
+    """
+    Stores named arrays plus a JSON metadata dict under a content hash.
+
+    Args:
+        cache_dir: Folder the entries are written to, created on first save.
+    """
+
+    def __init__(self, cache_dir='data_cache'):
+        self.cache_dir = cache_dir
+
+    def file_digest(self, path):
+        """
+        sha256 of a file, remembered by (size, mtime) so an unchanged file isn't re-read.
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        index_path = os.path.join(self.cache_dir, DIGEST_INDEX)
+
+        index = {}
+        if os.path.exists(index_path):
+            with open(index_path) as f:
+                index = json.load(f)
+
+        known = index.get(path)
+        if known is not None and known[0] == stat.st_size and known[1] == stat.st_mtime_ns:
+            return known[2]
+
+        digest = _sha256(path)
+        index[path] = [stat.st_size, stat.st_mtime_ns, digest]
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{index_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, index_path)
+
+        return digest
+
+    def key(self, paths, config):
+        """
+        Cache key for some source files and the config used to prepare them.
+
+        Args:
+            paths: Source files, their contents (not their names) go into the key.
+            config: JSON serializable dict of every setting that changes the output.
+        """
+        payload = json.dumps({
+            'files': [self.file_digest(path) for path in paths],
+            'config': config
+        }, sort_keys=True, default=str)
+
+        return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+    def load(self, key):
+        """
+        Returns (arrays, meta) for a cached entry, or None on a miss.
+
+        Arrays come back as read only memory maps.
+        """
+        entry = os.path.join(self.cache_dir, key)
+        meta_path = os.path.join(entry, 'meta.json')
+        if not os.path.exists(meta_path):
+            return None
+
+        with open(meta_path) as f:
+            meta = json.load(f)
+
+        arrays = {name: np.load(os.path.join(entry, f"{name}.npy"), mmap_mode='r') for name in meta['arrays']}
+
+        return arrays, meta['meta']
+
+    def save(self, key, arrays, meta):
+        """
+        Writes an entry. Everything goes to a temp folder first and is renamed into
+        place, so a killed run can't leave a half written entry that looks valid.
+        """
+        entry = os.path.join(self.cache_dir, key)
+        tmp_entry = f"{entry}.{uuid.uuid4().hex}.tmp"
+        os.makedirs(tmp_entry)
+
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp_entry, f"{name}.npy"), np.ascontiguousarray(array), allow_pickle=False)
+
+        with open(os.path.join(tmp_entry, 'meta.json'), 'w') as f:
+            json.dump({'arrays': list(arrays), 'meta': meta}, f)
+
+        if os.path.exists(entry):
+            # someone else built the same entry in the meantime, theirs is just as good
+            shutil.rmtree(tmp_entry)
+        else:
+            os.replace(tmp_entry, entry)
@@ -0,0 +1,357 @@
+"""
+Sampled, approximate EDA for the correlation heatmap and the pairplot.
+
+The exploratory scripts have the log_votes pairplot commented out because a kde/
+scatter pairplot over every row of the training weeks is too slow to wait for, and
+a corr() over the 360+ numeric columns isn't quick either. Here the correlations are
+accumulated chunk by chunk from float32 matrix products (pairwise complete like
+pandas' corr, so missing values don't drop whole rows), the scatter and KDE panels
+are drawn from a reservoir sample of at most sample_size rows (optionally
+stratified, e.g. by conference) and everything is drawn on plain matplotlib Figures
+and written to files, no window or pyplot state involved. Both happen in the same
+single read of the CSV, so the time depends on the sample size and the number of
+columns rather than the number of rows.
+
+    python -m ap_poll eda TRAIN.csv -o eda --pairplot-columns log_votes lagged_log_votes cumulative_games_won
+
+This module is a deliberate copy of
+kaggle_postHCT_survival/scripts/hct_survival/eda.py.
+The two projects run from their own folders and don't import each other,
+only the docstrings differ, so a fix to one goes into both.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+
+class StreamingCorrelation:
+    """
+    Pairwise complete Pearson correlations of numeric columns, fed one chunk at a time.
+
+    Every chunk adds four float32 matrix products (pair counts, sums, sums of squares and
+    cross products over the rows where both columns are present) to float64 totals. The
+    values are shifted by the first chunk's means first, which keeps float32 from losing
+    the variance to cancellation.
+
+    Args:
+        columns: Columns to correlate, every numeric column of the first chunk by default.
+        dtype: Dtype of the per chunk products.
+    """
+
+    def __init__(self, columns=None, dtype=np.float32):
+        self.columns = None if columns is None else list(columns)
+        self.dtype = dtype
+        self.n_rows = 0
+        self._shift = None
+
+    def update(self, chunk):
+        """
+        Adds a chunk of rows (DataFrame).
+        """
+        if self.columns is None:
+            self.columns = [col for col in chunk.select_dtypes(include='number').columns
+                            if not pd.api.types.is_bool_dtype(chunk[col])]
+        values = chunk[self.columns].to_numpy(dtype=np.float64)
+        observed = ~np.isnan(values)
+
+        if self._shift is None:
+            n_columns = len(self.columns)
+            with np.errstate(invalid='ignore'):
+                self._shift = np.nan_to_num(np.nanmean(values, axis=0)) if len(values) else np.zeros(n_columns)
+            self._pairs, self._sums, self._squares, self._cross = (np.zeros((n_columns, n_columns))
+                                                                   for _ in range(4))
+
+        centered = np.where(observed, values - self._shift, 0).astype(self.dtype)
+        self._cross += centered.T @ centered
+        if observed.all():
+            # nothing missing, every pair is present on every row
+            self._pairs += len(values)
+            self._sums += centered.sum(axis=0, dtype=np.float64)[:, None]
+            self._squares += (centered * centered).sum(axis=0, dtype=np.float64)[:, None]
+        else:
+            present = observed.astype(self.dtype)
+            self._pairs += present.T @ present
+            self._sums += centered.T @ present
+            self._squares += (centered * centered).T @ present
+        self.n_rows += len(values)
+
+        return self
+
+    def corr(self, min_periods=2):
+        """
+        The correlation matrix as a DataFrame, NaN where a pair has fewer than min_periods rows or no spread.
+        """
+        if self._shift is None:
+            return pd.DataFrame(index=self.columns, columns=self.columns, dtype=np.float64)
+
+        pairs = np.where(self._pairs >= max(min_periods, 1), self._pairs, np.nan)
+        # sums[i, j] is the sum of column i over the rows where j is present too
+        with np.errstate(invalid='ignore', divide='ignore'):
+            covariance = self._cross - self._sums * self._sums.T / pairs
+            spread = (self._squares - self._sums ** 2 / pairs) * (self._squares.T - self._sums.T ** 2 / pairs)
+            corr = np.clip(covariance / np.sqrt(np.where(spread > 0, spread, np.nan)), -1, 1)
+        np.fill_diagonal(corr, np.where(np.isnan(np.diag(corr)), np.nan, 1.0))
+
+        return pd.DataFrame(corr, index=self.columns, columns=self.columns)
+
+
+class ReservoirSampler:
+    """
+    A uniform sample of at most n rows from a stream of chunks, optionally per stratum.
+
+    Each row gets a random key and the n smallest keys are kept (the same distribution as
+    Algorithm R, one vectorized step per chunk). With stratify every stratum keeps its own
+    reservoir and sample() splits n over the strata in proportion to their row counts,
+    at least one row each, so small groups still show up in the panels.
+
+    Args:
+        n: Rows to keep.
+        stratify: Column to stratify on.
+        random_state: Seed for the keys.
+    """
+
+    def __init__(self, n=5000, stratify=None, random_state=0):
+        self.n = n
+        self.stratify = stratify
+        self.random_state = random_state
+        self.n_seen = 0
+        self._rng = np.random.default_rng(random_state)
+        self._reservoirs = {}
+        self._counts = {}
+
+    def update(self, chunk):
+        """
+        Offers a chunk of rows (DataFrame) to the sample.
+        """
+        keys = self._rng.random(len(chunk))
+        if self.stratify is None:
+            strata, codes = [None], np.zeros(len(chunk), dtype=np.intp)
+        else:
+            codes, strata = pd.factorize(chunk[self.stratify].astype(object).fillna('missing'))
+
+        for code, stratum in enumerate(strata):
+            in_stratum = codes == code
+            self._counts[stratum] = self._counts.get(stratum, 0) + int(in_stratum.sum())
+            positions = np.flatnonzero(in_stratum)
+            # settle which keys survive in numpy first, so only the rows that go in get copied
+            if len(positions) > self.n:
+                positions = positions[np.argpartition(keys[positions], self.n - 1)[:self.n]]
+            kept, kept_keys = self._reservoirs.get(stratum, (None, np.empty(0)))
+            if len(kept_keys) + len(positions) > self.n:
+                cutoff = np.partition(np.concatenate([kept_keys, keys[positions]]), self.n - 1)[self.n - 1]
+                if kept is not None:
+                    kept, kept_keys = kept[kept_keys <= cutoff], kept_keys[kept_keys <= cutoff]
+                positions = positions[keys[positions] <= cutoff]
+
+            positions = np.sort(positions)
+            offered = chunk.iloc[positions]
+            self._reservoirs[stratum] = (offered if kept is None else pd.concat([kept, offered]),
+                                         np.concatenate([kept_keys, keys[positions]]))
+        self.n_seen += len(chunk)
+
+        return self
+
+    def sample(self):
+        """
+        The sampled rows, in the order they were read.
+        """
+        if not self._reservoirs:
+            return pd.DataFrame()
+
+        total = sum(self._counts.values())
+        parts = []
+        for stratum, (rows, keys) in self._reservoirs.items():
+            share = max(1, int(round(self.n * self._counts[stratum] / total))) if self.stratify is not None \
+                else self.n
+            parts.append(rows.iloc[np.sort(np.argsort(keys)[:share])] if len(rows) > share else rows)
+
+        sample = pd.concat(parts)
+
+        return sample.sort_index() if sample.index.is_unique else sample
+
+
+def _iter_chunks(source, chunk_size, read_csv_kwargs):
+    if isinstance(source, pd.DataFrame):
+        for start in range(0, max(len(source), 1), chunk_size):
+            yield source.iloc[start:start + chunk_size]
+    else:
+        yield from pd.read_csv(source, chunksize=chunk_size, **read_csv_kwargs)
+
+
+def scan(source, columns=None, sample_size=5000, stratify=None, chunk_size=50_000, random_state=0,
+         **read_csv_kwargs):
+    """
+    One pass over a CSV (or DataFrame) for the correlations and the plotting sample.
+
+    Args:
+        source: CSV path or DataFrame.
+        columns: Numeric columns to correlate, all of them by default.
+        sample_size: Cap on the rows kept for the scatter and KDE panels, 0 skips the sample.
+        stratify: Column to stratify the sample on, e.g. 'conference'.
+        chunk_size: Rows read and multiplied at a time.
+        random_state: Seed for the sample.
+        read_csv_kwargs: Passed to pd.read_csv.
+
+    Returns:
+        (correlation DataFrame, sample DataFrame or None)
+    """
+    correlation = StreamingCorrelation(columns=columns)
+    sampler = ReservoirSampler(n=sample_size, stratify=stratify, random_state=random_state) if sample_size else None
+    for chunk in _iter_chunks(source, chunk_size, read_csv_kwargs):
+        correlation.update(chunk)
+        if sampler is not None:
+            sampler.update(chunk)
+
+    return correlation.corr(), None if sampler is None else sampler.sample()
+
+
+def correlation_heatmap(corr, path, annot=None, title='Correlation Matrix'):
+    """
+    Draws a correlation heatmap to a file.
+
+    Args:
+        corr: Correlation DataFrame.
+        path: Image file.
+        annot: Write the values in the cells, by default only up to 30 columns (past that
+            the text is unreadable and most of the drawing time).
+    """
+    import seaborn as sns
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    n_columns = len(corr)
+    annot = n_columns <= 30 if annot is None else annot
+    # capped, hundreds of columns would otherwise make an image too big to open
+    size = min(max(6.0, 0.45 * n_columns), 40.0)
+    fig = Figure(figsize=(size * 1.25, size))
+    # an explicit Agg canvas, without one every text measurement (seaborn checks each tick label
+    # for overlaps) builds a new full size renderer
+    FigureCanvasAgg(fig)
+    ax = fig.subplots()
+    # every column labelled up to 100, past that every n-th (drawing the tick labels is most of the time)
+    label_step = -(-n_columns // 100)
+    sns.heatmap(corr, annot=annot, cmap='coolwarm', fmt='.2f', vmin=-1, vmax=1, ax=ax, xticklabels=label_step,
+                yticklabels=label_step)
+    ax.tick_params(labelsize=min(10.0, max(3.0, 20 * size * label_step / max(n_columns, 1))))
+    ax.set_title(title)
+    fig.tight_layout()
+    fig.savefig(path, dpi=100)
+
+    return path
+
+
+def _density(values, grid):
+    from scipy.stats import gaussian_kde
+
+    return gaussian_kde(values)(grid)
+
+
+def sampled_pairplot(sample, path, columns=None, hue=None, kde=True, height=1.8):
+    """
+    A corner pairplot (scatter below the diagonal, KDE on it) of the sampled rows, drawn to a file.
+
+    Args:
+        sample: Sampled rows, see ReservoirSampler.
+        path: Image file.
+        columns: Numeric columns to plot, every numeric column by default.
+        hue: Column to colour the points by, e.g. the stratify column.
+        kde: KDE on the diagonal, False draws histograms.
+        height: Inches per panel.
+    """
+    from matplotlib import colormaps
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    from matplotlib.lines import Line2D
+    from matplotlib.ticker import MaxNLocator
+
+    columns = list(sample.select_dtypes(include='number').columns) if columns is None else list(columns)
+    n_columns = len(columns)
+    fig = Figure(figsize=(height * n_columns, height * n_columns))
+    FigureCanvasAgg(fig)
+    grid_spec = fig.add_gridspec(n_columns, n_columns)
+
+    hue_values = pd.Series('all', index=sample.index) if hue is None else sample[hue].astype(object).fillna('missing')
+    levels = list(pd.unique(hue_values))
+    palette = {level: colormaps['tab10'](position % 10) for position, level in enumerate(levels)}
+    # one scatter call per panel with a colour per point, a call per level multiplies the artists
+    colors = np.asarray([palette[level] for level in hue_values])
+    values = sample[columns].to_numpy(dtype=np.float64)
+
+    # only the lower triangle gets axes, setting up axes (and their ticks) is most of the cost of a big grid
+    bottom_row = {}
+    for i in reversed(range(n_columns)):
+        for j in range(i + 1):
+            ax = fig.add_subplot(grid_spec[i, j], sharex=bottom_row.get(j))
+            bottom_row.setdefault(j, ax)
+            ax.xaxis.set_major_locator(MaxNLocator(3))
+            ax.yaxis.set_major_locator(MaxNLocator(3))
+
+            if i == j:
+                for level in levels:
+                    column = values[(hue_values == level).to_numpy(), j]
+                    column = column[~np.isnan(column)]
+                    if kde and len(column) > 1 and np.ptp(column) > 0:
+                        grid = np.linspace(column.min(), column.max(), 200)
+                        density = _density(column, grid)
+                        ax.fill_between(grid, density, color=palette[level], alpha=0.15, linewidth=0)
+                        ax.plot(grid, density, color=palette[level], linewidth=1)
+                    elif len(column):
+                        ax.hist(column, bins=30, color=palette[level], histtype='step')
+                ax.set_yticks([])
+            else:
+                both = ~np.isnan(values[:, j]) & ~np.isnan(values[:, i])
+                # rasterized, thousands of vector markers make big files that are slow to save
+                ax.scatter(values[both, j], values[both, i], s=4, alpha=0.4, c=colors[both], linewidths=0,
+                           rasterized=True)
+
+            ax.set_xlabel(columns[j] if i == n_columns - 1 else '')
+            ax.set_ylabel(columns[i] if j == 0 and i > 0 else '')
+            ax.tick_params(labelsize=7, labelbottom=i == n_columns - 1, labelleft=j == 0 and i > 0)
+
+    if hue is not None:
+        handles = [Line2D([], [], marker='o', linestyle='', color=palette[level], label=level) for level in levels]
+        fig.legend(handles=handles, title=hue, loc='upper right')
+    fig.suptitle(f"{len(sample)} sampled rows")
+    # fixed margins, tight_layout over a grid of panels costs more than drawing them
+    fig.subplots_adjust(left=0.06, right=0.98, bottom=0.06, top=0.95, wspace=0.08, hspace=0.08)
+    fig.savefig(path, dpi=100)
+
+    return path
+
+
+def run_eda(source, output_dir, columns=None, pairplot_columns=None, max_pairplot_columns=12, sample_size=5000,
+            stratify=None, chunk_size=50_000, random_state=0, **read_csv_kwargs):
+    """
+    Correlations, heatmap and pairplot of a CSV in one pass, written to output_dir.
+
+    Args:
+        source: CSV path or DataFrame.
+        output_dir: Folder for corr.csv, corr.png, sample.csv and pairplot.png.
+        columns: Numeric columns for the correlations, all by default.
+        pairplot_columns: Columns for the pairplot, by default the first max_pairplot_columns
+            correlation columns. Each column adds a row of panels, so this is the knob when the
+            plot is slow.
+        max_pairplot_columns: Cap on the default pairplot columns.
+        sample_size, stratify, chunk_size, random_state: See scan().
+
+    Returns:
+        Dict of the written files.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    corr, sample = scan(source, columns=columns, sample_size=sample_size, stratify=stratify,
+                        chunk_size=chunk_size, random_state=random_state, **read_csv_kwargs)
+
+    paths = {
+        'corr_csv': os.path.join(output_dir, 'corr.csv'),
+        'sample_csv': os.path.join(output_dir, 'sample.csv'),
+        'heatmap': os.path.join(output_dir, 'corr.png'),
+        'pairplot': os.path.join(output_dir, 'pairplot.png')
+    }
+    corr.to_csv(paths['corr_csv'])
+    sample.to_csv(paths['sample_csv'], index=False)
+    correlation_heatmap(corr, paths['heatmap'])
+    pairplot_columns = list(corr.columns[:max_pairplot_columns]) if pairplot_columns is None else pairplot_columns
+    sampled_pairplot(sample, paths['pairplot'], columns=pairplot_columns, hue=stratify)
+
+    return paths
@@ -0,0 +1,114 @@
+"""
+Team dummy coding with a vocabulary learned from the training weeks.
+
+pd.get_dummies on the test week only knows the teams playing that week, so the
+scripts patched the missing team columns back in one at a time. CategoryEncoder
+learns every pos_team once, always returns the same columns, and puts teams it has
+never seen in an explicit "pos_team_Unknown_value" column, so a week (or a single
+team) can be encoded on its own.
+"""
+import numpy as np
+import pandas as pd
+
+UNKNOWN_VALUE = 'Unknown_value'
+
+
+class CategoryEncoder:
+    """
+    One-hot encoder with a fixed vocabulary and an unknown bucket.
+
+    Args:
+        columns: Columns to encode, e.g. ['pos_team'].
+        drop_first: Drop the first (sorted) level like get_dummies(drop_first=True).
+    """
+
+    def __init__(self, columns=('pos_team',), drop_first=True):
+        self.columns = list(columns)
+        self.drop_first = drop_first
+
+    def fit(self, df):
+        self.categories_ = {col: sorted(df[col].dropna().astype(str).unique()) for col in self.columns}
+        self._build_layout()
+
+        return self
+
+    def transform(self, df):
+        """
+        Encodes a batch into a pre-allocated uint8 array, one vectorized lookup per column.
+        """
+        if not hasattr(self, 'categories_'):
+            raise ValueError("CategoryEncoder is not fitted yet, call fit first")
+
+        out = np.zeros((len(df), self.n_features_out_), dtype=np.uint8)
+        rows = np.arange(len(df))
+        first = 1 if self.drop_first else 0
+
+        for col, offset, unknown_idx in zip(self.columns, self._offsets, self._unknown_idx):
+            values = df[col]
+            codes = pd.Categorical(values.astype(str).where(values.notna()),
+                                   categories=self.categories_[col]).codes.astype(np.intp)
+
+            known = codes >= first
+            out[rows[known], offset + codes[known] - first] = 1
+            out[codes < 0, unknown_idx] = 1
+
+        return out
+
+    def transform_row(self, record):
+        """
+        Encodes a single record (dict or Series) without building a DataFrame.
+        """
+        out = np.zeros(self.n_features_out_, dtype=np.uint8)
+        first = 1 if self.drop_first else 0
+
+        for col, offset, unknown_idx in zip(self.columns, self._offsets, self._unknown_idx):
+            value = record.get(col)
+            code = None if value is None or value != value else self._lookup[col].get(str(value))
+
+            if code is None:
+                out[unknown_idx] = 1
+            elif code >= first:
+                out[offset + code - first] = 1
+
+        return out
+
+    def fit_transform(self, df):
+        return self.fit(df).transform(df)
+
+    def transform_frame(self, df):
+        """
+        Drop in for pd.get_dummies(df, columns=..., drop_first=True), same column order every time.
+        """
+        dummies = pd.DataFrame(self.transform(df), index=df.index, columns=self.feature_names_out_)
+
+        return pd.concat([df.drop(columns=self.columns), dummies], axis=1)
+
+    def to_dict(self):
+        return {'drop_first': self.drop_first, 'categories': self.categories_}
+
+    @classmethod
+    def from_dict(cls, state):
+        encoder = cls(columns=list(state['categories']), drop_first=state['drop_first'])
+        encoder.categories_ = state['categories']
+        encoder._build_layout()
+
+        return encoder
+
+    def _build_layout(self):
+        # each column gets its kept levels, then its unknown bucket
+        names, offsets, unknown_idx = [], [], []
+        self._lookup = {}
+
+        for col in self.columns:
+            levels = self.categories_[col]
+            self._lookup[col] = {level: code for code, level in enumerate(levels)}
+
+            offsets.append(len(names))
+            names += [f"{col}_{level}" for level in (levels[1:] if self.drop_first else levels)]
+            unknown_idx.append(len(names))
+            names.append(f"{col}_{UNKNOWN_VALUE}")
+
+        self._offsets = offsets
+        self._unknown_idx = unknown_idx
+        self.feature_names_out_ = names
+        self.n_features_out_ = len(names)
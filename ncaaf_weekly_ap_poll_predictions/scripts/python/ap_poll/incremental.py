@@ -0,0 +1,269 @@
+"""
+Weekly incremental retraining for the AP vote model.
+
+Every week adds one week of games (~134 rows) to full_train_data.csv, and the
+script re-reads all of it and trains 100 epochs from scratch. Instead, a
+checkpoint folder keeps last week's model, the fitted scaler and team encoder,
+and the encoded training rows as one .npy shard per week. incremental_update
+encodes just the new rows with the saved scaler, appends them as a new shard and
+fine-tunes for a few epochs on the new week plus a replay sample of older weeks.
+
+If the new week looks different from what the model was trained on (features
+drifted, lots of unseen teams, or the model's loss on the new rows blew up) it
+falls back to a full retrain instead, after making sure the new week is in the
+training CSV it retrains from.
+
+Each update saves the model (and a full retrain its shard folder) under a new
+name and only then rewrites state.json to point at it, so a crash part way leaves
+the previous checkpoint intact.
+"""
+import glob
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from .data import DROP_COLUMNS, TARGET_COLUMN, load_prepared_data
+from .encoding import CategoryEncoder
+from .training import DEFAULT_CONFIG, build_model
+
+MODEL_FILE = 'model.keras'
+SHARD_DIR = 'shards'
+STATE_FILE = 'state.json'
+ROW_KEYS = ('year', 'week', 'pos_team')
+
+
+def _shard_paths(checkpoint_dir, week, shard_dir=SHARD_DIR):
+    return (os.path.join(checkpoint_dir, shard_dir, f"week_{week:03d}_x.npy"),
+            os.path.join(checkpoint_dir, shard_dir, f"week_{week:03d}_y.npy"))
+
+
+def _write_shard(checkpoint_dir, week, x, y, shard_dir=SHARD_DIR):
+    x_path, y_path = _shard_paths(checkpoint_dir, week, shard_dir)
+    os.makedirs(os.path.dirname(x_path), exist_ok=True)
+    np.save(x_path, np.asarray(x, dtype=np.float32))
+    np.save(y_path, np.asarray(y, dtype=np.float32))
+
+
+def _load_state(checkpoint_dir):
+    """The checkpoint's state.json, None before the first full_retrain."""
+    if not os.path.exists(os.path.join(checkpoint_dir, STATE_FILE)):
+        return None
+    with open(os.path.join(checkpoint_dir, STATE_FILE)) as f:
+        return json.load(f)
+
+
+def _save_state(checkpoint_dir, state):
+    tmp_path = os.path.join(checkpoint_dir, STATE_FILE + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, os.path.join(checkpoint_dir, STATE_FILE))
+
+
+def _model_path(checkpoint_dir, state):
+    return os.path.join(checkpoint_dir, state.get('model_file', MODEL_FILE))
+
+
+def _remove_stale_files(checkpoint_dir, state):
+    # only called once state.json points elsewhere, so nothing removed here is still in use
+    for path in glob.glob(os.path.join(checkpoint_dir, 'model*.keras')):
+        if os.path.basename(path) != state['model_file']:
+            os.remove(path)
+    for path in glob.glob(os.path.join(checkpoint_dir, SHARD_DIR + '*')):
+        if os.path.isdir(path) and os.path.basename(path) != state['shard_dir']:
+            shutil.rmtree(path)
+
+
+def add_rows_to_csv(train_path, new_rows_df, keys=ROW_KEYS):
+    """
+    Appends the rows of new_rows_df that train_path doesn't have yet, matched on keys.
+
+    Returns:
+        Number of rows appended.
+    """
+    header = pd.read_csv(train_path, nrows=0).columns
+    missing = [col for col in list(keys) + list(header) if col not in new_rows_df.columns]
+    if missing:
+        raise ValueError(f"new rows lack the {sorted(set(missing))} columns of {train_path}, "
+                         f"add them to the CSV before retraining")
+
+    existing = pd.read_csv(train_path, usecols=list(keys)).astype(str).drop_duplicates()
+    new_keys = new_rows_df[list(keys)].astype(str)
+    seen = new_keys.merge(existing, on=list(keys), how='left', indicator=True)['_merge'].to_numpy() == 'both'
+
+    to_add = new_rows_df.loc[~seen, list(header)]
+    if len(to_add):
+        to_add.to_csv(train_path, mode='a', header=False, index=False)
+
+    return len(to_add)
+
+
+def full_retrain(train_path, test_path, checkpoint_dir, config=None, drop_columns=DROP_COLUMNS,
+                 cache_dir='data_cache', validation_fraction=0.2):
+    """
+    Trains from scratch on the full CSV and writes a fresh checkpoint.
+
+    Returns:
+        The checkpoint state dict.
+    """
+    from .input_pipeline import make_datasets
+
+    config = dict(DEFAULT_CONFIG, **(config or {}))
+    data = load_prepared_data(train_path, test_path, drop_columns=drop_columns, cache_dir=cache_dir)
+
+    model = build_model(data.x_train.shape[1], hidden_units=config['hidden_units'], activation=config['activation'],
+                        l2=config['l2'], learning_rate=config['learning_rate'])
+    train_ds, val_ds = make_datasets(data.x_train, data.y_train, batch_size=config['batch_size'],
+                                     validation_fraction=validation_fraction, seed=config['seed'])
+    history = model.fit(train_ds, epochs=config['epochs'], validation_data=val_ds, verbose=0)
+
+    # a new generation: model and shard folder under new names (the scaler changed, so the old shards
+    # don't match anymore), state.json last and only then the old generation goes
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    previous = _load_state(checkpoint_dir)
+    generation = previous.get('generation', 0) + 1 if previous is not None else 0
+    model_file = f"model_full_{generation:03d}.keras"
+    shard_dir = f"{SHARD_DIR}_{generation:03d}"
+
+    model.save(os.path.join(checkpoint_dir, model_file))
+    # a folder left behind by a crashed retrain of the same generation is started over
+    shutil.rmtree(os.path.join(checkpoint_dir, shard_dir), ignore_errors=True)
+    _write_shard(checkpoint_dir, 0, data.x_train, data.y_train, shard_dir)
+
+    state = {
+        'generation': generation,
+        'model_file': model_file,
+        'shard_dir': shard_dir,
+        'config': {key: list(value) if isinstance(value, tuple) else value for key, value in config.items()},
+        'drop_columns': list(drop_columns),
+        'feature_names': data.feature_names,
+        'scaled_columns': data.scaled_columns,
+        'scaler_mean': data.scaler_mean.tolist(),
+        'scaler_scale': data.scaler_scale.tolist(),
+        'encoder': data.encoder.to_dict(),
+        'baseline_val_mse': float(history.history['val_mse'][-1]),
+        'n_weeks': 1,
+        'n_rows': int(data.x_train.shape[0]),
+        'updates': [{'mode': 'full', 'rows': int(data.x_train.shape[0])}]
+    }
+    _save_state(checkpoint_dir, state)
+    _remove_stale_files(checkpoint_dir, state)
+
+    return state
+
+
+def encode_rows(state, rows_df):
+    """
+    Scales and dummy codes new rows with the scaler and encoder saved in the checkpoint.
+    """
+    encoder = CategoryEncoder.from_dict(state['encoder'])
+    scaled = (rows_df[state['scaled_columns']].to_numpy(dtype=np.float64) - np.asarray(state['scaler_mean'])) \
+        / np.asarray(state['scaler_scale'])
+
+    return np.hstack([scaled, encoder.transform(rows_df)]).astype(np.float32)
+
+
+def drift_report(state, x_new, y_new, model):
+    """
+    How different the new rows are from the training data.
+
+    Returns:
+        dict with feature_shift (mean absolute standardized mean of the scaled columns, ~0 when nothing moved),
+        unknown_team_share (rows whose team wasn't in train) and loss_ratio (model MSE on the new rows
+        over its validation MSE at the last full retrain).
+    """
+    n_scaled = len(state['scaled_columns'])
+    unknown_columns = [idx for idx, name in enumerate(state['feature_names']) if name.endswith('_Unknown_value')]
+
+    predictions = model.predict(x_new, verbose=0).ravel()
+    new_mse = float(np.mean((predictions - y_new) ** 2))
+
+    return {
+        'feature_shift': float(np.abs(x_new[:, :n_scaled].mean(axis=0)).mean()),
+        'unknown_team_share': float(x_new[:, unknown_columns].max(axis=1).mean()) if unknown_columns else 0.0,
+        'new_rows_mse': new_mse,
+        'loss_ratio': new_mse / state['baseline_val_mse'] if state['baseline_val_mse'] > 0 else float('inf')
+    }
+
+
+def incremental_update(checkpoint_dir, new_rows_df, epochs=5, replay_rows=4096, batch_size=None,
+                       max_feature_shift=0.5, max_unknown_share=0.1, max_loss_ratio=3.0,
+                       train_path=None, test_path=None, cache_dir='data_cache', seed=0):
+    """
+    Adds a week of labelled rows to the checkpoint and fine-tunes on it.
+
+    Args:
+        checkpoint_dir: Folder written by full_retrain.
+        new_rows_df: The new week's rows, log_votes included (e.g. last week's test data now that the poll is out).
+        epochs: Fine tuning epochs.
+        replay_rows: Older rows mixed into the fine tuning so the model doesn't forget earlier weeks.
+        batch_size: Defaults to the checkpoint's config.
+        max_feature_shift, max_unknown_share, max_loss_ratio: Drift limits, any one exceeded means a full retrain.
+        train_path, test_path: Full CSVs for the fallback retrain, required for it to happen. New rows
+            that aren't in train_path yet (matched on year, week and pos_team) are appended to it first.
+        cache_dir: Data cache for the fallback retrain.
+        seed: Seed for the replay sample.
+
+    Returns:
+        dict with mode ("incremental" or "full") and the drift report.
+    """
+    from tensorflow import keras
+
+    state = _load_state(checkpoint_dir)
+    if state is None:
+        raise FileNotFoundError(f"No checkpoint in {checkpoint_dir}, run full_retrain first")
+    model = keras.models.load_model(_model_path(checkpoint_dir, state))
+
+    x_new = encode_rows(state, new_rows_df)
+    y_new = new_rows_df[TARGET_COLUMN].to_numpy(dtype=np.float32)
+
+    report = drift_report(state, x_new, y_new, model)
+    drifted = (report['feature_shift'] > max_feature_shift
+               or report['unknown_team_share'] > max_unknown_share
+               or report['loss_ratio'] > max_loss_ratio)
+
+    if drifted:
+        if train_path is None or test_path is None:
+            raise ValueError(f"New rows drifted ({report}), pass train_path and test_path to retrain from scratch")
+
+        # the retrain reads the CSV, so the week that triggered it has to be in there
+        add_rows_to_csv(train_path, new_rows_df)
+        full_retrain(train_path, test_path, checkpoint_dir, config=state['config'],
+                     drop_columns=state['drop_columns'], cache_dir=cache_dir)
+        return {'mode': 'full', 'drift': report}
+
+    # replay sample from the older weekly shards, read through memory maps
+    rng = np.random.default_rng(seed + state['n_weeks'])
+    replay_x, replay_y = [], []
+    per_week = max(1, replay_rows // state['n_weeks'])
+    for week in range(state['n_weeks']):
+        x_path, y_path = _shard_paths(checkpoint_dir, week, state.get('shard_dir', SHARD_DIR))
+        x_old = np.load(x_path, mmap_mode='r')
+        y_old = np.load(y_path, mmap_mode='r')
+        idx = np.sort(rng.choice(len(x_old), size=min(per_week, len(x_old)), replace=False))
+        replay_x.append(x_old[idx])
+        replay_y.append(y_old[idx])
+
+    x_fit = np.concatenate(replay_x + [x_new])
+    y_fit = np.concatenate(replay_y + [y_new])
+
+    model.fit(x_fit, y_fit, epochs=epochs, batch_size=batch_size or state['config']['batch_size'],
+              shuffle=True, verbose=0)
+
+    # model and shard under new names first, state.json last: until it is replaced the old checkpoint stands
+    # and a rerun starts from it, a shard left behind by a crash is simply overwritten
+    model_file = f"model_week_{state['n_weeks']:03d}.keras"
+    model.save(os.path.join(checkpoint_dir, model_file))
+    _write_shard(checkpoint_dir, state['n_weeks'], x_new, y_new, state.get('shard_dir', SHARD_DIR))
+
+    state['model_file'] = model_file
+    state.setdefault('shard_dir', SHARD_DIR)
+    state['n_weeks'] += 1
+    state['n_rows'] += int(len(x_new))
+    state['updates'].append({'mode': 'incremental', 'rows': int(len(x_new)), 'drift': report})
+    _save_state(checkpoint_dir, state)
+    _remove_stale_files(checkpoint_dir, state)
+
+    return {'mode': 'incremental', 'drift': report}
@@ -0,0 +1,81 @@
+"""
+tf.data input pipeline for the AP vote model.
+
+model.fit(x_train_encoded, ...) turns the whole DataFrame into one tensor before
+the first batch, and batch_size=32 keeps the GPU/CPU mostly waiting. Here the
+(cached, memory mapped) training matrix is read a chunk at a time, shuffled
+through a buffer, batched and prefetched while the previous batch trains. The
+validation rows are split off once up front, the same last 20% validation_split
+would have used, and served as their own dataset.
+"""
+import numpy as np
+import tensorflow as tf
+
+
+def _chunk_generator(x, y, start, stop, chunk_rows, shuffle, seed):
+    def generate():
+        starts = np.arange(start, stop, chunk_rows)
+
+        # shuffle the chunk order each epoch, the buffer shuffles rows within and across chunks
+        if shuffle:
+            generate.epoch += 1
+            np.random.default_rng(seed + generate.epoch).shuffle(starts)
+
+        for chunk_start in starts:
+            chunk_stop = min(chunk_start + chunk_rows, stop)
+            yield (np.asarray(x[chunk_start:chunk_stop], dtype=np.float32),
+                   np.asarray(y[chunk_start:chunk_stop], dtype=np.float32))
+
+    generate.epoch = 0
+
+    return generate
+
+
+def _chunked_dataset(x, y, start, stop, batch_size, chunk_rows, shuffle_buffer, seed):
+    n_features = x.shape[1]
+    signature = (
+        tf.TensorSpec(shape=(None, n_features), dtype=tf.float32),
+        tf.TensorSpec(shape=(None,), dtype=tf.float32)
+    )
+
+    dataset = tf.data.Dataset.from_generator(
+        _chunk_generator(x, y, start, stop, chunk_rows, shuffle_buffer > 0, seed),
+        output_signature=signature
+    )
+    dataset = dataset.unbatch().apply(tf.data.experimental.assert_cardinality(stop - start))
+
+    if shuffle_buffer > 0:
+        dataset = dataset.shuffle(shuffle_buffer, seed=seed, reshuffle_each_iteration=True)
+
+    return dataset.batch(batch_size).prefetch(tf.data.AUTOTUNE)
+
+
+def make_datasets(x, y, batch_size=256, validation_fraction=0.2, shuffle_buffer=10000, chunk_rows=4096, seed=0):
+    """
+    Streaming train and validation datasets for model.fit.
+
+    Args:
+        x: Feature matrix, a memory map from load_prepared_data works best since only one chunk is read at a time.
+        y: Targets (log_votes).
+        batch_size: Rows per training batch, the validation set uses 4x this.
+        validation_fraction: Share of rows held out for validation, taken from the end like validation_split.
+        shuffle_buffer: Rows in the shuffle buffer, 0 turns shuffling off.
+        chunk_rows: Rows read from x per step.
+        seed: Shuffle seed.
+
+    Returns:
+        (train_dataset, validation_dataset), validation_dataset is None if validation_fraction is 0.
+    """
+    n_rows = x.shape[0]
+    y = np.asarray(y)
+    n_val = int(round(n_rows * validation_fraction))
+    n_train = n_rows - n_val
+
+    train_dataset = _chunked_dataset(x, y, 0, n_train, batch_size, chunk_rows, shuffle_buffer, seed)
+
+    if n_val == 0:
+        return train_dataset, None
+
+    validation_dataset = _chunked_dataset(x, y, n_train, n_rows, batch_size * 4, chunk_rows, 0, seed)
+
+    return train_dataset, validation_dataset
@@ -0,0 +1,220 @@
+"""
+Headless rendering of the training diagnostics.
+
+plot_training_history in the exploratory scripts ends in plt.show(), so a run
+stops until the window is closed and a sweep's curves can only be looked at one at
+a time. Here a plot is first described as a spec, a plain dict of panels, lines and
+an optional table (history_spec from a keras history, sweep_spec from run_sweep's
+results), which pickles cheaply. render() draws a spec on an Agg canvas and writes
+PNG and/or HTML (the PNG inline plus the table), and PlotQueue does the same in a
+pool of worker processes, so training carries on while the plots are drawn:
+
+    with PlotQueue('plots', formats=('png', 'html')) as plots:
+        history = tf_model.fit(train_ds, epochs=100, validation_data=val_ds)
+        plots.submit(history_spec(history.history, 'training_history'))
+    print(plots.paths)
+
+run_sweep(plot_dir=...) queues every run's curves as soon as that run finishes.
+"""
+import base64
+import html
+import io
+import multiprocessing
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import pandas as pd
+
+METRIC_TITLES = {'loss': 'Loss', 'mae': 'Mean Absolute Error (MAE)', 'mse': 'Mean Squared Error (MSE)'}
+
+
+def _floats(values):
+    return [None if pd.isna(value) else float(value) for value in values]
+
+
+def sweep_spec(results, name, top=10, metric='val_loss', title=None):
+    """
+    The validation curves of the best runs of a sweep in one panel, plus the leaderboard table.
+
+    Args:
+        results: The result dicts of run_sweep (or train_config).
+        name: File name of the plot, without extension.
+        top: Runs drawn, best first by their best value of metric.
+        metric: History key to compare on.
+        title: Figure title.
+    """
+    ranked = sorted(results, key=lambda result: min(result['history'][metric]))[:top]
+    lines = []
+    for rank, result in enumerate(ranked, start=1):
+        values = result['history'][metric]
+        config = result['config']
+        lines.append({'x': list(range(1, len(values) + 1)), 'y': _floats(values),
+                      'label': f"#{rank} {config['hidden_units']} lr {config['learning_rate']} l2 {config['l2']}"})
+    table = pd.DataFrame([{**{key: str(value) for key, value in result['config'].items()},
+                           'best_' + metric: min(result['history'][metric]),
+                           'epochs_run': len(result['history'][metric])} for result in ranked])
+
+    return {'name': name, 'title': title, 'panels': [{'title': f"{metric}, top {len(ranked)} runs",
+                                                      'xlabel': 'Epochs', 'ylabel': metric, 'lines': lines}],
+            'table': table}
+
+
+def history_spec(history, name, title=None):
+    """
+    Train and validation curves per metric, the plot_training_history panels of the exploratory scripts.
+
+    Args:
+        history: keras' History.history, {metric: [values]} with val_<metric> for the validation split.
+        name: File name of the plot, without extension.
+        title: Figure title.
+    """
+    history = pd.DataFrame(history)
+    epochs = pd.Series(range(1, len(history) + 1))
+
+    panels = []
+    for metric in history.columns:
+        if metric.startswith('val_'):
+            continue
+        label = metric.upper() if metric != 'loss' else 'Loss'
+        lines = [{'x': _floats(epochs), 'y': _floats(history[metric]), 'label': f"Train {label}"}]
+        if f"val_{metric}" in history:
+            lines.append({'x': _floats(epochs), 'y': _floats(history[f"val_{metric}"]), 'label': f"Val {label}",
+                          'linestyle': '--'})
+        panels.append({'title': METRIC_TITLES.get(metric, label), 'xlabel': 'Epochs', 'ylabel': label, 'lines': lines})
+
+    return {'name': name, 'title': title, 'panels': panels, 'table': history.assign(epoch=epochs.to_numpy())}
+
+
+def draw(fig, spec):
+    """
+    Draws a spec on a matplotlib Figure, one panel per axes side by side.
+    """
+    axs = fig.subplots(1, max(len(spec['panels']), 1), squeeze=False)[0]
+    for ax, panel in zip(axs, spec['panels']):
+        for line in panel['lines']:
+            ax.plot(line['x'], line['y'], label=line.get('label'), marker=line.get('marker'),
+                    linestyle=line.get('linestyle', '-'))
+        ax.set_title(panel.get('title', ''))
+        ax.set_xlabel(panel.get('xlabel', ''))
+        ax.set_ylabel(panel.get('ylabel', ''))
+        if any(line.get('label') for line in panel['lines']):
+            ax.legend(title=panel.get('legend'))
+        ax.grid(True)
+    if spec.get('title'):
+        fig.suptitle(spec['title'])
+
+    return fig
+
+
+def _write_html(path, spec, png):
+    title = html.escape(spec.get('title') or spec['name'])
+    table = '' if spec.get('table') is None else spec['table'].to_html(index=False, float_format=lambda v: f"{v:.4f}")
+    with open(path, 'w') as f:
+        f.write(f"<!DOCTYPE html>\n<html lang=\"en\">\n<head>\n<meta charset=\"utf-8\"/>\n<title>{title}</title>\n"
+                f"</head>\n<body>\n<h2>{title}</h2>\n"
+                f"<img src=\"data:image/png;base64,{base64.b64encode(png).decode('ascii')}\"/>\n"
+                f"{table}\n</body>\n</html>\n")
+
+
+def render(spec, output_dir, formats=('png',), dpi=100):
+    """
+    Draws a spec with the Agg backend and writes output_dir/<name>.<format> for every format.
+
+    Args:
+        spec: From history_spec, sweep_spec or a dict of the same shape.
+        output_dir: Folder for the files.
+        formats: 'png' and/or 'html' (the PNG embedded next to the spec's table).
+        dpi: Resolution of the PNG.
+
+    Returns:
+        The written paths.
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    n_panels = max(len(spec['panels']), 1)
+    fig = Figure(figsize=(min(10 * n_panels, 30), 6))
+    FigureCanvasAgg(fig)
+    draw(fig, spec)
+    fig.tight_layout()
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=dpi)
+    png = buffer.getvalue()
+
+    os.makedirs(output_dir, exist_ok=True)
+    paths = []
+    for extension in formats:
+        path = os.path.join(output_dir, f"{spec['name']}.{extension}")
+        if extension == 'png':
+            with open(path, 'wb') as f:
+                f.write(png)
+        elif extension == 'html':
+            _write_html(path, spec, png)
+        else:
+            raise ValueError(f"unknown plot format {extension!r}, use 'png' or 'html'")
+        paths.append(path)
+
+    return paths
+
+
+def _use_agg():
+    # nothing in a worker may try to open a window
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+class PlotQueue:
+    """
+    Renders plot specs in worker processes while the caller gets on with training.
+
+    Args:
+        output_dir: Folder for the files.
+        formats: 'png' and/or 'html'.
+        n_workers: Worker processes, 0 renders right away in this process.
+        dpi: Resolution of the PNGs.
+    """
+
+    def __init__(self, output_dir, formats=('png',), n_workers=2, dpi=100):
+        self.output_dir = output_dir
+        self.formats = tuple(formats)
+        self.n_workers = n_workers
+        self.dpi = dpi
+        self.futures = []
+        # spawn, the workers shouldn't inherit a half initialized GUI backend or TensorFlow
+        self._pool = ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context('spawn'),
+                                         initializer=_use_agg) if n_workers else None
+
+    def submit(self, spec):
+        """
+        Queues a spec and returns a Future of its paths.
+        """
+        if self._pool is not None:
+            future = self._pool.submit(render, spec, self.output_dir, self.formats, self.dpi)
+        else:
+            future = Future()
+            try:
+                future.set_result(render(spec, self.output_dir, self.formats, self.dpi))
+            except Exception as error:
+                future.set_exception(error)
+        self.futures.append(future)
+
+        return future
+
+    @property
+    def paths(self):
+        """
+        Every written file so far, waits for the queued plots to finish.
+        """
+        return [path for future in self.futures for path in future.result()]
+
+    def close(self, wait=True):
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait)
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,245 @@
+"""
+Predicted vs. actual AP ranking reports for many weeks in one go.
+
+The R script's print_output ranks one week's predictions against
+analytical_points, keeps the predicted top 25 and saves the gt table as
+team_rankings_comparison_<year>_week_<week>.html plus a webshot PNG, so every
+week is its own run. ranking_table does the ranking for any number of weeks with
+grouped ranks (no loop over weeks), ranking_summary scores each week (top 25
+overlap, mean absolute rank difference, exact hits), and write_reports draws the
+same table for every week as HTML and PNG, handing the weeks out in batches to a
+pool of worker processes:
+
+    predictions = pd.concat([pd.read_csv(path) for path in week_csvs])
+    paths = write_reports(predictions, '../../predictions')
+"""
+import html
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .plots import _use_agg
+
+TOP_N = 25
+WEEK_COLUMNS = ('year', 'week')
+
+# the gt table's look: 80 % wide, striped rows, red/green cells at alpha 0.5
+_STYLE = """body{background-color:white;font-family:system-ui,'Segoe UI',Roboto,Helvetica,Arial,sans-serif;}
+table{border-collapse:collapse;margin-left:auto;margin-right:auto;width:80%;color:#333333;font-size:16px;
+border-top:2px solid #A8A8A8;border-bottom:2px solid #A8A8A8;}
+caption{padding:4px;}
+caption .title{font-size:125%;padding:4px 5px;}
+caption .subtitle{font-size:85%;padding:3px 5px 5px 5px;border-bottom:2px solid #D3D3D3;}
+th{font-size:18px;font-weight:normal;padding:2px 5px;border-bottom:2px solid #D3D3D3;text-align:right;}
+td{padding:8px 5px;border-top:1px solid #D3D3D3;text-align:right;}
+th:first-child,td:first-child{text-align:left;}
+tbody tr:nth-child(even){background-color:rgba(128,128,128,0.05);}
+td.worse{background-color:rgba(255,0,0,0.5);}
+td.better{background-color:rgba(0,255,0,0.5);}"""
+
+_LABELS = {'pos_team': 'Team', 'Predicted_Rank': 'Predicted Rank', 'Actual_Rank': 'Actual Rank',
+           'Rank_Difference': 'Rank Difference'}
+
+
+def ranking_table(predictions, predicted='Predicted_Votes', actual='analytical_points', team='pos_team',
+                  top_n=TOP_N, by=WEEK_COLUMNS):
+    """
+    Predicted and actual ranks of every team within its week, like print_output in the R script.
+
+    Args:
+        predictions: One row per team and week, e.g. the predict output of several weeks stacked.
+        predicted: Column the predicted ranking comes from.
+        actual: Column the actual ranking comes from.
+        team: Team name column.
+        top_n: Teams kept per week, by predicted rank, None keeps them all.
+        by: Columns identifying a week.
+
+    Returns:
+        by + team, Predicted_Rank, Actual_Rank and Rank_Difference (actual minus predicted, so positive
+        means the model ranks the team higher than the voters), sorted by week and predicted rank.
+    """
+    by = list(by)
+    missing = [col for col in by + [team, predicted, actual] if col not in predictions.columns]
+    if missing:
+        raise ValueError(f"predictions are missing the {missing} columns")
+
+    weeks = predictions.groupby(by, sort=False)
+    # rank(-x) in R: descending, ties share the average rank
+    table = predictions[by + [team]].assign(
+        Predicted_Rank=weeks[predicted].rank(ascending=False, method='average'),
+        Actual_Rank=weeks[actual].rank(ascending=False, method='average')
+    )
+    table['Rank_Difference'] = table['Actual_Rank'] - table['Predicted_Rank']
+
+    if top_n is not None:
+        table = table[table['Predicted_Rank'] <= top_n]
+
+    return table.sort_values(by + ['Predicted_Rank'], kind='stable').reset_index(drop=True)
+
+
+def ranking_summary(table, top_n=TOP_N, by=WEEK_COLUMNS):
+    """
+    One row per week of a ranking_table: teams shown, share of them also in the actual top_n,
+    mean absolute rank difference and exact hits.
+    """
+    by = list(by)
+    scores = table[by].assign(
+        in_actual_top=table['Actual_Rank'] <= top_n,
+        abs_rank_difference=table['Rank_Difference'].abs(),
+        exact=table['Rank_Difference'] == 0
+    )
+    summary = scores.groupby(by, sort=True).agg(
+        teams=('exact', 'size'),
+        in_actual_top=('in_actual_top', 'sum'),
+        mean_abs_rank_difference=('abs_rank_difference', 'mean'),
+        exact=('exact', 'sum')
+    )
+    summary[f"top{top_n}_overlap"] = summary.pop('in_actual_top') / np.minimum(summary['teams'], top_n)
+
+    return summary[['teams', f"top{top_n}_overlap", 'mean_abs_rank_difference', 'exact']].reset_index()
+
+
+def _titles(year, week):
+    return (f"AP Poll Rankings Comparison - {year} Week {week}",
+            f"Comparison of Predicted vs. Actual AP Poll Ranks for Week {week} in {year}")
+
+
+def _rank(value):
+    # fmt_number(decimals = 0): halves away from zero (2.5 -> 3, -2.5 -> -3, not round()'s 2 and -2),
+    # with a proper minus sign
+    rounded = int(math.floor(abs(value) + 0.5))
+
+    return f"−{rounded}" if value < 0 and rounded else str(rounded)
+
+
+def _difference_class(value):
+    return ' class="worse"' if value < 0 else ' class="better"' if value > 0 else ''
+
+
+def _write_html(path, week_table, year, week):
+    title, subtitle = (html.escape(text) for text in _titles(year, week))
+    header = ''.join(f"<th>{_LABELS[col]}</th>" for col in _LABELS)
+    rows = ''.join(
+        f"<tr><td>{html.escape(str(team))}</td><td>{_rank(predicted)}</td><td>{_rank(actual)}</td>"
+        f"<td{_difference_class(difference)}>{_rank(difference)}</td></tr>\n"
+        for team, predicted, actual, difference in week_table[list(_LABELS)].itertuples(index=False)
+    )
+    with open(path, 'w') as f:
+        f.write(f"<!DOCTYPE html>\n<html lang=\"en\">\n<head>\n<meta charset=\"utf-8\"/>\n<title>{title}</title>\n"
+                f"<style>{_STYLE}</style>\n</head>\n<body>\n<table>\n"
+                f"<caption><div class=\"title\">{title}</div><div class=\"subtitle\">{subtitle}</div></caption>\n"
+                f"<thead><tr>{header}</tr></thead>\n<tbody>\n{rows}</tbody>\n</table>\n</body>\n</html>\n")
+
+
+def _write_png(path, week_table, year, week, dpi):
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    title, subtitle = _titles(year, week)
+    n_rows = len(week_table)
+    fig = Figure(figsize=(8, 1.4 + 0.32 * (n_rows + 1)))
+    FigureCanvasAgg(fig)
+    ax = fig.add_axes((0.05, 0.02, 0.9, 0.96))
+    ax.set_axis_off()
+    ax.set_xlim(0, 1)
+    ax.set_ylim(n_rows + 1, -2.2)
+
+    ax.text(0.5, -1.5, title, ha='center', va='center', fontsize=15, color='#333333')
+    ax.text(0.5, -0.8, subtitle, ha='center', va='center', fontsize=10, color='#333333')
+    ax.axhline(-2.2, color='#A8A8A8', linewidth=2)
+    ax.axhline(-0.4, color='#D3D3D3', linewidth=2)
+
+    x_right = (0.5, 0.7, 0.98)
+    ax.text(0.01, 0, 'Team', va='center', fontsize=12, color='#333333')
+    for x, label in zip(x_right, list(_LABELS.values())[1:]):
+        ax.text(x, 0, label, ha='right', va='center', fontsize=12, color='#333333')
+    ax.axhline(0.5, color='#D3D3D3', linewidth=2)
+
+    for row, (team, predicted, actual, difference) in enumerate(week_table[list(_LABELS)].itertuples(index=False),
+                                                                  start=1):
+        if row % 2 == 0:
+            ax.axhspan(row - 0.5, row + 0.5, color=(0.5, 0.5, 0.5, 0.05), linewidth=0)
+        if difference:
+            ax.axhspan(row - 0.5, row + 0.5, xmin=0.72, xmax=1.0, color=(1, 0, 0, 0.5) if difference < 0
+                       else (0, 1, 0, 0.5), linewidth=0)
+        ax.text(0.01, row, str(team), va='center', fontsize=11, color='#333333')
+        for x, value in zip(x_right, (predicted, actual, difference)):
+            ax.text(x, row, _rank(value), ha='right', va='center', fontsize=11, color='#333333')
+        ax.axhline(row + 0.5, color='#D3D3D3', linewidth=0.8)
+    ax.axhline(n_rows + 0.5, color='#A8A8A8', linewidth=2)
+
+    fig.savefig(path, dpi=dpi)
+
+
+def render_weeks(weeks, output_dir, formats=('html', 'png'), dpi=150, prefix='team_rankings_comparison'):
+    """
+    Writes <prefix>_<year>_week_<week>.<format> for a batch of weeks.
+
+    Args:
+        weeks: List of (year, week, that week's rows of ranking_table).
+        output_dir: Folder for the files.
+        formats: 'html' and/or 'png'.
+        dpi: Resolution of the PNGs.
+        prefix: File name prefix, the R script's by default.
+
+    Returns:
+        The written paths.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    paths = []
+    for year, week, week_table in weeks:
+        for extension in formats:
+            path = os.path.join(output_dir, f"{prefix}_{year}_week_{week}.{extension}")
+            if extension == 'html':
+                _write_html(path, week_table, year, week)
+            elif extension == 'png':
+                _write_png(path, week_table, year, week, dpi)
+            else:
+                raise ValueError(f"unknown report format {extension!r}, use 'html' or 'png'")
+            paths.append(path)
+
+    return paths
+
+
+def write_reports(predictions, output_dir, predicted='Predicted_Votes', actual='analytical_points', team='pos_team',
+                  top_n=TOP_N, formats=('html', 'png'), n_workers=None, dpi=150, prefix='team_rankings_comparison'):
+    """
+    Ranks every week of predictions and writes its comparison table, plus summary.csv for all weeks.
+
+    Args:
+        predictions: One row per team and week with year, week, the team and both columns to rank on.
+        output_dir: Folder for the reports.
+        predicted, actual, team, top_n: See ranking_table.
+        formats: 'html' and/or 'png'.
+        n_workers: Worker processes drawing the reports, 0 draws them in this process. Each worker gets
+            a batch of weeks, so the matplotlib import and process start up are paid once per worker.
+        dpi: Resolution of the PNGs.
+        prefix: File name prefix.
+
+    Returns:
+        (summary, paths), summary is ranking_summary of every week.
+    """
+    table = ranking_table(predictions, predicted=predicted, actual=actual, team=team, top_n=top_n)
+    summary = ranking_summary(table, top_n=top_n)
+
+    weeks = [(year, week, week_table) for (year, week), week_table in table.groupby(list(WEEK_COLUMNS), sort=True)]
+    n_workers = min(len(weeks), os.cpu_count() or 1) if n_workers is None else min(n_workers, len(weeks))
+
+    if n_workers:
+        # interleaved batches, one per worker
+        batches = [weeks[start::n_workers] for start in range(n_workers)]
+        with ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_use_agg) as pool:
+            futures = [pool.submit(render_weeks, batch, output_dir, formats, dpi, prefix) for batch in batches]
+            paths = sorted(path for future in futures for path in future.result())
+    else:
+        paths = render_weeks(weeks, output_dir, formats, dpi, prefix)
+
+    os.makedirs(output_dir, exist_ok=True)
+    summary_path = os.path.join(output_dir, 'summary.csv')
+    summary.to_csv(summary_path, index=False)
+
+    return summary, paths + [summary_path]
@@ -0,0 +1,68 @@
+"""
+Synthetic AP poll data with the same layout as full_train_data.csv.
+
+The real CSVs live outside the repo, so benchmarks (and anyone without them) use
+this instead: pos_team and conference strings, year and week, log_votes and
+analytical_points, and enough numeric columns to make the same ~367 column table.
+Every week lists the teams in turn from the 2014 season on, 15 weeks a season,
+and the test rows are the week after the last training week. The numbers are
+random but shaped roughly right (counts, rates, lagged votes), and log_votes
+depends on a few of them so a model has something to learn.
+"""
+import numpy as np
+import pandas as pd
+
+CONFERENCES = ('ACC', 'American', 'Big 12', 'Big Ten', 'CUSA', 'FBS Independents', 'MAC', 'Mountain West', 'Pac-12',
+               'SEC', 'Sun Belt')
+
+
+def make_ncaaf_data(n_rows=18874, n_test=134, n_numeric=361, n_teams=134, seed=0):
+    """
+    Train and test frames in the full_train_data.csv / full_test_data.csv layout.
+
+    Args:
+        n_rows: Training rows.
+        n_test: Rows in the test week.
+        n_numeric: Numeric feature columns, 361 plus the 6 named columns is the 367 of the real data.
+        n_teams: Distinct pos_team values, also the rows per week.
+        seed: Random seed.
+
+    Returns:
+        (train_df, test_df)
+    """
+    rng = np.random.default_rng(seed)
+    n_total = n_rows + n_test
+
+    teams = np.array([f"Team {idx:03d}" for idx in range(n_teams)])
+    team_conference = rng.choice(CONFERENCES, size=n_teams)
+    # n_teams rows a week, the test week right after the last (possibly partial) training week
+    position = np.concatenate([np.arange(n_rows), np.arange(n_test)])
+    slot = np.concatenate([np.arange(n_rows) // n_teams, np.full(n_test, (n_rows - 1) // n_teams + 1)])
+    team_idx = position % n_teams
+    team_strength = rng.normal(0, 1, size=n_teams)
+
+    columns = {
+        'pos_team': teams[team_idx],
+        'conference': team_conference[team_idx],
+        'year': (2014 + slot // 15).astype(np.int64),
+        'week': (slot % 15 + 1).astype(np.int64),
+        'cumulative_games_won': rng.integers(0, 13, size=n_total).astype(np.int64),
+        'lagged_log_votes': np.maximum(0, rng.normal(3, 2, size=n_total) + team_strength[team_idx])
+    }
+
+    # half counts, half rates, like the per game stats
+    n_counts = n_numeric // 2
+    counts = rng.poisson(rng.uniform(1, 40, size=n_counts), size=(n_total, n_counts))
+    rates = rng.normal(rng.uniform(-1, 1, size=n_numeric - n_counts), 1, size=(n_total, n_numeric - n_counts))
+    for idx in range(n_counts):
+        columns[f"stat_count_{idx:03d}"] = counts[:, idx]
+    for idx in range(n_numeric - n_counts):
+        columns[f"stat_rate_{idx:03d}"] = rates[:, idx]
+
+    df = pd.DataFrame(columns)
+    signal = (0.6 * df['lagged_log_votes'] + 0.25 * df['cumulative_games_won'] + 0.5 * team_strength[team_idx]
+              + 0.1 * rates[:, :5].sum(axis=1))
+    df['log_votes'] = np.maximum(0, signal + rng.normal(0, 0.8, size=n_total))
+    df['analytical_points'] = np.round(np.exp(df['log_votes']) - 1)
+
+    return df.iloc[:n_rows].reset_index(drop=True), df.iloc[n_rows:].reset_index(drop=True)
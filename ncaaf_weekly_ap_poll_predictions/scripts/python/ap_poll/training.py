@@ -0,0 +1,211 @@
+"""
+Model building and parallel sweeps for the AP vote regressor.
+
+The comments in tensorflow_analysis_full_data.py record an afternoon of hand
+edits: Dense 64/32 vs 16/16, L2 1e-4 or not, Adam at 0.01 vs 0.001, early stopping
+on or off. run_sweep takes those choices as a grid, trains every combination (and
+seed) in its own worker process with a capped number of TF threads, and returns a
+leaderboard ranked by validation loss along with every run's history.
+
+TensorFlow is only imported inside the functions, so the worker processes can set
+their thread limits before it initializes.
+"""
+import itertools
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from .data import DROP_COLUMNS, load_prepared_data
+
+DEFAULT_CONFIG = {
+    'hidden_units': (16, 16),
+    'activation': 'relu',
+    'l2': 0.0001,
+    'learning_rate': 0.01,
+    'batch_size': 256,
+    'epochs': 100,
+    'early_stopping': False,
+    'patience': 10,
+    'seed': 0
+}
+
+
+def build_model(n_features, hidden_units=(16, 16), activation='relu', l2=0.0001, learning_rate=0.01):
+    """
+    The Sequential regressor from the scripts, with the tuned bits as arguments.
+
+    Args:
+        n_features: Number of input columns.
+        hidden_units: Nodes per hidden layer, e.g. (64, 32).
+        activation: Hidden layer activation.
+        l2: L2 penalty on the hidden layers, 0 or None turns it off.
+        learning_rate: Adam learning rate.
+    """
+    from tensorflow import keras
+    from tensorflow.keras import Input, layers, regularizers
+    from tensorflow.keras.optimizers import Adam
+
+    regularizer = regularizers.l2(l2) if l2 else None
+
+    model = keras.Sequential(
+        [Input(shape=(n_features,))]
+        + [layers.Dense(units, activation=activation, kernel_regularizer=regularizer) for units in hidden_units]
+        + [layers.Dense(1, activation='linear')]  # Output layer for regression
+    )
+    model.compile(optimizer=Adam(learning_rate=learning_rate), loss='mse', metrics=['mae', 'mse'])
+
+    return model
+
+
+def expand_grid(grid):
+    """
+    Every combination of a {setting: [values]} grid, filled in with DEFAULT_CONFIG.
+    """
+    keys = list(grid)
+    configs = []
+    for values in itertools.product(*(grid[key] for key in keys)):
+        config = dict(DEFAULT_CONFIG)
+        config.update(zip(keys, values))
+        configs.append(config)
+
+    return configs
+
+
+def _limit_threads(threads):
+    # has to run before TF builds its thread pools, so right at worker start up
+    os.environ['TF_NUM_INTRAOP_THREADS'] = str(threads)
+    os.environ['TF_NUM_INTEROP_THREADS'] = '1'
+    os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+
+def train_config(config, train_path, test_path, drop_columns=DROP_COLUMNS, cache_dir='data_cache',
+                 validation_fraction=0.2):
+    """
+    Trains one config and returns its history and best validation scores.
+
+    The data comes from the on disk cache, so every worker memory maps the same files
+    instead of getting its own pickled copy.
+    """
+    import tensorflow as tf
+    from tensorflow.keras.callbacks import EarlyStopping
+
+    from .input_pipeline import make_datasets
+
+    tf.keras.utils.set_random_seed(config['seed'])
+
+    data = load_prepared_data(train_path, test_path, drop_columns=drop_columns, cache_dir=cache_dir)
+    train_ds, val_ds = make_datasets(data.x_train, data.y_train, batch_size=config['batch_size'],
+                                     validation_fraction=validation_fraction, seed=config['seed'])
+
+    model = build_model(
+        data.x_train.shape[1],
+        hidden_units=config['hidden_units'],
+        activation=config['activation'],
+        l2=config['l2'],
+        learning_rate=config['learning_rate']
+    )
+
+    callbacks = []
+    if config['early_stopping']:
+        callbacks.append(EarlyStopping(monitor='val_loss', patience=config['patience'], restore_best_weights=True))
+
+    start = time.perf_counter()
+    history = model.fit(train_ds, epochs=config['epochs'], validation_data=val_ds, callbacks=callbacks, verbose=0)
+    train_time = time.perf_counter() - start
+
+    val_loss = history.history['val_loss']
+    best_epoch = min(range(len(val_loss)), key=val_loss.__getitem__)
+
+    return {
+        'config': config,
+        'history': history.history,
+        'best_epoch': best_epoch + 1,
+        'epochs_run': len(val_loss),
+        'best_val_loss': val_loss[best_epoch],
+        'best_val_mae': history.history['val_mae'][best_epoch],
+        'final_val_loss': val_loss[-1],
+        'train_time': train_time
+    }
+
+
+def run_sweep(grid, train_path, test_path, drop_columns=DROP_COLUMNS, cache_dir='data_cache', n_workers=None,
+              threads_per_worker=1, validation_fraction=0.2, plot_dir=None, plot_formats=('png',)):
+    """
+    Trains every config of a grid concurrently and ranks them.
+
+    Args:
+        grid: {setting: [values]}, e.g. {'hidden_units': [(16, 16), (64, 32)], 'learning_rate': [0.01, 0.001],
+            'seed': [0, 1, 2]}. Anything left out uses DEFAULT_CONFIG.
+        train_path, test_path: CSVs, same as load_prepared_data.
+        drop_columns: Columns that aren't features.
+        cache_dir: Data cache shared by every worker.
+        n_workers: Worker processes, defaults to cores // threads_per_worker.
+        threads_per_worker: TF threads each worker may use, keeps workers from fighting over cores.
+        validation_fraction: Held out share of the training rows.
+        plot_dir: Folder for each run's loss/MAE/MSE curves and a sweep overview, drawn in a separate
+            worker (see plots.py) as runs finish, so plotting never holds up training.
+        plot_formats: 'png' and/or 'html'.
+
+    Returns:
+        (leaderboard, results). leaderboard has one row per run sorted by best_val_loss,
+        results holds the full dicts from train_config including history.
+    """
+    configs = expand_grid(grid)
+
+    # build the cache once up front so the workers all get a hit instead of racing to build it
+    load_prepared_data(train_path, test_path, drop_columns=drop_columns, cache_dir=cache_dir)
+
+    n_workers = n_workers or max(1, (os.cpu_count() or 1) // threads_per_worker)
+
+    plots = None
+    if plot_dir is not None:
+        from .plots import PlotQueue, history_spec, sweep_spec
+
+        plots = PlotQueue(plot_dir, formats=plot_formats, n_workers=1)
+
+    try:
+        # spawn, TF doesn't survive being forked once it has started
+        with ProcessPoolExecutor(max_workers=min(n_workers, len(configs)),
+                                 mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_limit_threads, initargs=(threads_per_worker,)) as pool:
+            futures = {
+                pool.submit(train_config, config, train_path, test_path, drop_columns, cache_dir,
+                            validation_fraction): run_id
+                for run_id, config in enumerate(configs)
+            }
+            results = [None] * len(configs)
+            for future in as_completed(futures):
+                run_id = futures[future]
+                results[run_id] = future.result()
+                if plots is not None:
+                    plots.submit(history_spec(results[run_id]['history'], f"run_{run_id:03d}",
+                                              title=f"run {run_id}: {results[run_id]['config']}"))
+
+        if plots is not None:
+            plots.submit(sweep_spec(results, 'sweep'))
+            for future in plots.futures:
+                future.result()  # waits for the drawing to finish, raises if a plot failed
+    finally:
+        # also when a run or a plot failed, so the plotting worker never outlives the sweep
+        if plots is not None:
+            plots.close()
+
+    rows = []
+    for run_id, result in enumerate(results):
+        row = {'run_id': run_id}
+        row.update({key: str(value) if isinstance(value, tuple) else value for key, value in result['config'].items()})
+        row.update({key: result[key] for key in ('best_val_loss', 'best_val_mae', 'final_val_loss', 'best_epoch',
+                                                   'epochs_run', 'train_time')})
+        rows.append(row)
+
+    leaderboard = pd.DataFrame(rows).sort_values('best_val_loss').reset_index(drop=True)
+    leaderboard.insert(0, 'rank', range(1, len(leaderboard) + 1))
+
+    return leaderboard, results
@@ -0,0 +1,29 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))  # so the shared ap_poll package can be imported
+from ap_poll.training import run_sweep
+
+
+# The settings tried by hand in tensorflow_analysis_full_data.py, all in one go
+# Each combination trains in its own process, 2 TF threads each so they don't fight over the cores
+sweep_grid = {
+    'hidden_units': [(16, 16), (64, 32)],
+    'l2': [0.0001, 0],
+    'learning_rate': [0.01, 0.001],
+    'early_stopping': [False, True],
+    'seed': [0, 1, 2]  # a few seeds so one lucky init doesn't pick the winner
+}
+
+
+if __name__ == '__main__':
+    # the guard matters here, the worker processes re-import this file
+    leaderboard, results = run_sweep(
+        sweep_grid,
+        r"E:\github_repos\Private_Projects\NCAA_FBS_AP_Ranking_Predictions\python_ap\scripts_and_data\data\full_train_data.csv",
+        r"E:\github_repos\Private_Projects\NCAA_FBS_AP_Ranking_Predictions\python_ap\scripts_and_data\data\full_test_data.csv",
+        threads_per_worker=2,
+        plot_dir='sweep_plots'  # every run's loss/MAE/MSE curves plus the top runs, drawn as the runs finish
+    )
+
+    print(leaderboard.head(10))
+    leaderboard.to_csv('architecture_sweep_leaderboard.csv', index=False)
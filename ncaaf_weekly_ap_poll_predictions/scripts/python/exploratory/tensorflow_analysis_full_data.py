@@ -1,84 +1,50 @@
+# Exploration notes. The repeatable steps (inspect, train, predict, plot) are also a command line that only
+# imports what each step needs: from scripts/python run python -m ap_poll --help, see ap_poll/cli.py
+
 import pandas as pd                 # data manipulation
-import matplotlib.pyplot as plt     # data viz
 import numpy as np
-import seaborn as sns               # data viz
 from tensorflow import keras
 from tensorflow.keras import Input, layers, models, metrics, regularizers
 from tensorflow.keras.optimizers import Adam
-from sklearn.preprocessing import StandardScaler
 from tensorflow.keras.callbacks import EarlyStopping
-
-
-# Small function to read in the csv data
-def read_in_data(train_path, test_path):
-    train_df = pd.read_csv(train_path)
-    test_df = pd.read_csv(test_path)
-
-    return train_df, test_df
-
-# Read in the csv data. Note that the test data is based on the most recent week of data
-train_df, test_df = read_in_data(
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))  # so the shared ap_poll package can be imported
+from ap_poll import load_prepared_data
+from ap_poll.plots import history_spec, render
+from ap_poll.artifacts import save_bundle
+from ap_poll.input_pipeline import make_datasets
+
+
+# Read in and prepare the csv data. Note that the test data is based on the most recent week of data
+# Preparing = split into x and y, drop log votes and analytical points from x data, scale everything but pos_team
+# and dummy code pos_team (teams not seen in train go to pos_team_Unknown_value).
+# The result is cached in data_cache/ keyed on the csv contents, so re-runs skip the csv parse and the encoding
+# The matrices are float32 (what keras trains in anyway, half the memory of float64) and compact=True reads the csv
+# as float32/small ints/category so the first build doesn't hold a float64 copy of everything
+data = load_prepared_data(
     r"E:\github_repos\Private_Projects\NCAA_FBS_AP_Ranking_Predictions\python_ap\scripts_and_data\data\full_train_data.csv",
-    r"E:\github_repos\Private_Projects\NCAA_FBS_AP_Ranking_Predictions\python_ap\scripts_and_data\data\full_test_data.csv"
+    r"E:\github_repos\Private_Projects\NCAA_FBS_AP_Ranking_Predictions\python_ap\scripts_and_data\data\full_test_data.csv",
+    compact=True
 )
 
-# Prepare the data
-# Lets first take a look at make sure we have good data
-#print(train_df.tail())
-#print(train_df.dtypes) # so 367 columns
+x_train_encoded, x_test_encoded = data.frames()
+y_train = data.y_train
+y_test = data.y_test
 
-non_num_cols = train_df.select_dtypes(exclude='number').columns
-print(non_num_cols)
+# Lets first take a look at make sure we have good data, so 367 raw columns
 # We have pos_team, and conference as categorical variables. Lets just drop the conference
 
 # Also some quick data viz
+#train_df, test_df = read_in_data(train_path, test_path)
+# the full pairplot is too slow, python -m ap_poll eda TRAIN.csv -o eda draws it from a 5000 row sample instead
 #snsplot = sns.pairplot(train_df[["log_votes","lagged_log_votes","cumulative_games_won"]], diag_kind="kde")
 #plt.show()
 #print(snsplot)
 
-
-
-
-
-
-###### Preparing the data for real
-# Split into x and y, drop log votes and analytical points from x data
-x_train = train_df.drop(columns = ['log_votes','analytical_points','conference'])
-y_train = train_df['log_votes']
-
-x_test = test_df.drop(columns = ['log_votes','analytical_points','conference'])
-y_test = test_df['log_votes']
-
-
-
-######  Scale data
-columns_to_scale = x_train.drop(columns=['pos_team']).columns
-
-# Initialize the scaler
-scaler = StandardScaler()
-
-# Fit and transform the training data
-x_train[columns_to_scale] = scaler.fit_transform(x_train[columns_to_scale])
-
-# Transform the test data using the parameters from training
-x_test[columns_to_scale] = scaler.transform(x_test[columns_to_scale])
-
-
-
-# So we do have a categorical variable that we should try to handle before working in TF. Are TEAMS, the pos_team variable
-# Just going to dummy code for now
-x_train_encoded = pd.get_dummies(x_train, columns=['pos_team'], drop_first=True)
-x_test_encoded = pd.get_dummies(x_test, columns=['pos_team'], drop_first=True)
-
-# Some teams are missing from the test data from the train data, so lets add them back real quick to the test data
-missing_cols = set(x_train_encoded.columns) - set(x_test_encoded.columns)
-
-for cols in missing_cols:
-    x_test_encoded[cols] = 0
-
 #### Check this when building out the model
-print(x_train_encoded.shape)  # Expected output should be (num_samples, 18874 samples and 503 columns
-print(x_test_encoded.shape) # Expected output should be (num_samples, 134 samples and 503 columns, so good match there)
+print(x_train_encoded.shape)  # Expected output should be (num_samples, 18874 samples and 504 columns, 503 plus the unknown team column
+print(x_test_encoded.shape) # Expected output should be (num_samples, 134 samples and 504 columns, so good match there)
 
 
 ### Time for TF!
@@ -121,55 +87,20 @@ early_stopping = EarlyStopping(monitor='val_loss',  # You can change this to 'va
 #history = tf_model.fit(x_train_encoded, y_train, epochs=200, batch_size=32, validation_split = 0.2 ) # note batch size is 32 by default, larger faster but more memory
 #history = tf_model.fit(x_train_encoded, y_train, epochs=200, batch_size=32, validation_split = 0.2, callbacks = [early_stopping] ) # note batch size is 32 by default, larger faster but more memory
 
-def plot_training_history(history, epochs=200):
+def plot_training_history(history, output_dir='plots', name='training_history'):
     """
-    Plots the loss, MAE, and MSE for both training and validation splits.
+    Saves the loss, MAE, and MSE for both training and validation splits to output_dir.
+
+    Drawn on an Agg canvas straight to PNG and HTML (with the per epoch table) instead of plt.show(),
+    so nothing waits on a window. ap_poll.plots has the panels, run_sweep(plot_dir=...) draws every
+    run of a sweep this way in a background worker.
 
     Args:
         history: The training history returned by model.fit().
-        epochs: The number of epochs (default is 200).
+        output_dir: Folder for the files.
+        name: File name, without extension.
     """
-    # Get the number of epochs from the history object
-    epochs = len(history.history['loss'])  # Number of completed epochs
-
-    # Extract training and validation metrics
-    train_loss = history.history['loss']
-    val_loss = history.history['val_loss']
-    train_mae = history.history['mae']
-    val_mae = history.history['val_mae']
-    train_mse = history.history['mse']
-    val_mse = history.history['val_mse']
-
-    # Create subplots for the loss, MAE, and MSE
-    fig, axs = plt.subplots(1, 3, figsize=(18, 5))
-
-    # Plot training loss vs. validation loss
-    axs[0].plot(range(1, epochs + 1), train_loss, label='Train Loss')
-    axs[0].plot(range(1, epochs + 1), val_loss, label='Val Loss', linestyle='--')
-    axs[0].set_title('Loss')
-    axs[0].set_xlabel('Epochs')
-    axs[0].set_ylabel('Loss')
-    axs[0].legend()
-
-    # Plot training MAE vs. validation MAE
-    axs[1].plot(range(1, epochs + 1), train_mae, label='Train MAE')
-    axs[1].plot(range(1, epochs + 1), val_mae, label='Val MAE', linestyle='--')
-    axs[1].set_title('Mean Absolute Error (MAE)')
-    axs[1].set_xlabel('Epochs')
-    axs[1].set_ylabel('MAE')
-    axs[1].legend()
-
-    # Plot training MSE vs. validation MSE
-    axs[2].plot(range(1, epochs + 1), train_mse, label='Train MSE')
-    axs[2].plot(range(1, epochs + 1), val_mse, label='Val MSE', linestyle='--')
-    axs[2].set_title('Mean Squared Error (MSE)')
-    axs[2].set_xlabel('Epochs')
-    axs[2].set_ylabel('MSE')
-    axs[2].legend()
-
-    # Display the plots
-    plt.tight_layout()
-    plt.show()
+    return render(history_spec(history.history, name), output_dir, formats=('png', 'html'))
 #plot_training_history(history)
 
 # ALl in all, this model looks good, still run early stopping, but looks much better!
@@ -177,7 +108,13 @@ def plot_training_history(history, epochs=200):
 
 # This seems to be the best fit so far, probably take out the validation split and set epoch around 10 for final model? Not sure I really need the early stopping here
 #tf_model.fit(x_train_encoded, y_train, epochs=200, batch_size=32, validation_split = 0.2, callbacks = [early_stopping] )
-tf_model.fit(x_train_encoded, y_train, epochs=100, batch_size=32, validation_split = 0.2)
+#tf_model.fit(x_train_encoded, y_train, epochs=100, batch_size=32, validation_split = 0.2)
+
+# Stream the training data through tf.data instead of handing keras the whole DataFrame.
+# Validation is the same last 20% validation_split used, just held out explicitly. Batch size is bigger than 32 so
+# each step does more work, if the fit gets worse with it try lowering the learning rate a bit before going back down
+train_ds, val_ds = make_datasets(data.x_train, data.y_train, batch_size=256, validation_fraction=0.2)
+tf_model.fit(train_ds, epochs=100, validation_data=val_ds)
 
 
 # Lets compare to the test data and evaluate fit, looks like
@@ -194,17 +131,16 @@ y_pred = np.exp(y_pred)
 y_pred_df = pd.DataFrame(y_pred, columns=["Predicted_Votes"])
 
 # Rejoin to the original test data, just grab the data of interest
-output_df = test_df[["analytical_points","pos_team"]].copy()
+output_df = data.test_ids[["analytical_points","pos_team"]].copy()
 output_df["Predicted_Votes"] = y_pred_df
 output_df.to_csv('test.csv', index=False)
 
 
-'''
-
-tf_model.save('my_model.h5')
-loaded_model = keras.models.load_model('my_model.h5')
-
-'''
+# Save the model with its scaler, team vocabulary and column order as the next artifacts/vNNN version
+# New weeks can then be predicted without retraining (or importing tensorflow):
+#   from ap_poll.artifacts import predict_csv
+#   predict_csv('artifacts', 'full_test_data.csv', 'test.csv')
+save_bundle(tf_model, data, 'artifacts', notes={'test_mse': test_mse, 'test_mae': test_mae})
 
 if __name__ == '__main__':
     print("script done...yummy")